@@ -5,9 +5,33 @@ Learns optimal racing strategies from simulations using Q-learning
 import json
 import os
 import random
-from typing import Dict, List, Tuple, Optional
+from collections import deque
+from typing import Dict, List, NamedTuple, Tuple, Optional, Union
 import pickle
 
+import numpy as np
+
+# Buckets of each discretized state feature, in to_index digit order
+STATE_BUCKETS = [
+    ['early', 'mid', 'late'],  # lap phase
+    ['leader', 'podium', 'points', 'back'],  # position
+    ['fresh', 'good', 'worn'],  # tire age
+    ['excellent', 'good', 'poor'],  # tire condition
+    ['close', 'medium', 'far'],  # gap to leader
+    ['dry', 'rain', 'variable'],  # weather
+]
+N_STATES = int(np.prod([len(buckets) for buckets in STATE_BUCKETS]))
+WEATHER_INDEX = {weather: i for i, weather in enumerate(STATE_BUCKETS[5])}
+
+# Transitions kept for replay, and races kept in learning_history
+REPLAY_CAPACITY = 50000
+HISTORY_LENGTH = 1000
+# Prioritized replay: how strongly |TD error| skews sampling, how fully importance
+# weights undo the skew, and the priority floor that keeps every transition sampleable
+PRIORITY_ALPHA = 0.6
+PRIORITY_BETA = 0.4
+PRIORITY_EPSILON = 0.01
+
 
 class RLState:
     """Racing state for RL decision making"""
@@ -22,16 +46,63 @@ class RLState:
         self.gap_to_leader = gap_to_leader
         self.weather = weather
     
-    def to_key(self) -> str:
-        """Convert state to hashable key"""
+    def buckets(self) -> Tuple[int, int, int, int, int, int]:
+        """Bucket of each state feature, indices into STATE_BUCKETS"""
         # Discretize continuous values for state space
-        lap_phase = 'early' if self.lap < self.total_laps * 0.3 else 'mid' if self.lap < self.total_laps * 0.7 else 'late'
-        position_bucket = 'leader' if self.position == 1 else 'podium' if self.position <= 3 else 'points' if self.position <= 10 else 'back'
-        tire_bucket = 'fresh' if self.tire_age < 10 else 'good' if self.tire_age < 20 else 'worn'
-        condition_bucket = 'excellent' if self.tire_condition > 0.8 else 'good' if self.tire_condition > 0.5 else 'poor'
-        gap_bucket = 'close' if self.gap_to_leader < 2 else 'medium' if self.gap_to_leader < 10 else 'far'
+        lap_phase = 0 if self.lap < self.total_laps * 0.3 else 1 if self.lap < self.total_laps * 0.7 else 2
+        position_bucket = 0 if self.position == 1 else 1 if self.position <= 3 else 2 if self.position <= 10 else 3
+        tire_bucket = 0 if self.tire_age < 10 else 1 if self.tire_age < 20 else 2
+        condition_bucket = 0 if self.tire_condition > 0.8 else 1 if self.tire_condition > 0.5 else 2
+        gap_bucket = 0 if self.gap_to_leader < 2 else 1 if self.gap_to_leader < 10 else 2
+        if self.weather not in WEATHER_INDEX:
+            raise ValueError(f"Unknown weather '{self.weather}', expected one of {STATE_BUCKETS[5]}")
         
-        return f"{lap_phase}_{position_bucket}_{tire_bucket}_{condition_bucket}_{gap_bucket}_{self.weather}"
+        return lap_phase, position_bucket, tire_bucket, condition_bucket, gap_bucket, WEATHER_INDEX[self.weather]
+    
+    def to_index(self) -> int:
+        """State as a mixed-radix integer below N_STATES: its Q-table row"""
+        lap_phase, position_bucket, tire_bucket, condition_bucket, gap_bucket, weather = self.buckets()
+        # Radixes 3, 4, 3, 3, 3, 3 as in STATE_BUCKETS, unrolled for the training loop
+        return (((((lap_phase * 4 + position_bucket) * 3 + tire_bucket) * 3 + condition_bucket) * 3
+                 + gap_bucket) * 3 + weather)
+    
+    @staticmethod
+    def batch_index(lap: int, total_laps: int, position: np.ndarray, tire_age: np.ndarray,
+                    tire_condition: np.ndarray, gap_to_leader: np.ndarray, weather: np.ndarray) -> np.ndarray:
+        """to_index over arrays of states, weather given as WEATHER_INDEX values"""
+        lap_phase = int(lap >= total_laps * 0.3) + int(lap >= total_laps * 0.7)
+        position_bucket = (position > 1).astype(np.int64) + (position > 3) + (position > 10)
+        tire_bucket = (tire_age >= 10).astype(np.int64) + (tire_age >= 20)
+        condition_bucket = (tire_condition <= 0.8).astype(np.int64) + (tire_condition <= 0.5)
+        gap_bucket = (gap_to_leader >= 2).astype(np.int64) + (gap_to_leader >= 10)
+        return (((((lap_phase * 4 + position_bucket) * 3 + tire_bucket) * 3 + condition_bucket) * 3
+                 + gap_bucket) * 3 + weather)
+    
+    def to_key(self) -> str:
+        """Readable state key, e.g. 'mid_podium_good_good_medium_dry'"""
+        return '_'.join(buckets[bucket] for bucket, buckets in zip(self.buckets(), STATE_BUCKETS))
+    
+    @staticmethod
+    def key_to_index(key: str) -> int:
+        """Q-table row of a to_key string"""
+        names = key.split('_')
+        if len(names) != len(STATE_BUCKETS):
+            raise ValueError(f"Invalid state key '{key}'")
+        index = 0
+        for name, buckets in zip(names, STATE_BUCKETS):
+            if name not in buckets:
+                raise ValueError(f"Invalid state key '{key}'")
+            index = index * len(buckets) + buckets.index(name)
+        return index
+
+
+class ActionEffect(NamedTuple):
+    """What an action does to the lap it is chosen for, see RaceSimulator"""
+    pace: float  # lap time factor
+    wear: float  # laps of tire wear
+    attack: float  # overtake chance added when attacking the car ahead
+    defend: float  # overtake chance taken from the car attacking it
+    risk: float  # incident probability added
 
 
 class RLAction:
@@ -46,6 +117,18 @@ class RLAction:
         'attack_ahead',     # Try to overtake
     ]
     
+    # Effects in ACTIONS order; pit_now also makes the car pit that lap
+    EFFECTS = [
+        ActionEffect(pace=0.985, wear=1.5, attack=0.05, defend=0.0, risk=0.003),
+        ActionEffect(pace=1.01, wear=0.5, attack=0.0, defend=0.0, risk=0.0),
+        ActionEffect(pace=1.0, wear=1.0, attack=0.0, defend=0.0, risk=0.0),
+        ActionEffect(pace=1.0, wear=1.0, attack=0.0, defend=0.0, risk=0.0),
+        ActionEffect(pace=1.005, wear=1.0, attack=0.0, defend=0.15, risk=0.0),
+        ActionEffect(pace=0.995, wear=1.2, attack=0.15, defend=0.0, risk=0.005),
+    ]
+    # EFFECTS as an (actions, fields) array for batched races
+    EFFECT_TABLE = np.array(EFFECTS)
+    
     @staticmethod
     def get_action_index(action: str) -> int:
         return RLAction.ACTIONS.index(action)
@@ -55,25 +138,149 @@ class RLAction:
         return RLAction.ACTIONS[index]
 
 
+def scatter_update(values: np.ndarray, index: np.ndarray, target: np.ndarray,
+                   learning_rate: Union[float, np.ndarray], weights: Optional[np.ndarray] = None) -> np.ndarray:
+    """Step values.flat[index] towards target as Q-learning updates would, in one scatter
+    
+    Updates of the same entry are combined: n updates of rate a towards their
+    mean target close (1 - a)^n of the distance, n being their total weight.
+    learning_rate is a scalar, or one rate per table when values stacks tables
+    along its first axis. Returns the number of updates per flat index.
+    """
+    flat = values.reshape(-1)
+    counts = np.bincount(index, minlength=flat.size)
+    weight = counts if weights is None else np.bincount(index, weights=weights, minlength=flat.size)
+    touched = np.flatnonzero(weight)
+    mean_target = np.bincount(index, weights=target if weights is None else target * weights,
+                              minlength=flat.size)[touched] / weight[touched]
+    if not np.isscalar(learning_rate):
+        learning_rate = learning_rate[touched // (flat.size // len(values))]
+    flat[touched] += (1.0 - (1.0 - learning_rate) ** weight[touched]) * (mean_target - flat[touched])
+    return counts
+
+
+class ReplayBatch(NamedTuple):
+    """Transitions sampled from a ReplayBuffer"""
+    indices: np.ndarray
+    states: np.ndarray
+    actions: np.ndarray
+    rewards: np.ndarray
+    next_states: np.ndarray
+    dones: np.ndarray
+    weights: Optional[np.ndarray]  # importance weights of a prioritized sample
+
+
+class ReplayBuffer:
+    """Fixed-capacity ring buffer of transitions for experience replay
+    
+    Transitions are stored as Q-table rows and action indices in preallocated
+    arrays, 14 bytes each, and once the buffer is full each new one overwrites
+    the oldest. Sampling is uniform or prioritized: in proportion to
+    (|TD error| + PRIORITY_EPSILON)^PRIORITY_ALPHA, new transitions taking the
+    highest priority seen so they are replayed at least once.
+    """
+    
+    def __init__(self, capacity: int = REPLAY_CAPACITY, seed=None):
+        self.capacity = capacity
+        self.states = np.zeros(capacity, dtype=np.int16)
+        self.actions = np.zeros(capacity, dtype=np.int8)
+        self.rewards = np.zeros(capacity, dtype=np.float32)
+        self.next_states = np.zeros(capacity, dtype=np.int16)
+        self.dones = np.zeros(capacity, dtype=bool)
+        # Sampling weights, (|TD error| + PRIORITY_EPSILON)^PRIORITY_ALPHA
+        self.priorities = np.zeros(capacity, dtype=np.float32)
+        self.max_priority = 1.0
+        self.position = 0
+        self.size = 0
+        self.rng = np.random.default_rng(seed)
+    
+    def __len__(self) -> int:
+        return self.size
+    
+    @property
+    def nbytes(self) -> int:
+        return sum(array.nbytes for array in (self.states, self.actions, self.rewards, self.next_states,
+                                              self.dones, self.priorities))
+    
+    def add(self, state: int, action: int, reward: float, next_state: int, done: bool):
+        i = self.position
+        self.states[i] = state
+        self.actions[i] = action
+        self.rewards[i] = reward
+        self.next_states[i] = next_state
+        self.dones[i] = done
+        self.priorities[i] = self.max_priority
+        self.position = (i + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+    
+    def add_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+                  dones: np.ndarray):
+        """add for arrays of transitions; past capacity only the last ones are kept"""
+        n = len(states)
+        keep = slice(max(0, n - self.capacity), n)
+        index = (self.position + np.arange(max(0, n - self.capacity), n)) % self.capacity
+        self.states[index] = states[keep]
+        self.actions[index] = actions[keep]
+        self.rewards[index] = rewards[keep]
+        self.next_states[index] = next_states[keep]
+        self.dones[index] = dones[keep]
+        self.priorities[index] = self.max_priority
+        self.position = (self.position + n) % self.capacity
+        self.size = min(self.size + n, self.capacity)
+    
+    def sample(self, batch_size: int, prioritized: bool = False) -> ReplayBatch:
+        if self.size == 0:
+            raise ValueError('Cannot sample from an empty replay buffer')
+        if prioritized:
+            cumulative = np.cumsum(self.priorities[:self.size], dtype=float)
+            indices = np.minimum(np.searchsorted(cumulative, self.rng.random(batch_size) * cumulative[-1], 'right'),
+                                 self.size - 1)
+            probabilities = self.priorities[indices] / cumulative[-1]
+            weights = (self.size * probabilities) ** -PRIORITY_BETA
+            weights /= weights.max()
+        else:
+            indices = self.rng.integers(self.size, size=batch_size)
+            weights = None
+        return ReplayBatch(indices, self.states[indices].astype(np.int64), self.actions[indices].astype(np.int64),
+                           self.rewards[indices].astype(float), self.next_states[indices].astype(np.int64),
+                           self.dones[indices], weights)
+    
+    def update_priorities(self, indices: np.ndarray, td_errors: np.ndarray):
+        priorities = (np.abs(td_errors) + PRIORITY_EPSILON) ** PRIORITY_ALPHA
+        self.priorities[indices] = priorities
+        self.max_priority = max(self.max_priority, float(priorities.max()))
+
+
 class AIDriverRL:
     """Reinforcement Learning AI Driver"""
     
     def __init__(self, name: str = "AI Driver", learning_rate: float = 0.1, 
-                 discount_factor: float = 0.95, exploration_rate: float = 0.2):
+                 discount_factor: float = 0.95, exploration_rate: float = 0.2, seed: Optional[int] = None,
+                 replay_capacity: int = REPLAY_CAPACITY, replay_batch_size: int = 0, prioritized_replay: bool = False):
         self.name = name
         self.learning_rate = learning_rate
         self.discount_factor = discount_factor
         self.exploration_rate = exploration_rate
+        # Exploration draws, seeded for reproducible training
+        self.rng = random.Random(seed)
         
-        # Q-table: maps (state, action) -> Q-value
-        self.q_table: Dict[Tuple[str, int], float] = {}
+        # Q-table: a row of action values per state (see RLState.to_index), and
+        # how often each state-action pair has been updated
+        self.q_table = np.zeros((N_STATES, len(RLAction.ACTIONS)), dtype=np.float32)
+        self.visits = np.zeros((N_STATES, len(RLAction.ACTIONS)), dtype=np.int32)
+        
+        # With replay on (replay_batch_size > 0), every learned transition is kept
+        # and a minibatch of them replayed after each race
+        self.replay_buffer = ReplayBuffer(replay_capacity, seed) if replay_batch_size else None
+        self.replay_batch_size = replay_batch_size
+        self.prioritized_replay = prioritized_replay
         
         # Training statistics
         self.races_completed = 0
         self.total_wins = 0
         self.total_podiums = 0
         self.avg_finish_position = 0
-        self.learning_history = []
+        self.learning_history = deque(maxlen=HISTORY_LENGTH)
         
         # Strategy preferences learned
         self.learned_preferences = {
@@ -82,40 +289,82 @@ class AIDriverRL:
             'aggression_level': 0.5
         }
     
+    @property
+    def q_table_size(self) -> int:
+        """State-action pairs learned so far"""
+        return int(np.count_nonzero(self.visits))
+    
     def get_q_value(self, state: RLState, action_index: int) -> float:
         """Get Q-value for state-action pair"""
-        key = (state.to_key(), action_index)
-        return self.q_table.get(key, 0.0)
+        return float(self.q_table[state.to_index(), action_index])
     
     def choose_action(self, state: RLState, is_training: bool = True) -> int:
         """Choose action using epsilon-greedy policy"""
-        if is_training and random.random() < self.exploration_rate:
+        if is_training and self.rng.random() < self.exploration_rate:
             # Explore: random action
-            return random.randint(0, len(RLAction.ACTIONS) - 1)
+            return self.rng.randint(0, len(RLAction.ACTIONS) - 1)
         else:
-            # Exploit: best known action
-            q_values = [self.get_q_value(state, i) for i in range(len(RLAction.ACTIONS))]
+            # Exploit: best known action. NumPy calls on a row of six cost more
+            # than they save, so the argmax runs on a list of the row
+            q_values = self.q_table[state.to_index()].tolist()
             max_q = max(q_values)
             # Handle ties randomly
             best_actions = [i for i, q in enumerate(q_values) if q == max_q]
-            return random.choice(best_actions)
+            return best_actions[0] if len(best_actions) == 1 else self.rng.choice(best_actions)
     
     def update_q_value(self, state: RLState, action_index: int, reward: float, 
                       next_state: Optional[RLState] = None):
         """Update Q-value using Q-learning update rule"""
-        key = (state.to_key(), action_index)
-        current_q = self.q_table.get(key, 0.0)
+        index = state.to_index()
+        current_q = self.q_table.item(index, action_index)
         
         if next_state:
             # Find max Q-value for next state
-            next_q_values = [self.get_q_value(next_state, i) for i in range(len(RLAction.ACTIONS))]
-            max_next_q = max(next_q_values)
+            max_next_q = max(self.q_table[next_state.to_index()].tolist())
         else:
             max_next_q = 0.0
         
         # Q-learning update
         new_q = current_q + self.learning_rate * (reward + self.discount_factor * max_next_q - current_q)
-        self.q_table[key] = new_q
+        self.q_table[index, action_index] = new_q
+        self.visits[index, action_index] += 1
+        if self.replay_buffer is not None:
+            self.replay_buffer.add(index, action_index, reward, next_state.to_index() if next_state else 0,
+                                   next_state is None)
+    
+    def learn_batch(self, states: np.ndarray, actions: np.ndarray, rewards: np.ndarray, next_states: np.ndarray,
+                    dones: np.ndarray, weights: Optional[np.ndarray] = None) -> np.ndarray:
+        """update_q_value over arrays of transitions (Q-table rows), returning their TD errors"""
+        target = rewards + np.where(dones, 0.0, self.discount_factor * self.q_table[next_states].max(axis=1))
+        td_errors = target - self.q_table[states, actions]
+        scatter_update(self.q_table, states * len(RLAction.ACTIONS) + actions, target, self.learning_rate, weights)
+        return td_errors
+    
+    def replay(self, batch_size: Optional[int] = None) -> int:
+        """One minibatch Q-update from the replay buffer, returning how many transitions it replayed
+        
+        Replayed updates count as visits, so merge_q_tables weighs them like any other update.
+        """
+        if self.replay_buffer is None or not len(self.replay_buffer):
+            return 0
+        batch = self.replay_buffer.sample(batch_size or self.replay_batch_size, self.prioritized_replay)
+        td_errors = self.learn_batch(batch.states, batch.actions, batch.rewards, batch.next_states, batch.dones,
+                                     batch.weights)
+        np.add.at(self.visits, (batch.states, batch.actions), 1)
+        if self.prioritized_replay:
+            self.replay_buffer.update_priorities(batch.indices, td_errors)
+        return len(batch.indices)
+    
+    def merge_q_tables(self, q_tables: np.ndarray, visits: np.ndarray):
+        """Merge Q-tables trained from copies of this one, weighting each pair by its visits there
+        
+        q_tables and visits stack the copies' tables and the visits they added;
+        pairs no copy visited keep their value.
+        """
+        total = visits.sum(axis=0)
+        weighted = (q_tables * visits).sum(axis=0) / np.maximum(total, 1)
+        self.q_table = np.where(total > 0, weighted, self.q_table).astype(np.float32)
+        self.visits += total.astype(np.int32)
     
     def calculate_reward(self, state: RLState, action_index: int, result: Dict) -> float:
         """Calculate reward for action taken"""
@@ -171,6 +420,29 @@ class AIDriverRL:
         
         return reward
     
+    @staticmethod
+    def calculate_rewards(tire_condition: np.ndarray, position: np.ndarray, actions: np.ndarray,
+                          results: Dict[str, np.ndarray]) -> np.ndarray:
+        """calculate_reward over arrays of transitions
+        
+        tire_condition and position are the states' features, results holds a
+        boolean array per calculate_reward result flag plus 'final_position'.
+        """
+        conserve, push, pit = (actions == RLAction.get_action_index(name)
+                               for name in ['conserve_tires', 'push_hard', 'pit_now'])
+        reward = np.where(results['position_gained'], 10.0, np.where(results['position_lost'], -5.0, 0.0))
+        reward += 5.0 * results['faster_than_average']
+        reward += 3.0 * (conserve & (tire_condition < 0.6))
+        reward += 2.0 * (push & (tire_condition > 0.8))
+        reward += np.where(pit & (tire_condition < 0.4), 8.0, np.where(pit & (tire_condition > 0.8), -5.0, 0.0))
+        reward += np.where(position == 1, 2.0, np.where(position <= 3, 1.0, 0.0))
+        final = results['final_position']
+        finish = 20.0 - final + np.where(final == 1, 50.0, np.where(final <= 3, 20.0, 0.0))
+        reward += np.where(results['race_finished'], finish, 0.0)
+        reward -= 15.0 * results['incident']
+        reward -= 30.0 * results['dnf']
+        return reward
+    
     def train_on_race(self, race_results: Dict):
         """Learn from a completed race"""
         # Extract learning data from race results
@@ -192,10 +464,14 @@ class AIDriverRL:
         self.learning_history.append({
             'race': self.races_completed,
             'position': race_results.get('final_position'),
-            'q_table_size': len(self.q_table),
+            'reward': race_results.get('total_reward'),
+            'q_table_size': self.q_table_size,
             'exploration_rate': self.exploration_rate
         })
         
+        if self.replay_batch_size:
+            self.replay()
+        
         # Decay exploration rate (exploit more as we learn)
         self.exploration_rate = max(0.05, self.exploration_rate * 0.99)
     
@@ -209,11 +485,12 @@ class AIDriverRL:
         model_data = {
             'name': self.name,
             'q_table': self.q_table,
+            'visits': self.visits,
             'races_completed': self.races_completed,
             'total_wins': self.total_wins,
             'total_podiums': self.total_podiums,
             'avg_finish_position': self.avg_finish_position,
-            'learning_history': self.learning_history,
+            'learning_history': list(self.learning_history),
             'learned_preferences': self.learned_preferences,
             'exploration_rate': self.exploration_rate
         }
@@ -236,12 +513,21 @@ class AIDriverRL:
             model_data = pickle.load(f)
         
         ai = AIDriverRL(name=model_data.get('name', 'AI Driver'))
-        ai.q_table = model_data.get('q_table', {})
+        q_table = model_data.get('q_table')
+        if isinstance(q_table, dict):
+            # Models saved before the dense table map (state key, action) -> Q-value
+            for (key, action_index), q_value in q_table.items():
+                index = RLState.key_to_index(key)
+                ai.q_table[index, action_index] = q_value
+                ai.visits[index, action_index] = 1
+        elif q_table is not None:
+            ai.q_table = np.asarray(q_table, dtype=np.float32)
+            ai.visits = np.asarray(model_data.get('visits', ai.q_table != 0), dtype=np.int32)
         ai.races_completed = model_data.get('races_completed', 0)
         ai.total_wins = model_data.get('total_wins', 0)
         ai.total_podiums = model_data.get('total_podiums', 0)
         ai.avg_finish_position = model_data.get('avg_finish_position', 0)
-        ai.learning_history = model_data.get('learning_history', [])
+        ai.learning_history = deque(model_data.get('learning_history', []), maxlen=HISTORY_LENGTH)
         ai.learned_preferences = model_data.get('learned_preferences', {})
         ai.exploration_rate = model_data.get('exploration_rate', 0.2)
         
@@ -260,7 +546,7 @@ class AIDriverRL:
             'win_rate': round(win_rate, 2),
             'podium_rate': round(podium_rate, 2),
             'avg_finish_position': round(self.avg_finish_position, 2),
-            'q_table_size': len(self.q_table),
+            'q_table_size': self.q_table_size,
             'exploration_rate': round(self.exploration_rate, 3),
             'learned_preferences': self.learned_preferences,
             'is_trained': self.races_completed >= 10
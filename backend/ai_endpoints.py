@@ -1,42 +1,343 @@
 """
 AI Feature Endpoints - Track Designer and RL Driver
 """
-from flask import Blueprint, jsonify, request
-from track_ai_designer import generate_ai_track
+from flask import Blueprint, Response, jsonify, request, stream_with_context
+from track_ai_designer import (MAX_GENERATIONS, MAX_ISLANDS, MAX_POPULATION, TARGET_METRICS,
+                               IncrementalTrackMetrics, TrackElement, generate_ai_track, generate_pareto_tracks,
+                               seed_population, track_fitness)
 from ai_driver_rl import AIDriverRL
+from race_simulator import WEATHER_TYPES
+from rl_training import MAX_TRAINING_LAPS, MAX_TRAINING_RACES, TRAINING_LAPS, train_driver
+from track_jobs import JobLimitReached, get_job, start_job
+from track_library import get_library, library_track
+from track_simulation import SIMULATED_TARGETS
+import json
+import math
 import os
+import secrets
 
 ai_bp = Blueprint('ai', __name__, url_prefix='/api/ai')
 
 # In-memory AI driver storage
 ai_drivers = {}
 
+# In-memory track editor sessions, oldest dropped first
+editor_sessions = {}
+MAX_EDITOR_SESSIONS = 100
+
+# Default generations of an improve-track run; it starts from a finished track
+IMPROVE_GENERATIONS = 10
+
+# Idle track job streams send a keep-alive comment this often
+JOB_KEEPALIVE_SECONDS = 15
+
+# Only the difficulty target takes a "value", a difficulty score on this scale
+DIFFICULTY_RANGE = (0, 100)
+
+
+def valid_seed(seed):
+    """Seeds are optional; when given they must be non-negative integers (not bools)"""
+    return seed is None or (isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0)
+
+
+def parse_track_options(data: dict):
+    """generate_ai_track keyword arguments from a request body, or an error message"""
+    target_metric = data.get('target', 'balanced')
+    target_value = data.get('value')
+    seed = data.get('seed')
+    
+    if target_metric not in TARGET_METRICS:
+        return None, f'Target must be one of: {TARGET_METRICS}'
+    
+    if target_value is not None:
+        low, high = DIFFICULTY_RANGE
+        if (isinstance(target_value, bool) or not isinstance(target_value, (int, float))
+                or not math.isfinite(target_value)):
+            return None, 'value must be a number'
+        if target_metric == 'difficulty' and not low <= target_value <= high:
+            return None, f'value must be a difficulty score between {low} and {high}'
+    
+    if not valid_seed(seed):
+        return None, 'Seed must be a non-negative integer'
+    
+    population_size = data.get('populationSize', 20)
+    generations = data.get('generations', 50)
+    if not isinstance(population_size, int) or not 2 <= population_size <= MAX_POPULATION:
+        return None, f'populationSize must be between 2 and {MAX_POPULATION}'
+    if not isinstance(generations, int) or not 1 <= generations <= MAX_GENERATIONS:
+        return None, f'generations must be between 1 and {MAX_GENERATIONS}'
+    
+    islands = data.get('islands', 1)
+    migration_interval = data.get('migrationInterval', 10)
+    if not isinstance(islands, int) or not 1 <= islands <= MAX_ISLANDS:
+        return None, f'islands must be between 1 and {MAX_ISLANDS}'
+    if not isinstance(migration_interval, int) or migration_interval < 1:
+        return None, 'migrationInterval must be a positive integer'
+    
+    closed_layout = data.get('closedLayout', False)
+    if not isinstance(closed_layout, bool):
+        return None, 'closedLayout must be true or false'
+    
+    # Race candidate tracks and score them on the results, see track_simulation
+    simulate = data.get('simulate', False)
+    if not isinstance(simulate, bool):
+        return None, 'simulate must be true or false'
+    if simulate and target_metric not in SIMULATED_TARGETS:
+        return None, f'simulate is available for targets: {list(SIMULATED_TARGETS)}'
+    
+    # Stored tracks to start from instead of random ones, see seed_population
+    seed_tracks = data.get('seedTracks')
+    if seed_tracks is not None:
+        if not isinstance(seed_tracks, list):
+            return None, 'seedTracks must be a list of tracks'
+        try:
+            seed_population(seed_tracks)
+        except (ValueError, TypeError) as e:
+            return None, f'Invalid seed track: {e}'
+    
+    # Islands and large populations run on one process per CPU
+    return {
+        'target_metric': target_metric,
+        'target_value': target_value,
+        'seed': seed,
+        'population_size': population_size,
+        'generations': generations,
+        'workers': None,
+        'islands': islands,
+        'migration_interval': migration_interval,
+        'seed_tracks': seed_tracks,
+        'closed_layout': closed_layout,
+        'simulate': simulate
+    }, None
+
 
 @ai_bp.route('/generate-track', methods=['POST'])
 def generate_track():
-    """Generate track using AI designer"""
+    """Generate track using AI designer
+
+    Answered from the track library when it has tracks, unless the body sets
+    "library": false; "refineGenerations" evolves the library's nearest tracks
+    that many generations further. Bodies that set "generations", ask for
+    more than one island, a closed layout, simulation or seed tracks always
+    run a full evolution.
+    """
     data = request.get_json() or {}
+    options, error = parse_track_options(data)
+    if error:
+        return jsonify({'error': error}), 400
     
-    target_metric = data.get('target', 'balanced')
-    target_value = data.get('value')
-    
-    valid_targets = ['overtakes', 'speed', 'difficulty', 'safety', 'balanced']
-    if target_metric not in valid_targets:
-        return jsonify({'error': f'Target must be one of: {valid_targets}'}), 400
+    use_library = data.get('library', True)
+    refine_generations = data.get('refineGenerations', 0)
+    if not isinstance(use_library, bool):
+        return jsonify({'error': 'library must be true or false'}), 400
+    if not isinstance(refine_generations, int) or not 0 <= refine_generations < MAX_GENERATIONS:
+        return jsonify({'error': f'refineGenerations must be between 0 and {MAX_GENERATIONS - 1}'}), 400
     
     try:
-        track_data = generate_ai_track(target_metric, target_value)
+        track_data = None
+        # Library tracks were ranked without simulation and may not close; a library
+        # answer is a 1 + refineGenerations run on one island
+        if (use_library and options['seed_tracks'] is None and not options['simulate']
+                and not options['closed_layout'] and 'generations' not in data and options['islands'] == 1):
+            track_data = library_track(options['target_metric'], options['target_value'], options['seed'],
+                                       refine_generations, options['population_size'])
+        if track_data is None:
+            track_data = generate_ai_track(**options)
         
         return jsonify({
             'message': 'Track generated successfully',
             'track': track_data,
-            'target_metric': target_metric
+            'target_metric': options['target_metric']
         }), 200
         
     except Exception as e:
         return jsonify({'error': f'Generation failed: {str(e)}'}), 500
 
 
+@ai_bp.route('/improve-track', methods=['POST'])
+def improve_track():
+    """Refine an existing track with a short evolution seeded from it"""
+    data = request.get_json() or {}
+    if 'track' not in data:
+        return jsonify({'error': 'Track is required'}), 400
+    
+    options, error = parse_track_options({'generations': IMPROVE_GENERATIONS, **data, 'seedTracks': [data['track']]})
+    if error:
+        return jsonify({'error': error}), 400
+    original = seed_population(options['seed_tracks'])
+    if not len(original):
+        return jsonify({'error': 'Track has no elements'}), 400
+    
+    try:
+        track_data = generate_ai_track(**options)
+    except Exception as e:
+        return jsonify({'error': f'Improvement failed: {str(e)}'}), 500
+    
+    target_metric, target_value = options['target_metric'], options['target_value']
+    return jsonify({
+        'message': 'Track improved successfully',
+        'track': track_data,
+        'target_metric': target_metric,
+        'fitness': {
+            'before': track_fitness(original[0], target_metric, target_value),
+            'after': track_fitness(seed_population([track_data])[0], target_metric, target_value)
+        }
+    }), 200
+
+
+@ai_bp.route('/jobs', methods=['POST'])
+def create_track_job():
+    """Start generating a track in the background; follow it with /jobs/<job_id>"""
+    options, error = parse_track_options(request.get_json() or {})
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        job = start_job(lambda progress_callback: generate_ai_track(**options, progress_callback=progress_callback))
+    except JobLimitReached as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({
+        'message': 'Track generation started',
+        'job_id': job.job_id
+    }), 202
+
+
+@ai_bp.route('/jobs/<job_id>')
+def get_track_job(job_id):
+    """Latest progress of a track job, with its result once it completes"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    return jsonify(job.status()), 200
+
+
+@ai_bp.route('/jobs/<job_id>/stream')
+def stream_track_job(job_id):
+    """Server-sent events: one 'progress' event per generation, then 'finish', 'cancelled' or 'error'"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    def event(name, data):
+        return f'event: {name}\ndata: {json.dumps(data)}\n\n'
+    
+    def generate():
+        seen, done = 0, False
+        while not done:
+            reports, done = job.wait(seen, timeout=JOB_KEEPALIVE_SECONDS)
+            if not reports and not done:
+                # Comment line so proxies keep the connection open
+                yield ': keep-alive\n\n'
+            for report in reports:
+                yield event('progress', report)
+            seen += len(reports)
+        
+        status = job.status()
+        if status['state'] == 'completed':
+            yield event('finish', status['result'])
+        elif status['state'] == 'cancelled':
+            yield event('cancelled', {'job_id': job_id})
+        else:
+            yield event('error', {'error': status['error']})
+    
+    return Response(stream_with_context(generate()), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
+@ai_bp.route('/jobs/<job_id>/stop', methods=['POST'])
+def stop_track_job(job_id):
+    """Stop a track job: 'finish' keeps the best track so far, 'cancel' discards it"""
+    job = get_job(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    
+    data = request.get_json() or {}
+    try:
+        job.stop(data.get('action', 'finish'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify(job.status()), 200
+
+
+@ai_bp.route('/generate-pareto', methods=['POST'])
+def generate_pareto():
+    """Generate the Pareto front of tracks trading off several objectives"""
+    data = request.get_json() or {}
+    
+    objectives = data.get('objectives')
+    seed = data.get('seed')
+    population_size = data.get('populationSize', 100)
+    generations = data.get('generations', 50)
+    front_size = data.get('frontSize', 20)
+    # A previous front's tracks continue its evolution
+    seed_tracks = data.get('seedTracks')
+    
+    if objectives is not None and not isinstance(objectives, list):
+        return jsonify({'error': 'Objectives must be a list'}), 400
+    if not valid_seed(seed):
+        return jsonify({'error': 'Seed must be a non-negative integer'}), 400
+    if not isinstance(population_size, int) or not 2 <= population_size <= MAX_POPULATION:
+        return jsonify({'error': f'populationSize must be between 2 and {MAX_POPULATION}'}), 400
+    if not isinstance(generations, int) or not 1 <= generations <= MAX_GENERATIONS:
+        return jsonify({'error': f'generations must be between 1 and {MAX_GENERATIONS}'}), 400
+    if not isinstance(front_size, int):
+        return jsonify({'error': 'frontSize must be an integer'}), 400
+    if seed_tracks is not None and not isinstance(seed_tracks, list):
+        return jsonify({'error': 'seedTracks must be a list of tracks'}), 400
+    
+    try:
+        result = generate_pareto_tracks(objectives, seed, population_size, generations, front_size, seed_tracks)
+    except (ValueError, TypeError) as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'message': f"Generated {len(result['tracks'])} Pareto-optimal tracks",
+        **result
+    }), 200
+
+
+@ai_bp.route('/library')
+def get_track_library():
+    """Size of the pregenerated track library"""
+    return jsonify(get_library().stats()), 200
+
+
+@ai_bp.route('/library/build', methods=['POST'])
+def build_track_library():
+    """Evolve more tracks into the library in the background; follow it with /jobs/<job_id>"""
+    data = request.get_json() or {}
+    runs_per_target = data.get('runsPerTarget', 4)
+    population_size = data.get('populationSize', 50)
+    generations = data.get('generations', 50)
+    seed = data.get('seed')
+    
+    if not isinstance(runs_per_target, int) or not 1 <= runs_per_target <= 100:
+        return jsonify({'error': 'runsPerTarget must be between 1 and 100'}), 400
+    if not isinstance(population_size, int) or not 2 <= population_size <= MAX_POPULATION:
+        return jsonify({'error': f'populationSize must be between 2 and {MAX_POPULATION}'}), 400
+    if not isinstance(generations, int) or not 1 <= generations <= MAX_GENERATIONS:
+        return jsonify({'error': f'generations must be between 1 and {MAX_GENERATIONS}'}), 400
+    if not valid_seed(seed):
+        return jsonify({'error': 'Seed must be a non-negative integer'}), 400
+    
+    def build(progress_callback):
+        library = get_library()
+        result = library.build(runs_per_target, population_size, generations, seed, progress_callback)
+        library.save()
+        return result
+    
+    try:
+        job = start_job(build)
+    except JobLimitReached as e:
+        return jsonify({'error': str(e)}), 503
+    return jsonify({
+        'message': 'Track library build started',
+        'job_id': job.job_id
+    }), 202
+
+
 @ai_bp.route('/driver/create', methods=['POST'])
 def create_ai_driver():
     """Create a new RL AI driver"""
@@ -154,34 +455,29 @@ def list_ai_drivers():
 
 @ai_bp.route('/driver/<driver_id>/batch-train', methods=['POST'])
 def batch_train_ai_driver(driver_id):
-    """Train AI driver on multiple races"""
+    """Train AI driver on multiple simulated races, learning from every lap"""
     if driver_id not in ai_drivers:
         return jsonify({'error': 'AI driver not found'}), 404
     
     data = request.get_json() or {}
     num_races = data.get('num_races', 10)
     track_data = data.get('track_data', {})
+    laps = data.get('laps', TRAINING_LAPS)
+    weather = data.get('weather', 'dry')
+    seed = data.get('seed')
+    if not isinstance(num_races, int) or not 1 <= num_races <= MAX_TRAINING_RACES:
+        return jsonify({'error': f'num_races must be between 1 and {MAX_TRAINING_RACES}'}), 400
+    if not isinstance(laps, int) or not 1 <= laps <= MAX_TRAINING_LAPS:
+        return jsonify({'error': f'laps must be between 1 and {MAX_TRAINING_LAPS}'}), 400
+    if weather not in WEATHER_TYPES:
+        return jsonify({'error': f'weather must be one of: {WEATHER_TYPES}'}), 400
+    if not valid_seed(seed):
+        return jsonify({'error': 'Seed must be a non-negative integer'}), 400
+    if not isinstance(track_data, dict):
+        return jsonify({'error': 'track_data must be an object'}), 400
     
     ai_driver = ai_drivers[driver_id]
-    
-    # Simulate training races
-    training_results = []
-    
-    for i in range(num_races):
-        # Simple training simulation
-        # In real implementation, run full race simulation
-        mock_result = {
-            'final_position': random.randint(1, 10),
-            'fastest_lap': random.uniform(85, 95),
-            'pit_stops': random.randint(1, 3)
-        }
-        
-        ai_driver.train_on_race(mock_result)
-        training_results.append({
-            'race': i + 1,
-            'position': mock_result['final_position'],
-            'q_table_size': len(ai_driver.q_table)
-        })
+    training_results = train_driver(ai_driver, num_races, track_data, laps, seed, weather)
     
     return jsonify({
         'message': f'Trained on {num_races} races',
@@ -189,3 +485,81 @@ def batch_train_ai_driver(driver_id):
         'training_results': training_results
     }), 200
 
+
+@ai_bp.route('/editor/sessions', methods=['POST'])
+def create_editor_session():
+    """Start tracking metrics for a track being edited"""
+    data = request.get_json() or {}
+    
+    elements = data.get('elements', [])
+    if not isinstance(elements, list):
+        return jsonify({'error': 'elements must be a list of track elements'}), 400
+    try:
+        elements = [TrackElement.from_dict(e) for e in elements]
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    if len(editor_sessions) >= MAX_EDITOR_SESSIONS:
+        del editor_sessions[next(iter(editor_sessions))]
+    session_id = secrets.token_hex(8)
+    editor_sessions[session_id] = IncrementalTrackMetrics(elements)
+    
+    return jsonify({
+        'session_id': session_id,
+        'metrics': editor_sessions[session_id].metrics()
+    }), 201
+
+
+@ai_bp.route('/editor/sessions/<session_id>', methods=['GET', 'DELETE'])
+def editor_session(session_id):
+    """Current metrics of an editor session, or end it"""
+    if session_id not in editor_sessions:
+        return jsonify({'error': 'Editor session not found'}), 404
+    
+    if request.method == 'DELETE':
+        del editor_sessions[session_id]
+        return jsonify({'message': 'Editor session closed'}), 200
+    
+    tracker = editor_sessions[session_id]
+    return jsonify({'elements': len(tracker), 'metrics': tracker.metrics()}), 200
+
+
+@ai_bp.route('/editor/sessions/<session_id>/elements', methods=['POST'])
+def insert_editor_element(session_id):
+    """Insert an element (at the end unless an index is given)"""
+    if session_id not in editor_sessions:
+        return jsonify({'error': 'Editor session not found'}), 404
+    
+    data = request.get_json() or {}
+    tracker = editor_sessions[session_id]
+    index = data.get('index', len(tracker))
+    if not isinstance(index, int) or not 0 <= index <= len(tracker):
+        return jsonify({'error': f'Index must be between 0 and {len(tracker)}'}), 400
+    
+    try:
+        tracker.insert(index, TrackElement.from_dict(data.get('element', {})))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'elements': len(tracker), 'metrics': tracker.metrics()}), 201
+
+
+@ai_bp.route('/editor/sessions/<session_id>/elements/<int:index>', methods=['PUT', 'DELETE'])
+def edit_editor_element(session_id, index):
+    """Change some fields of one element (e.g. after a drag), or remove it"""
+    if session_id not in editor_sessions:
+        return jsonify({'error': 'Editor session not found'}), 404
+    
+    tracker = editor_sessions[session_id]
+    if index >= len(tracker):
+        return jsonify({'error': 'Element not found'}), 404
+    
+    if request.method == 'DELETE':
+        tracker.remove(index)
+    else:
+        try:
+            tracker.replace(index, TrackElement.from_dict(request.get_json() or {}, tracker.elements[index]))
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+    
+    return jsonify({'elements': len(tracker), 'metrics': tracker.metrics()}), 200
@@ -1,9 +1,12 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
-import random
 import time
 import json
-from race_simulator import RaceSimulator
+import numpy as np
+from race_simulator import WEATHER_TYPES, RaceSimulator, StintPlan
+from monte_carlo import MAX_ITERATIONS
+from strategy_optimizer import OBJECTIVES, optimize_strategy
+from result_encoding import ENCODINGS, CONTENT_TYPES, MSGPACK_AVAILABLE, encode_base64, encode_results
 from f1_endpoints import f1_bp
 from ai_endpoints import ai_bp
 
@@ -19,6 +22,9 @@ tracks = []
 race_history = []
 leaderboard_data = {}
 
+# Driver fields passed through to RaceSimulator, see StintPlan.from_config
+STRATEGY_FIELDS = ['pitStrategy', 'tireStrategy', 'preferredTire', 'undercut', 'stintPlan']
+
 @app.route('/api/create-track', methods=['POST'])
 def create_track():
     """Create a new race track"""
@@ -62,6 +68,78 @@ def get_track(track_id):
     
     return jsonify({'track': track}), 200
 
+def parse_track_data(track):
+    """Return the stored full track data for a track, falling back to the track itself"""
+    track_data = track
+    if 'trackData' in track and track['trackData']:
+        try:
+            if isinstance(track['trackData'], str):
+                track_data = json.loads(track['trackData'])
+            else:
+                track_data = track['trackData']
+        except:
+            pass
+    return track_data
+
+def build_drivers(drivers_input, seed=None):
+    """Convert simple racer names or driver objects to driver configs with stats
+
+    Stats for plain names are drawn from the request seed so seeded races stay reproducible.
+    """
+    rng = np.random.default_rng(seed)
+    drivers = []
+    for driver in drivers_input:
+        if isinstance(driver, str):
+            # Simple racer name - add default stats
+            drivers.append({
+                'name': driver,
+                'skill': rng.uniform(0.6, 0.95),
+                'aggression': rng.uniform(0.3, 0.8)
+            })
+        else:
+            # Driver object with stats and optional pit strategy
+            drivers.append(dict(
+                {key: driver[key] for key in STRATEGY_FIELDS if key in driver},
+                name=driver.get('name', f'Driver {len(drivers) + 1}'),
+                skill=driver.get('skill', 0.75),
+                aggression=driver.get('aggression', 0.5)
+            ))
+    return drivers
+
+def valid_seed(seed):
+    """Seeds are optional; when given they must be non-negative integers"""
+    return seed is None or (isinstance(seed, int) and not isinstance(seed, bool) and seed >= 0)
+
+def valid_int(value, low, high):
+    """An integer (not a bool) between low and high inclusive"""
+    return isinstance(value, int) and not isinstance(value, bool) and low <= value <= high
+
+def race_options(data, track):
+    """(laps, weather, safety car probability) of a request body, or an error message
+
+    Limits match RaceSimulationSchema in validation.py, which app_production.py applies.
+    """
+    laps = data.get('laps', track.get('laps', 3))
+    weather = data.get('weather', 'dry')
+    safety_car_prob = data.get('safetyCarProbability', 0.05)
+    if not valid_int(laps, 1, 200):
+        return None, 'laps must be between 1 and 200'
+    if weather not in WEATHER_TYPES:
+        return None, f'Weather must be one of: {WEATHER_TYPES}'
+    if (isinstance(safety_car_prob, bool) or not isinstance(safety_car_prob, (int, float))
+            or not 0.0 <= safety_car_prob <= 0.5):
+        return None, 'safetyCarProbability must be between 0 and 0.5'
+    return (laps, weather, safety_car_prob), None
+
+def stint_plan_error(drivers, total_laps):
+    """Error message for the first driver whose stint plan does not fit the race, or None"""
+    for driver in drivers:
+        try:
+            StintPlan.from_config(driver, total_laps)
+        except (KeyError, TypeError, ValueError) as e:
+            return f"Invalid stint plan for {driver['name']}: {e}"
+    return None
+
 @app.route('/api/simulate-race', methods=['POST'])
 def simulate_race():
     """Advanced race simulation with tire strategy, weather, and lap-by-lap data"""
@@ -78,44 +156,38 @@ def simulate_race():
     if not track:
         return jsonify({'error': 'Track not found'}), 404
     
-    # Parse track data if available
-    track_data = track
-    if 'trackData' in track and track['trackData']:
-        try:
-            if isinstance(track['trackData'], str):
-                track_data = json.loads(track['trackData'])
-            else:
-                track_data = track['trackData']
-        except:
-            pass
+    track_data = parse_track_data(track)
+    
+    seed = data.get('seed')  # optional, makes the race reproducible
+    if not valid_seed(seed):
+        return jsonify({'error': 'Seed must be a non-negative integer'}), 400
     
     # Get drivers with stats
-    drivers_input = data.get('drivers', data.get('racers', []))
-    if not drivers_input:
+    drivers = build_drivers(data.get('drivers', data.get('racers', [])), seed)
+    if not drivers:
         return jsonify({'error': 'At least one driver is required'}), 400
     
-    # Convert simple racer names to driver objects with stats
-    drivers = []
-    for driver in drivers_input:
-        if isinstance(driver, str):
-            # Simple racer name - add default stats
-            drivers.append({
-                'name': driver,
-                'skill': random.uniform(0.6, 0.95),
-                'aggression': random.uniform(0.3, 0.8)
-            })
-        else:
-            # Driver object with stats
-            drivers.append({
-                'name': driver.get('name', f'Driver {len(drivers) + 1}'),
-                'skill': driver.get('skill', 0.75),
-                'aggression': driver.get('aggression', 0.5)
-            })
-    
     # Get race parameters
-    total_laps = data.get('laps', track.get('laps', 3))
-    weather = data.get('weather', 'dry')  # dry, rain, variable
-    safety_car_prob = data.get('safetyCarProbability', 0.05)
+    options, error = race_options(data, track)
+    if error:
+        return jsonify({'error': error}), 400
+    total_laps, weather, safety_car_prob = options
+    
+    error = stint_plan_error(drivers, total_laps)
+    if error:
+        return jsonify({'error': error}), 400
+    result_format = data.get('resultFormat', 'rows')  # rows, columnar
+    encoding = data.get('encoding', 'base64')  # columnar only: base64, msgpack, binary
+    commentary = data.get('commentary', True)  # False skips event recording entirely
+    
+    if result_format not in RaceSimulator.RESULT_FORMATS:
+        return jsonify({'error': f'Result format must be one of: {RaceSimulator.RESULT_FORMATS}'}), 400
+    
+    if encoding not in ENCODINGS:
+        return jsonify({'error': f'Encoding must be one of: {ENCODINGS}'}), 400
+    
+    if encoding == 'msgpack' and not MSGPACK_AVAILABLE:
+        return jsonify({'error': 'msgpack encoding is not available on this server'}), 400
     
     # Create and run simulation
     try:
@@ -124,46 +196,273 @@ def simulate_race():
             drivers=drivers,
             total_laps=total_laps,
             weather=weather,
-            safety_car_prob=safety_car_prob
+            safety_car_prob=safety_car_prob,
+            seed=seed,
+            record_events=bool(commentary)
         )
         
-        race_results = simulator.simulate_race()
+        race_results = simulator.simulate_race(result_format)
         
-        # Update leaderboard with results
-        for result in race_results['race_results']:
-            racer = result['driver']
-            if racer not in leaderboard_data:
-                leaderboard_data[racer] = {
-                    'wins': 0,
-                    'races': 0,
-                    'bestTime': float('inf')
-                }
-            
-            leaderboard_data[racer]['races'] += 1
-            if result['position'] == 1:
-                leaderboard_data[racer]['wins'] += 1
-            
-            # Update best lap time
-            if result['lap_times']:
-                best_lap = min(result['lap_times'])
-                if best_lap < leaderboard_data[racer]['bestTime']:
-                    leaderboard_data[racer]['bestTime'] = best_lap
+        if result_format == 'columnar':
+            columns = race_results
+            race_results = encode_base64(columns)
+            record_race(track_name, drivers, race_results)
+            if encoding != 'base64':
+                return Response(encode_results(columns, encoding), mimetype=CONTENT_TYPES[encoding]), 200
+            return jsonify(race_results), 200
         
-        # Store in race history (simplified format for compatibility)
-        race_history.append({
-            'track': track_name,
-            'winner': race_results['winner'],
-            'time': race_results['winning_time'],
-            'participants': [d['name'] for d in drivers],
-            'results': race_results['race_results'],
-            'full_data': race_results  # Store full simulation data
-        })
+        record_race(track_name, drivers, race_results)
         
         return jsonify(race_results), 200
         
     except Exception as e:
         return jsonify({'error': f'Simulation error: {str(e)}'}), 500
 
+def record_race(track_name, drivers, race_results):
+    """Update the leaderboard and race history with a finished race"""
+    results = race_results.get('race_results')
+    if results is None:
+        # Columnar results: rebuild the per-driver summary rows
+        results = [
+            {'position': i + 1, 'driver': name, 'total_time': total_time, 'best_lap': best_lap, 'status': status}
+            for i, (name, total_time, best_lap, status) in enumerate(zip(
+                race_results['drivers'], race_results['total_time'],
+                race_results['best_lap'], race_results['status']
+            ))
+        ]
+    
+    for result in results:
+        racer = result['driver']
+        if racer not in leaderboard_data:
+            leaderboard_data[racer] = {
+                'wins': 0,
+                'races': 0,
+                'bestTime': float('inf')
+            }
+        
+        leaderboard_data[racer]['races'] += 1
+        if result['position'] == 1:
+            leaderboard_data[racer]['wins'] += 1
+        
+        # Update best lap time
+        best_lap = result.get('best_lap')
+        if best_lap is not None and best_lap < leaderboard_data[racer]['bestTime']:
+            leaderboard_data[racer]['bestTime'] = best_lap
+    
+    # Store in race history (simplified format for compatibility)
+    race_history.append({
+        'track': track_name,
+        'winner': race_results['winner'],
+        'time': race_results['winning_time'],
+        'participants': [d['name'] for d in drivers],
+        'results': results,
+        'full_data': race_results  # Store full simulation data
+    })
+
+def sse_event(event, data):
+    """Format one Server-Sent Events message"""
+    return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+@app.route('/api/simulate-race/stream', methods=['GET'])
+def simulate_race_stream():
+    """Stream a race lap by lap as Server-Sent Events
+    
+    Takes the /api/simulate-race parameters as query arguments; drivers is a
+    comma-separated list of names or a JSON array of driver objects. Emits one
+    'lap' event per lap and a final 'finish' event with the classification.
+    """
+    args = request.args
+    track_name = args.get('track')
+    if not track_name:
+        return jsonify({'error': 'Track name is required'}), 400
+    
+    track = next((t for t in tracks if t['name'] == track_name), None)
+    if not track:
+        return jsonify({'error': 'Track not found'}), 404
+    
+    # Convert explicitly: args.get(type=...) falls back to the default on bad input
+    data = {key: args[key] for key in ('weather',) if key in args}
+    try:
+        seed = int(args['seed']) if 'seed' in args else None
+        if 'laps' in args:
+            data['laps'] = int(args['laps'])
+        if 'safetyCarProbability' in args:
+            data['safetyCarProbability'] = float(args['safetyCarProbability'])
+        drivers_arg = args.get('drivers', args.get('racers', ''))
+        if drivers_arg.startswith('['):
+            drivers_input = json.loads(drivers_arg)
+        else:
+            drivers_input = [name.strip() for name in drivers_arg.split(',') if name.strip()]
+    except ValueError:
+        return jsonify({'error': 'Invalid stream parameters'}), 400
+    
+    if not valid_seed(seed):
+        return jsonify({'error': 'Seed must be a non-negative integer'}), 400
+    
+    drivers = build_drivers(drivers_input, seed)
+    if not drivers:
+        return jsonify({'error': 'At least one driver is required'}), 400
+    
+    options, error = race_options(data, track)
+    if error:
+        return jsonify({'error': error}), 400
+    total_laps, weather, safety_car_prob = options
+    
+    error = stint_plan_error(drivers, total_laps)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Laps are sent as they are computed, so per-lap history is not kept
+    simulator = RaceSimulator(
+        track_data=parse_track_data(track),
+        drivers=drivers,
+        total_laps=total_laps,
+        weather=weather,
+        safety_car_prob=safety_car_prob,
+        seed=seed,
+        record_history=False
+    )
+    
+    def generate():
+        try:
+            for snapshot in simulator.iter_laps():
+                yield sse_event('lap', snapshot)
+            
+            race_results = simulator.generate_results()
+            record_race(track_name, drivers, race_results)
+            # Earlier commentary already went out with the lap events
+            yield sse_event('finish', dict(race_results, commentary=simulator.pop_commentary()))
+        except Exception as e:
+            yield sse_event('error', {'error': f'Simulation error: {str(e)}'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+@app.route('/api/simulate-race/monte-carlo', methods=['POST'])
+def simulate_race_monte_carlo():
+    """Run many independent races and return aggregate win/position/time statistics"""
+    data = request.get_json()
+    
+    if not data or 'track' not in data:
+        return jsonify({'error': 'Track name is required'}), 400
+    
+    track = next((t for t in tracks if t['name'] == data['track']), None)
+    if not track:
+        return jsonify({'error': 'Track not found'}), 404
+    
+    seed = data.get('seed')
+    if not valid_seed(seed):
+        return jsonify({'error': 'Seed must be a non-negative integer'}), 400
+    
+    drivers = build_drivers(data.get('drivers', data.get('racers', [])), seed)
+    if not drivers:
+        return jsonify({'error': 'At least one driver is required'}), 400
+    
+    iterations = data.get('iterations', 1000)
+    if not valid_int(iterations, 1, MAX_ITERATIONS):
+        return jsonify({'error': f'Iterations must be between 1 and {MAX_ITERATIONS}'}), 400
+    
+    options, error = race_options(data, track)
+    if error:
+        return jsonify({'error': error}), 400
+    total_laps, weather, safety_car_prob = options
+    
+    error = stint_plan_error(drivers, total_laps)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        simulator = RaceSimulator(
+            track_data=parse_track_data(track),
+            drivers=drivers,
+            total_laps=total_laps,
+            weather=weather,
+            safety_car_prob=safety_car_prob,
+            seed=seed
+        )
+        summary = simulator.simulate_many(iterations)
+        summary['track'] = track['name']
+        
+        return jsonify(summary), 200
+        
+    except Exception as e:
+        return jsonify({'error': f'Simulation error: {str(e)}'}), 500
+
+@app.route('/api/strategy/optimize', methods=['POST'])
+def optimize_pit_strategy():
+    """Search stint plans for one driver and return the best with confidence intervals"""
+    data = request.get_json()
+    
+    if not data or 'track' not in data:
+        return jsonify({'error': 'Track name is required'}), 400
+    
+    track = next((t for t in tracks if t['name'] == data['track']), None)
+    if not track:
+        return jsonify({'error': 'Track not found'}), 404
+    
+    seed = data.get('seed')
+    if not valid_seed(seed):
+        return jsonify({'error': 'Seed must be a non-negative integer'}), 400
+    
+    drivers = build_drivers(data.get('drivers', data.get('racers', [])), seed)
+    if not drivers:
+        return jsonify({'error': 'At least one driver is required'}), 400
+    
+    driver = data.get('driver', drivers[0]['name'])
+    if driver not in [d['name'] for d in drivers]:
+        return jsonify({'error': f'Driver {driver} is not in the race'}), 400
+    
+    max_stops = data.get('maxStops', 2)
+    if not valid_int(max_stops, 1, 3):
+        return jsonify({'error': 'maxStops must be 1, 2 or 3'}), 400
+    
+    objective = data.get('objective', 'position')
+    if objective not in OBJECTIVES:
+        return jsonify({'error': f'Objective must be one of: {OBJECTIVES}'}), 400
+    
+    # Limits match StrategyOptimizationSchema in validation.py
+    min_races = data.get('minRaces', 8)
+    top = data.get('top', 5)
+    if not valid_int(min_races, 2, 64):
+        return jsonify({'error': 'minRaces must be between 2 and 64'}), 400
+    if not valid_int(top, 1, 20):
+        return jsonify({'error': 'top must be between 1 and 20'}), 400
+    
+    options, error = race_options(data, track)
+    if error:
+        return jsonify({'error': error}), 400
+    total_laps, weather, safety_car_prob = options
+    
+    error = stint_plan_error(drivers, total_laps)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        result = optimize_strategy(
+            track_data=parse_track_data(track),
+            drivers=drivers,
+            total_laps=total_laps,
+            driver=driver,
+            weather=weather,
+            safety_car_prob=safety_car_prob,
+            max_stops=max_stops,
+            objective=objective,
+            min_races=min_races,
+            top=top,
+            seed=seed
+        )
+        result['track'] = track['name']
+        
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Optimization error: {str(e)}'}), 500
+
 @app.route('/api/leaderboard', methods=['GET'])
 def get_leaderboard():
     """Get the leaderboard"""
@@ -2,7 +2,7 @@
 Production-Ready Flask App
 With security, validation, rate limiting, and async tasks
 """
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context
 from flask_cors import CORS
 from flask_caching import Cache
 import json
@@ -10,11 +10,15 @@ import os
 
 # Import local modules
 from race_simulator import RaceSimulator
+from app import parse_track_data, sse_event, stint_plan_error  # request helpers shared with the development app
 from f1_endpoints import f1_bp
-from ai_endpoints import ai_bp
-from validation import validate_and_sanitize_track, validate_and_sanitize_race
+from ai_endpoints import ai_bp, parse_track_options
+from marshmallow import ValidationError
+from validation import validate_and_sanitize_track, validate_and_sanitize_race, MonteCarloSchema, StrategyOptimizationSchema
+from strategy_optimizer import optimize_strategy
+from result_encoding import CONTENT_TYPES, MSGPACK_AVAILABLE, encode_base64, encode_results
 from security import init_limiter, init_security_headers
-from async_tasks import celery_app, simulate_race_async, generate_ai_track_async
+from async_tasks import celery_app, simulate_race_async, generate_ai_track_async, request_track_stop
 
 # Initialize Flask app
 app = Flask(__name__)
@@ -120,25 +124,35 @@ def simulate_race():
         if not track:
             return jsonify({'error': 'Track not found'}), 404
         
-        # Parse track data
-        track_data = track
-        if 'trackData' in track and track['trackData']:
-            try:
-                track_data = json.loads(track['trackData']) if isinstance(track['trackData'], str) else track['trackData']
-            except:
-                pass
+        track_data = parse_track_data(track)
         
         # Get parameters
         drivers = validated_data['drivers']
-        total_laps = validated_data.get('laps', track.get('laps', 3))
+        total_laps = validated_data.get('laps') or track.get('laps', 3)
         weather = validated_data.get('weather', 'dry')
         safety_car_prob = validated_data.get('safetyCarProbability', 0.05)
+        seed = validated_data.get('seed')
+        result_format = validated_data.get('resultFormat', 'rows')
+        encoding = validated_data.get('encoding', 'base64')
+        commentary = validated_data.get('commentary', True)
+        
+        if encoding == 'msgpack' and not MSGPACK_AVAILABLE:
+            return jsonify({'error': 'msgpack encoding is not available on this server'}), 400
+        
+        # Queued results are polled as JSON, so msgpack and binary bodies are only served inline
+        inline_only = result_format == 'columnar' and encoding != 'base64'
+        if use_async and inline_only:
+            return jsonify({'error': 'async results are JSON; use base64 encoding or drop async'}), 400
+        
+        error = stint_plan_error(drivers, total_laps)
+        if error:
+            return jsonify({'error': error}), 400
         
         # Use async for long races (>30 laps) or many drivers (>10)
-        if use_async or total_laps > 30 or len(drivers) > 10:
+        if use_async or (not inline_only and (total_laps > 30 or len(drivers) > 10)):
             # Queue async task
             task = simulate_race_async.delay(
-                track_data, drivers, total_laps, weather, safety_car_prob
+                track_data, drivers, total_laps, weather, safety_car_prob, seed, result_format, commentary
             )
             
             return jsonify({
@@ -148,11 +162,23 @@ def simulate_race():
             }), 202
         
         # Synchronous simulation for quick races
-        simulator = RaceSimulator(track_data, drivers, total_laps, weather, safety_car_prob)
-        results = simulator.simulate_race()
+        simulator = RaceSimulator(track_data, drivers, total_laps, weather, safety_car_prob, seed=seed,
+                                  record_events=commentary)
+        results = simulator.simulate_race(result_format)
+        
+        columns = None
+        if result_format == 'columnar':
+            columns = results
+            results = encode_base64(columns)
+            standings = [
+                {'driver': name, 'position': i + 1, 'best_lap': best_lap}
+                for i, (name, best_lap) in enumerate(zip(columns['drivers'], columns['best_lap']))
+            ]
+        else:
+            standings = results['race_results']
         
         # Update leaderboard
-        for result in results['race_results']:
+        for result in standings:
             racer = result['driver']
             if racer not in leaderboard_data:
                 leaderboard_data[racer] = {'wins': 0, 'races': 0, 'bestTime': float('inf')}
@@ -161,20 +187,162 @@ def simulate_race():
             if result['position'] == 1:
                 leaderboard_data[racer]['wins'] += 1
             
-            if result.get('lap_times'):
-                best_lap = min(result['lap_times'])
-                if best_lap < leaderboard_data[racer]['bestTime']:
-                    leaderboard_data[racer]['bestTime'] = best_lap
+            best_lap = result.get('best_lap')
+            if best_lap is not None and best_lap < leaderboard_data[racer]['bestTime']:
+                leaderboard_data[racer]['bestTime'] = best_lap
         
         # Cache invalidation
         cache.delete('leaderboard')
         
+        if columns is not None and encoding != 'base64':
+            return Response(encode_results(columns, encoding), mimetype=CONTENT_TYPES[encoding]), 200
+        
         return jsonify(results), 200
         
+    except ValidationError as e:
+        return jsonify({'error': f'Validation error: {e.messages}'}), 400
     except Exception as e:
         return jsonify({'error': f'Simulation error: {str(e)}'}), 500
 
 
+@app.route('/api/simulate-race/monte-carlo', methods=['POST'])
+@limiter.limit("10 per minute")
+def simulate_race_monte_carlo():
+    """Run many independent races on the worker pool and return aggregate statistics"""
+    try:
+        data = request.get_json()
+        validated_data = validate_and_sanitize_race(data, MonteCarloSchema())
+        
+        track = next((t for t in tracks if t['name'] == validated_data['track']), None)
+        if not track:
+            return jsonify({'error': 'Track not found'}), 404
+        
+        track_data = parse_track_data(track)
+        total_laps = validated_data.get('laps') or track.get('laps', 3)
+        error = stint_plan_error(validated_data['drivers'], total_laps)
+        if error:
+            return jsonify({'error': error}), 400
+        
+        simulator = RaceSimulator(
+            track_data,
+            validated_data['drivers'],
+            total_laps,
+            validated_data.get('weather', 'dry'),
+            validated_data.get('safetyCarProbability', 0.05),
+            seed=validated_data.get('seed')
+        )
+        summary = simulator.simulate_many(validated_data['iterations'])
+        summary['track'] = track['name']
+        
+        return jsonify(summary), 200
+        
+    except ValidationError as e:
+        return jsonify({'error': f'Validation error: {e.messages}'}), 400
+    except Exception as e:
+        return jsonify({'error': f'Simulation error: {str(e)}'}), 500
+
+
+@app.route('/api/strategy/optimize', methods=['POST'])
+@limiter.limit("5 per minute")
+def optimize_pit_strategy():
+    """Search stint plans for one driver on the worker pool and return the best with confidence intervals"""
+    try:
+        data = request.get_json()
+        validated_data = validate_and_sanitize_race(data, StrategyOptimizationSchema())
+    except Exception as e:
+        return jsonify({'error': f'Invalid strategy request: {str(e)}'}), 400
+    
+    track = next((t for t in tracks if t['name'] == validated_data['track']), None)
+    if not track:
+        return jsonify({'error': 'Track not found'}), 404
+    
+    drivers = validated_data['drivers']
+    driver = validated_data.get('driver') or drivers[0]['name']
+    if driver not in [d['name'] for d in drivers]:
+        return jsonify({'error': f'Driver {driver} is not in the race'}), 400
+    
+    track_data = parse_track_data(track)
+    total_laps = validated_data.get('laps') or track.get('laps', 3)
+    error = stint_plan_error(drivers, total_laps)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    try:
+        result = optimize_strategy(
+            track_data,
+            drivers,
+            total_laps,
+            driver,
+            weather=validated_data.get('weather', 'dry'),
+            safety_car_prob=validated_data.get('safetyCarProbability', 0.05),
+            max_stops=validated_data['maxStops'],
+            objective=validated_data['objective'],
+            min_races=validated_data['minRaces'],
+            top=validated_data['top'],
+            seed=validated_data.get('seed')
+        )
+        result['track'] = track['name']
+        
+        return jsonify(result), 200
+        
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': f'Optimization error: {str(e)}'}), 500
+
+
+@app.route('/api/simulate-race/stream', methods=['GET'])
+@limiter.limit("5 per minute")
+def simulate_race_stream():
+    """Stream a race lap by lap as Server-Sent Events (query arguments, drivers as names or JSON)"""
+    try:
+        args = request.args.to_dict()
+        drivers_arg = args.pop('drivers', '')
+        if drivers_arg.startswith('['):
+            args['drivers'] = json.loads(drivers_arg)
+        else:
+            args['drivers'] = [{'name': name.strip()} for name in drivers_arg.split(',') if name.strip()]
+        validated_data = validate_and_sanitize_race(args)
+    except Exception as e:
+        return jsonify({'error': f'Invalid stream parameters: {str(e)}'}), 400
+    
+    track = next((t for t in tracks if t['name'] == validated_data['track']), None)
+    if not track:
+        return jsonify({'error': 'Track not found'}), 404
+    
+    track_data = parse_track_data(track)
+    total_laps = validated_data.get('laps') or track.get('laps', 3)
+    error = stint_plan_error(validated_data['drivers'], total_laps)
+    if error:
+        return jsonify({'error': error}), 400
+    
+    # Laps are sent as they are computed, so per-lap history is not kept
+    simulator = RaceSimulator(
+        track_data,
+        validated_data['drivers'],
+        total_laps,
+        validated_data.get('weather', 'dry'),
+        validated_data.get('safetyCarProbability', 0.05),
+        seed=validated_data.get('seed'),
+        record_history=False
+    )
+    
+    def generate():
+        try:
+            for snapshot in simulator.iter_laps():
+                yield sse_event('lap', snapshot)
+            results = simulator.generate_results()
+            yield sse_event('finish', dict(results, commentary=simulator.pop_commentary()))
+        except Exception as e:
+            yield sse_event('error', {'error': f'Simulation error: {str(e)}'})
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
 @app.route('/api/task/<task_id>')
 def get_task_status(task_id):
     """Get async task status"""
@@ -207,6 +375,41 @@ def get_task_status(task_id):
     return jsonify(response), 200
 
 
+@app.route('/api/task/<task_id>/stop', methods=['POST'])
+def stop_task(task_id):
+    """Stop an async track generation: 'finish' keeps the best track so far, 'cancel' discards it"""
+    data = request.get_json() or {}
+    action = data.get('action', 'finish')
+    
+    try:
+        request_track_stop(task_id, action)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'task_id': task_id,
+        'action': action,
+        'message': 'Stop requested'
+    }), 202
+
+
+@app.route('/api/ai/generate-track/async', methods=['POST'])
+@limiter.limit("10 per minute")
+def generate_track_async():
+    """Queue AI track generation; poll /api/task/<task_id> for per-generation progress"""
+    options, error = parse_track_options(request.get_json() or {})
+    if error:
+        return jsonify({'error': error}), 400
+    
+    task = generate_ai_track_async.delay(**options)
+    
+    return jsonify({
+        'task_id': task.id,
+        'status': 'processing',
+        'message': 'Track generation queued'
+    }), 202
+
+
 @app.route('/api/leaderboard')
 @cache.cached(timeout=30, key_prefix='leaderboard')
 def get_leaderboard():
@@ -3,6 +3,7 @@ Async Task Queue for Compute-Heavy Operations
 Uses Celery with Redis for distributed task processing
 """
 from celery import Celery
+from celery.exceptions import Ignore
 import os
 import json
 
@@ -27,7 +28,8 @@ celery_app.conf.update(
 
 
 @celery_app.task(name='tasks.simulate_race_async', bind=True)
-def simulate_race_async(self, track_data, drivers, total_laps, weather='dry', safety_car_prob=0.05):
+def simulate_race_async(self, track_data, drivers, total_laps, weather='dry', safety_car_prob=0.05,
+                        seed=None, result_format='rows', record_events=True):
     """
     Asynchronous race simulation
     Runs in background worker for heavy computations
@@ -43,12 +45,17 @@ def simulate_race_async(self, track_data, drivers, total_laps, weather='dry', sa
             drivers=drivers,
             total_laps=total_laps,
             weather=weather,
-            safety_car_prob=safety_car_prob
+            safety_car_prob=safety_car_prob,
+            seed=seed,
+            record_events=record_events
         )
         
         self.update_state(state='PROGRESS', meta={'stage': 'simulating'})
         
-        results = simulator.simulate_race()
+        results = simulator.simulate_race(result_format)
+        if result_format == 'columnar':
+            from result_encoding import encode_base64
+            results = encode_base64(results)
         
         return {
             'status': 'completed',
@@ -60,58 +67,101 @@ def simulate_race_async(self, track_data, drivers, total_laps, weather='dry', sa
         raise
 
 
+def _track_stop_key(task_id):
+    return f'track-job-stop:{task_id}'
+
+
+def request_track_stop(task_id, action='finish'):
+    """Ask a running generate_ai_track_async task to stop at its next generation
+
+    'finish' returns the best track so far, 'cancel' discards the run; a task
+    still waiting in the queue is revoked as well, so it never starts.
+    """
+    from track_jobs import STOP_ACTIONS
+    
+    if action not in STOP_ACTIONS:
+        raise ValueError(f'Stop action must be one of: {STOP_ACTIONS}')
+    celery_app.backend.set(_track_stop_key(task_id), action)
+    if action == 'cancel':
+        celery_app.control.revoke(task_id)
+
+
 @celery_app.task(name='tasks.generate_ai_track_async', bind=True)
-def generate_ai_track_async(self, target_metric, target_value=None):
+def generate_ai_track_async(self, target_metric, target_value=None, seed=None,
+                            population_size=20, generations=50, workers=None, islands=1,
+                            migration_interval=10, seed_tracks=None, closed_layout=False, simulate=False):
     """
     Asynchronous AI track generation
-    Runs genetic algorithm in background
+    Runs genetic algorithm in background, reporting every generation's
+    progress as task meta and stopping early on request_track_stop
     """
     from track_ai_designer import generate_ai_track
     
+    stop_key = _track_stop_key(self.request.id)
+    
+    def report_progress(report):
+        self.update_state(state='PROGRESS', meta={'stage': 'evolving', **report})
+        action = celery_app.backend.get(stop_key)
+        action = action.decode() if isinstance(action, bytes) else action
+        if action == 'cancel':
+            raise Ignore()
+        return action == 'finish'
+    
     # Update progress through generations
     self.update_state(state='PROGRESS', meta={'stage': 'evolving', 'generation': 0})
     
     try:
-        track_data = generate_ai_track(target_metric, target_value)
+        track_data = generate_ai_track(target_metric, target_value, seed, population_size, generations, workers,
+                                       islands, migration_interval, progress_callback=report_progress,
+                                       seed_tracks=seed_tracks, closed_layout=closed_layout, simulate=simulate)
         
         return {
             'status': 'completed',
             'track': track_data
         }
         
+    except Ignore:
+        self.update_state(state='REVOKED', meta={'stage': 'cancelled'})
+        raise
     except Exception as e:
         self.update_state(state='FAILURE', meta={'error': str(e)})
         raise
+    finally:
+        celery_app.backend.delete(stop_key)
 
 
 @celery_app.task(name='tasks.train_ai_driver_async', bind=True)
-def train_ai_driver_async(self, driver_id, num_races, track_data):
+def train_ai_driver_async(self, driver_id, num_races, track_data, laps=None, seed=None, weather='dry',
+                          workers=1):
     """
     Asynchronous AI driver training
-    Runs multiple race simulations for training
+    Races the driver num_races times, learning from every lap; with workers
+    other than 1, copies of it train on a process pool (None = one per CPU)
+    and are merged every SYNC_RACES races
     """
     from ai_driver_rl import AIDriverRL
+    from rl_training import TRAINING_LAPS, train_driver, train_parallel
+    
+    # Races are milliseconds each, so progress goes out about 100 times per run
+    report_every = max(1, num_races // 100)
+    
+    def report_progress(row):
+        if row['race'] % report_every == 0:
+            self.update_state(
+                state='PROGRESS',
+                meta={'stage': 'training', 'progress': row['race'] / num_races * 100, **row}
+            )
     
     try:
         # Load or create AI driver
         ai_driver = AIDriverRL.load_model(f'{driver_id}_model.pkl')
         
-        for race_num in range(num_races):
-            # Update progress
-            progress = (race_num / num_races) * 100
-            self.update_state(
-                state='PROGRESS',
-                meta={'stage': 'training', 'race': race_num + 1, 'progress': progress}
-            )
-            
-            # Simulate training race
-            # (simplified - actual implementation would run full simulation)
-            mock_result = {
-                'final_position': (race_num % 10) + 1,  # Simulated improvement
-                'fastest_lap': 90 - (race_num * 0.1)
-            }
-            
-            ai_driver.train_on_race(mock_result)
+        if workers == 1:
+            train_driver(ai_driver, num_races, track_data, laps or TRAINING_LAPS, seed, weather,
+                         progress_callback=report_progress)
+        else:
+            train_parallel(ai_driver, num_races, track_data, laps or TRAINING_LAPS, seed, weather, workers,
+                           progress_callback=report_progress)
         
         # Save model
         ai_driver.save_model(f'{driver_id}_model.pkl')
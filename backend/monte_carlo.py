@@ -0,0 +1,112 @@
+"""
+Monte Carlo Race Simulation
+Runs many independent races of one setup on a process pool and aggregates
+win probabilities, finishing-position histograms, time percentiles and DNF rates
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from race_simulator import RaceSimulator
+from seeding import SeedLike, as_seed_sequence
+from vectorized_engine import VectorizedRaceEngine
+
+
+MAX_ITERATIONS = 10000
+DEFAULT_BATCH_SIZE = 250
+TIME_PERCENTILES = [5, 25, 50, 75, 95]
+
+
+def _simulate_batch(config: Dict, n_races: int, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """Worker entry point: run one batch of races, return only the outcome arrays"""
+    simulator = RaceSimulator(**config, seed=seed, record_events=False)
+    engine = VectorizedRaceEngine(simulator, n_races=n_races, record_history=False)
+    outcomes = engine.run().outcomes()
+    return {
+        'finishing_position': outcomes['finishing_position'].astype(np.int16),
+        'total_time': outcomes['total_time'],
+        'retired': outcomes['retired'],
+        'pit_stops': outcomes['pit_stops'].astype(np.int16),
+    }
+
+
+def _batch_sizes(n: int, batch_size: int) -> List[int]:
+    full, rest = divmod(n, batch_size)
+    return [batch_size] * full + ([rest] if rest else [])
+
+
+def simulate_many(track_data: Dict, drivers: List[Dict], total_laps: int, n: int,
+                  weather: str = 'dry', safety_car_prob: float = 0.05,
+                  workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                  seed: SeedLike = None) -> Dict:
+    """Run n independent races and return aggregate statistics per driver
+
+    Races are split into batches for the vectorized engine; batches run on a
+    process pool when there is more than one of them and more than one worker.
+    Each batch gets its own seed spawned from `seed`, so results depend on the
+    seed and batch size but not on the number of workers.
+    """
+    if not 1 <= n <= MAX_ITERATIONS:
+        raise ValueError(f'Number of races must be between 1 and {MAX_ITERATIONS}')
+
+    config = {
+        'track_data': track_data,
+        'drivers': drivers,
+        'total_laps': total_laps,
+        'weather': weather,
+        'safety_car_prob': safety_car_prob,
+    }
+    batches = _batch_sizes(n, batch_size)
+    seeds = as_seed_sequence(seed).spawn(len(batches))
+    workers = min(workers or os.cpu_count() or 1, len(batches))
+
+    if workers > 1:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_simulate_batch, [config] * len(batches), batches, seeds))
+    else:
+        results = [_simulate_batch(config, size, s) for size, s in zip(batches, seeds)]
+
+    outcomes = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+    return aggregate_outcomes(outcomes, drivers, total_laps)
+
+
+def aggregate_outcomes(outcomes: Dict[str, np.ndarray], drivers: List[Dict], total_laps: int) -> Dict:
+    """Reduce per-race outcome arrays of shape (races, drivers) to per-driver statistics"""
+    positions = outcomes['finishing_position']
+    total_time = outcomes['total_time']
+    retired = outcomes['retired']
+    n_races, n_drivers = positions.shape
+
+    # histogram[i, p] = races where driver i finished in position p + 1
+    histogram = np.zeros((n_drivers, n_drivers), dtype=np.int64)
+    np.add.at(histogram, (np.broadcast_to(np.arange(n_drivers), positions.shape), positions - 1), 1)
+
+    summaries = []
+    for i, driver in enumerate(drivers):
+        finished = ~retired[:, i]
+        times = total_time[finished, i]
+        summaries.append({
+            'driver': driver['name'],
+            'win_probability': round(float(histogram[i, 0]) / n_races, 4),
+            'podium_probability': round(float(histogram[i, :3].sum()) / n_races, 4),
+            'mean_position': round(float(positions[:, i].mean()), 3),
+            'position_histogram': histogram[i].tolist(),
+            'dnf_rate': round(1.0 - float(finished.mean()), 4),
+            'mean_total_time': round(float(times.mean()), 3) if len(times) else None,
+            'total_time_percentiles': (
+                {f'p{p}': round(float(v), 3) for p, v in zip(TIME_PERCENTILES, np.percentile(times, TIME_PERCENTILES))}
+                if len(times) else None
+            ),
+            'mean_pit_stops': round(float(outcomes['pit_stops'][:, i].mean()), 3),
+        })
+
+    summaries.sort(key=lambda s: (-s['win_probability'], s['mean_position']))
+
+    return {
+        'iterations': n_races,
+        'total_laps': total_laps,
+        'drivers': summaries,
+        'favourite': summaries[0]['driver'] if summaries else None,
+    }
@@ -0,0 +1,89 @@
+"""
+Pareto Ranking
+Fast non-dominated sorting and crowding distance (as in NSGA-II) over an
+objective matrix with one row per candidate, every objective maximised
+"""
+import numpy as np
+
+
+# Pairwise comparisons are done in row blocks of about this many values
+BLOCK_VALUES = 1 << 22
+
+
+def dominance(objectives: np.ndarray):
+    """Bit-packed matrix whose row i marks the points i dominates, plus how often each is dominated
+
+    Point i dominates j when it is at least as good in every objective and
+    better in one. Rows must be distinct and sorted lexicographically (as
+    np.unique returns them): a point then can only dominate points before it,
+    which halves the comparisons, and being at least as good everywhere is
+    enough. Rows are compared in blocks, so memory stays at n * n / 8 bytes
+    for the packed matrix however large n is.
+    """
+    n, k = objectives.shape
+    dominated_by = np.zeros(n, dtype=np.int64)
+    packed = np.zeros((n, (n + 7) // 8), dtype=np.uint8)
+    block = max(1, BLOCK_VALUES // max(1, n))
+    for start in range(0, n, block):
+        stop = min(n, start + block)
+        rows, earlier = objectives[start:stop], objectives[:stop]
+        # One objective at a time: reducing a short last axis is far slower in NumPy.
+        # Distinct points that are at least as good everywhere are better somewhere
+        dominates = rows[:, 0, None] >= earlier[None, :, 0]
+        for j in range(1, k):
+            dominates &= rows[:, j, None] >= earlier[None, :, j]
+        dominates[np.arange(len(rows)), np.arange(start, stop)] = False
+        dominated_by[:stop] += dominates.sum(axis=0)
+        packed[start:stop, :(stop + 7) // 8] = np.packbits(dominates, axis=1)
+    return packed, dominated_by
+
+
+def non_dominated_sort(objectives: np.ndarray) -> np.ndarray:
+    """Front of every point: 0 for the Pareto front, 1 for the front behind it, ...
+
+    Identical points always share a front, so they are ranked once.
+    """
+    unique, inverse = np.unique(objectives, axis=0, return_inverse=True)
+    n = len(unique)
+    packed, dominated_by = dominance(unique)
+
+    fronts = np.full(n, -1, dtype=np.int64)
+    current = np.flatnonzero(dominated_by == 0)
+    front = 0
+    while len(current):
+        fronts[current] = front
+        dominated_by[current] = -1
+        dominated_by -= np.unpackbits(packed[current], axis=1, count=n).sum(axis=0, dtype=np.int64)
+        current = np.flatnonzero(dominated_by == 0)
+        front += 1
+    return fronts[inverse.ravel()]
+
+
+def crowding_distance(objectives: np.ndarray, fronts: np.ndarray) -> np.ndarray:
+    """Crowding distance of every point within its own front
+
+    Sum over objectives of the gap between a point's neighbours, relative to
+    the front's range; the extremes of each front get infinity so they are
+    always kept.
+    """
+    n, k = objectives.shape
+    distance = np.zeros(n)
+    if n == 0:
+        return distance
+
+    for j in range(k):
+        order = np.lexsort((objectives[:, j], fronts))
+        values = objectives[order, j].astype(float)
+        segment = fronts[order]
+
+        first = np.r_[True, segment[1:] != segment[:-1]]
+        last = np.r_[segment[1:] != segment[:-1], True]
+        starts, ends = np.flatnonzero(first), np.flatnonzero(last)
+        span = np.repeat(values[ends] - values[starts], ends - starts + 1)
+
+        gap = np.zeros(n)
+        gap[1:-1] = values[2:] - values[:-2]
+        contribution = np.divide(gap, span, out=np.zeros(n), where=span > 0)
+        contribution[first | last] = np.inf
+        distance[order] += contribution
+    return distance
@@ -0,0 +1,59 @@
+"""
+Race Event Log
+Records race events as fixed-size rows in a preallocated NumPy buffer so the
+hot lap loop never formats text; commentary is rendered from the rows only
+when somebody reads it
+"""
+from typing import List
+
+import numpy as np
+
+
+EVENT_TYPES = [
+    'race_start', 'grid', 'lap_summary', 'pit_stop', 'tire_warning', 'overtake',
+    'retirement', 'incident', 'weather_change', 'safety_car', 'safety_car_in', 'race_finish',
+]
+EVENT_CODES = {name: code for code, name in enumerate(EVENT_TYPES)}
+
+# driver/other are car indices (or a small integer argument such as a compound
+# or tire age), detail is an index into a per-event lookup table and value
+# carries times and gaps (NaN when unused)
+EVENT_DTYPE = np.dtype([
+    ('lap', np.int32),
+    ('code', np.int8),
+    ('driver', np.int16),
+    ('other', np.int16),
+    ('detail', np.int8),
+    ('value', np.float64),
+])
+
+
+class EventLog:
+    """Append-only buffer of race events that doubles in size when full"""
+
+    def __init__(self, capacity: int = 256, enabled: bool = True):
+        self.enabled = enabled
+        self.size = 0
+        self.rows = np.empty(capacity if enabled else 0, dtype=EVENT_DTYPE)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def record(self, lap: int, event_type: str, driver: int = -1, other: int = -1,
+               detail: int = -1, value: float = np.nan):
+        if not self.enabled:
+            return
+        if self.size == len(self.rows):
+            self.rows = np.concatenate([self.rows, np.empty(max(len(self.rows), 16), dtype=EVENT_DTYPE)])
+        self.rows[self.size] = (lap, EVENT_CODES[event_type], driver, other, detail, value)
+        self.size += 1
+
+    def since(self, start: int = 0) -> np.ndarray:
+        """View of the events recorded from index start on"""
+        return self.rows[start:self.size]
+
+    def count(self, event_type: str) -> int:
+        return int((self.since()['code'] == EVENT_CODES[event_type]).sum())
+
+    def types(self, start: int = 0) -> List[str]:
+        return [EVENT_TYPES[code] for code in self.since(start)['code']]
@@ -2,20 +2,86 @@
 Advanced Race Simulation Engine
 Handles lap-by-lap race simulation with tire wear, pit stops, weather, and incidents
 """
-import random
 import json
-from typing import List, Dict, Any, Tuple
+from operator import attrgetter
+import numpy as np
+from typing import List, Dict, Any, Tuple, Optional, Iterator
 
+from ai_driver_rl import RLAction, RLState
+from race_events import EVENT_TYPES, EventLog
+from seeding import RandomStreams, SeedLike, choice, uniform
+from tire_model import TireCompound, TireModel
 
-class TireCompound:
-    """Tire compound characteristics"""
-    COMPOUNDS = {
-        'soft': {'grip': 1.0, 'wear_rate': 1.5, 'optimal_laps': 15, 'name': 'Soft'},
-        'medium': {'grip': 0.85, 'wear_rate': 1.0, 'optimal_laps': 25, 'name': 'Medium'},
-        'hard': {'grip': 0.7, 'wear_rate': 0.6, 'optimal_laps': 40, 'name': 'Hard'},
-        'intermediate': {'grip': 0.9, 'wear_rate': 0.8, 'optimal_laps': 30, 'name': 'Intermediate'},
-        'wet': {'grip': 1.0, 'wear_rate': 0.5, 'optimal_laps': 35, 'name': 'Wet'},
-    }
+
+def round_list(values: List[float], digits: int = 3) -> List[float]:
+    """Round a list of floats in one NumPy pass"""
+    return np.round(np.asarray(values, dtype=float), digits).tolist()
+
+
+# Lookup tables for the integer event log columns
+TIRE_NAMES = list(TireCompound.COMPOUNDS)
+TIRE_INDEX = {name: i for i, name in enumerate(TIRE_NAMES)}
+INCIDENT_TYPES = ['spin', 'crash', 'mechanical', 'puncture', 'collision']
+WEATHER_TYPES = ['dry', 'rain', 'variable']
+PIT_NOW = RLAction.get_action_index('pit_now')
+
+
+class StintPlan:
+    """Planned tire strategy: the compound for each stint and the laps to pit on"""
+    STOPS = {'one-stop': 1, 'two-stop': 2, 'three-stop': 3}
+    STINT_COMPOUND = {'conservative': 'hard', 'balanced': 'medium', 'aggressive': 'soft'}
+    # Undercutting drivers come in this many laps before the even-split window
+    UNDERCUT_LAPS = 2
+    
+    def __init__(self, compounds: List[str], pit_laps: List[int]):
+        if len(compounds) != len(pit_laps) + 1:
+            raise ValueError('A stint plan needs exactly one more compound than pit laps')
+        unknown = [c for c in compounds if c not in TireCompound.COMPOUNDS]
+        if unknown:
+            raise ValueError(f'Unknown tire compounds: {unknown}')
+        if any(lap < 1 for lap in pit_laps) or any(b <= a for a, b in zip(pit_laps, pit_laps[1:])):
+            raise ValueError('Pit laps must be positive and strictly increasing')
+        self.compounds = list(compounds)
+        self.pit_laps = [int(lap) for lap in pit_laps]
+    
+    @classmethod
+    def from_config(cls, config: Dict, total_laps: int) -> Optional['StintPlan']:
+        """Plan for a driver config: its explicit stintPlan, or one derived from pitStrategy
+        
+        Derived plans start on preferredTire and split the race into equal stints
+        on the compound matching tireStrategy. 'adaptive' (the default) has no
+        plan and leaves pit calls to tire condition and the strategic window.
+        """
+        if config.get('stintPlan'):
+            plan = cls(config['stintPlan']['compounds'], config['stintPlan']['pitLaps'])
+            if plan.pit_laps and plan.pit_laps[-1] >= total_laps:
+                raise ValueError(f'Pit laps must come before the last lap ({total_laps})')
+            return plan
+        
+        pit_strategy = config.get('pitStrategy', 'adaptive')
+        tire_strategy = config.get('tireStrategy', 'balanced')
+        if pit_strategy != 'adaptive' and pit_strategy not in cls.STOPS:
+            raise ValueError(f"Unknown pit strategy '{pit_strategy}'")
+        if tire_strategy not in cls.STINT_COMPOUND:
+            raise ValueError(f"Unknown tire strategy '{tire_strategy}'")
+        if pit_strategy == 'adaptive':
+            return None
+        
+        stops = cls.STOPS[pit_strategy]
+        shift = cls.UNDERCUT_LAPS if config.get('undercut') else 0
+        pit_laps = sorted({max(1, round(total_laps * k / (stops + 1)) - shift) for k in range(1, stops + 1)})
+        stint_compound = cls.STINT_COMPOUND[tire_strategy]
+        return cls([config.get('preferredTire', 'medium')] + [stint_compound] * len(pit_laps), pit_laps)
+    
+    def pit_due(self, stint: int, lap: int) -> bool:
+        return stint < len(self.pit_laps) and lap >= self.pit_laps[stint]
+    
+    def compound_after(self, stint: int) -> str:
+        """Compound fitted at the end of stint; extra (unplanned) stops keep the last one"""
+        return self.compounds[min(stint + 1, len(self.compounds) - 1)]
+    
+    def to_dict(self) -> Dict[str, List]:
+        return {'compounds': self.compounds, 'pitLaps': self.pit_laps}
 
 
 class Driver:
@@ -26,17 +92,27 @@ class Driver:
         self.car_number = car_number
         self.position = 0
         self.lap_time = 0.0
+        self.best_lap_time = float('inf')
         self.total_time = 0.0
         self.current_tire = 'medium'
         self.tire_age = 0
         self.tire_condition = 1.0
         self.pit_stops = 0
+        self.plan: Optional[StintPlan] = None  # None = adaptive pit calls
+        self.stint = 0
         self.incidents = []
         self.lap_times = []
         self.positions = []
         self.gaps = []
         self.is_retired = False
         self.retirement_reason = None
+        self.last_incident_lap = 0
+        # Policy-controlled drivers: the AIDriverRL deciding each lap, see RaceSimulator
+        self.policy = None
+        self.action = None
+        self.rl_state: Optional[RLState] = None
+        self.rl_reward = 0.0
+        self.wear_age = 0.0  # tire wear in laps; actions wear tires faster or slower than tire_age counts
         
     def to_dict(self):
         return {
@@ -54,9 +130,31 @@ class Driver:
 
 
 class RaceSimulator:
+    ENGINES = ['classic', 'vectorized']
+    RESULT_FORMATS = ['rows', 'columnar']
+    # Independent random stream per subsystem, see seeding.RandomStreams
+    RANDOM_STREAMS = ['grid', 'weather', 'safety_car', 'pits', 'laps', 'incidents', 'overtakes']
+    
     def __init__(self, track_data: Dict, drivers: List[Dict], total_laps: int, 
-                 weather: str = 'dry', safety_car_prob: float = 0.05):
+                 weather: str = 'dry', safety_car_prob: float = 0.05, engine: str = 'classic',
+                 seed: SeedLike = None, record_history: bool = True, record_events: bool = True,
+                 policy_training: bool = False):
+        """A driver config with a 'policy' (an AIDriverRL) is policy-controlled: each
+        lap its policy picks an RLAction, whose RLAction.EFFECTS apply to that lap.
+        With policy_training the policies explore and learn from every lap (see
+        learn_policy_actions); otherwise they race on what they know.
+        """
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown engine '{engine}', expected one of {self.ENGINES}")
+        if engine != 'classic' and any(d.get('policy') for d in drivers):
+            raise ValueError('Policy-controlled drivers need the classic engine')
+        
         self.track_data = track_data
+        self.engine = engine
+        # Without history drivers keep no per-lap lists, so memory does not grow with race length
+        self.record_history = record_history
+        # Same seed, same race: every random draw comes from these streams
+        self.rng = RandomStreams(self.RANDOM_STREAMS, seed)
         self.total_laps = total_laps
         self.weather = weather
         self.weather_conditions = [weather]  # Track weather per lap
@@ -64,6 +162,8 @@ class RaceSimulator:
         self.base_lap_time = track_data.get('metrics', {}).get('estimatedLapTime', 90.0)
         
         # Initialize drivers
+        self.driver_configs = drivers
+        self.driver_names = [d['name'] for d in drivers]
         self.drivers = []
         for i, driver_data in enumerate(drivers):
             driver = Driver(
@@ -72,47 +172,137 @@ class RaceSimulator:
                 aggression=driver_data.get('aggression', 0.5),
                 car_number=i + 1
             )
+            driver.plan = StintPlan.from_config(driver_data, total_laps)
+            driver.policy = driver_data.get('policy')
+            driver.current_tire = driver.plan.compounds[0] if driver.plan else driver_data.get('preferredTire', 'medium')
             self.drivers.append(driver)
         
+        self.policy_drivers = [d for d in self.drivers if d.policy is not None]
+        self.policy_training = policy_training
+        
+        # Running cars in track order, retired cars in the order they retired
+        self.running_order: List[Driver] = []
+        self.retired_order: List[Driver] = []
+        
+        # Wear and lap time factor per driver, compound and tire age, see tire_model
+        self.tire_model = TireModel([d.aggression for d in self.drivers], weather, total_laps)
+        self.condition_table = self.tire_model.condition.tolist()
+        self.lap_factor_table = self.tire_model.lap_factor.tolist()
+        
         # Race state
         self.current_lap = 0
         self.safety_car_active = False
         self.safety_car_laps = 0
-        self.race_events = []
-        self.commentary = []
+        self.safety_car_periods = 0
+        self.vector_engine = None
+        # Events are recorded as compact rows; commentary text is only built when read
+        self.events = EventLog(enabled=record_events)
+        self.grid_order: List[int] = []
+        self.rendered_commentary: List[Dict[str, Any]] = []
+        self.commentary_cursor = 0
         
         # Track characteristics
         self.track_length = track_data.get('metrics', {}).get('totalLength', 5000)
         self.difficulty = track_data.get('metrics', {}).get('difficultyScore', 50)
         self.overtake_difficulty = 100 - track_data.get('metrics', {}).get('possibleOvertakes', 3) * 10
         
-    def simulate_race(self) -> Dict[str, Any]:
-        """Run the complete race simulation"""
-        self.add_commentary("🏁 Race Start!", "race_start")
+    def simulate_race(self, result_format: str = 'rows') -> Dict[str, Any]:
+        """Run the complete race simulation
+        
+        result_format 'rows' gives one dict per driver; 'columnar' gives driver-by-lap
+        NumPy matrices, see generate_columnar_results.
+        """
+        if result_format not in self.RESULT_FORMATS:
+            raise ValueError(f"Unknown result format '{result_format}', expected one of {self.RESULT_FORMATS}")
+        
+        for _ in self.iter_laps(snapshots=False):
+            pass
+        
+        if result_format == 'columnar':
+            return self.generate_columnar_results()
+        return self.generate_results()
+    
+    def iter_laps(self, snapshots: bool = True) -> Iterator[Dict[str, Any]]:
+        """Run the race one lap at a time, yielding a compact snapshot after each lap
+        
+        With snapshots=False only the lap number is yielded. Call generate_results()
+        once the generator is exhausted for the final classification.
+        """
+        self.record_event('race_start')
         
         # Initialize grid positions
-        random.shuffle(self.drivers)
+        self.rng.grid.shuffle(self.drivers)
         for i, driver in enumerate(self.drivers):
             driver.position = i + 1
-            
-        self.add_commentary(
-            f"Grid: {', '.join([f'P{i+1} {d.name}' for i, d in enumerate(self.drivers)])}",
-            "grid"
-        )
+        self.running_order = list(self.drivers)
+        self.grid_order = [d.car_number - 1 for d in self.drivers]
+        self.record_event('grid')
+        
+        engine = None
+        if self.engine == 'vectorized':
+            from vectorized_engine import VectorizedRaceEngine
+            engine = VectorizedRaceEngine(self, record_history=self.record_history)
+            self.vector_engine = engine
         
         # Simulate each lap
         for lap in range(1, self.total_laps + 1):
             self.current_lap = lap
-            self.simulate_lap()
-            
-            # Check for race finish
-            if lap == self.total_laps:
-                self.add_commentary(
-                    f"🏁 {self.drivers[0].name} WINS THE RACE! 🏆",
-                    "race_finish"
-                )
+            if engine is None:
+                self.simulate_lap()
+            else:
+                engine.simulate_lap(lap)
+                engine.sync_standings()
+            yield self.lap_snapshot() if snapshots else lap
+        
+        if engine is not None:
+            engine.write_back()
+        
+        # Check for race finish
+        running = [d for d in self.drivers if not d.is_retired]
+        if self.total_laps > 0 and running:
+            winner = min(running, key=lambda d: d.total_time)
+            self.record_event('race_finish', winner)
+    
+    def lap_snapshot(self) -> Dict[str, Any]:
+        """Running order after the current lap plus the commentary added since the last snapshot"""
+        ordered = sorted(self.drivers, key=lambda d: (d.is_retired, d.position))
+        leader_time = ordered[0].total_time
         
-        return self.generate_results()
+        return {
+            'lap': self.current_lap,
+            'total_laps': self.total_laps,
+            'weather': self.weather_conditions[-1],
+            'safety_car': self.safety_car_active,
+            'standings': [
+                {
+                    'position': i + 1,
+                    'driver': d.name,
+                    'gap': None if d.is_retired else round(d.total_time - leader_time, 3),
+                    'lastLap': round(d.lap_time, 3),
+                    'tire': d.current_tire,
+                    'pitStops': d.pit_stops,
+                    'retired': d.is_retired,
+                }
+                for i, d in enumerate(ordered)
+            ],
+            'commentary': self.pop_commentary(),
+        }
+    
+    def pop_commentary(self) -> List[Dict[str, Any]]:
+        """Commentary entries added since the last call"""
+        commentary = self.commentary
+        new = commentary[self.commentary_cursor:]
+        self.commentary_cursor = len(commentary)
+        return new
+    
+    def simulate_many(self, n: int, workers: Optional[int] = None) -> Dict[str, Any]:
+        """Run n independent races of this setup and return aggregate statistics"""
+        from monte_carlo import simulate_many
+        return simulate_many(
+            self.track_data, self.driver_configs, self.total_laps, n,
+            weather=self.weather, safety_car_prob=self.safety_car_prob, workers=workers,
+            seed=self.rng.spawn(1)[0]
+        )
     
     def simulate_lap(self):
         """Simulate a single lap for all drivers"""
@@ -122,15 +312,14 @@ class RaceSimulator:
         self.update_weather()
         
         # Check for safety car
-        if not self.safety_car_active and random.random() < self.safety_car_prob:
-            self.deploy_safety_car()
-        elif self.safety_car_active:
-            self.safety_car_laps += 1
-            if self.safety_car_laps >= random.randint(2, 4):
-                self.clear_safety_car()
+        self.update_safety_car()
         
-        # Simulate each driver's lap
-        active_drivers = [d for d in self.drivers if not d.is_retired]
+        if self.policy_drivers:
+            self.choose_policy_actions()
+        
+        # Simulate each driver's lap, in running order
+        active_drivers = self.running_order
+        retirements = len(self.retired_order)
         
         for driver in active_drivers:
             # Check for pit stop
@@ -141,7 +330,9 @@ class RaceSimulator:
             lap_time = self.calculate_lap_time(driver)
             driver.lap_time = lap_time
             driver.total_time += lap_time
-            driver.lap_times.append(lap_time)
+            driver.best_lap_time = min(driver.best_lap_time, lap_time)
+            if self.record_history:
+                driver.lap_times.append(lap_time)
             
             # Update tire condition
             self.update_tire_condition(driver)
@@ -149,10 +340,17 @@ class RaceSimulator:
             # Check for incidents
             self.check_for_incidents(driver)
         
-        # Update positions based on total time
-        active_drivers.sort(key=lambda d: d.total_time)
+        # Drivers who retired this lap drop to the back. The running order carries
+        # over between laps and lap deltas only swap a few cars, so the re-sort
+        # sees long pre-sorted runs and is near-linear
+        if len(self.retired_order) > retirements:
+            active_drivers = self.running_order = [d for d in active_drivers if not d.is_retired]
+        active_drivers.sort(key=attrgetter('total_time'))
+        
         for i, driver in enumerate(active_drivers):
             driver.position = i + 1
+            if not self.record_history:
+                continue
             driver.positions.append(i + 1)
             
             # Calculate gap to leader
@@ -162,28 +360,77 @@ class RaceSimulator:
                 gap = driver.total_time - active_drivers[0].total_time
                 driver.gaps.append(gap)
         
-        # Add retired drivers at the end
-        retired_drivers = [d for d in self.drivers if d.is_retired]
-        for driver in retired_drivers:
-            driver.positions.append(len(active_drivers) + retired_drivers.index(driver) + 1)
-            driver.gaps.append(999.0)
+        # Retired drivers behind the field, in the order they retired
+        for i, driver in enumerate(self.retired_order, len(active_drivers) + 1):
+            driver.position = i
+            if self.record_history:
+                driver.positions.append(driver.position)
+                driver.gaps.append(999.0)
         
         # Attempt overtakes
         if not self.safety_car_active:
             self.simulate_overtakes(active_drivers)
         
         # Add lap summary to commentary
+        if active_drivers:
+            self.add_lap_summary(active_drivers[0], active_drivers[1] if len(active_drivers) > 1 else None)
+        
+        if self.policy_drivers:
+            self.learn_policy_actions()
+    
+    def policy_state(self, driver: Driver, lap: int) -> RLState:
+        """RLState of a driver going into a lap"""
+        leader_time = self.running_order[0].total_time if self.running_order else driver.total_time
+        return RLState(lap, self.total_laps, driver.position, driver.tire_age, driver.tire_condition,
+                       driver.total_time - leader_time, self.weather_conditions[-1])
+    
+    def choose_policy_actions(self):
+        """Every running policy driver picks its action for the current lap"""
+        for driver in self.policy_drivers:
+            if driver.is_retired:
+                continue
+            if driver.rl_state is None:
+                driver.rl_state = self.policy_state(driver, self.current_lap)
+            driver.action = driver.policy.choose_action(driver.rl_state, is_training=self.policy_training)
+    
+    def learn_policy_actions(self):
+        """Reward each policy driver's action of this lap and, when training, learn from it
+        
+        The transition runs from the state going into the lap to the state going
+        into the next one; the last lap and a retirement end the episode.
+        """
+        running = self.running_order
+        average_lap = sum(d.lap_time for d in running) / len(running) if running else 0.0
+        finished = self.current_lap == self.total_laps
+        for driver in self.policy_drivers:
+            state = driver.rl_state
+            if state is None:
+                continue
+            result = {
+                'position_gained': driver.position < state.position,
+                'position_lost': driver.position > state.position,
+                'faster_than_average': not driver.is_retired and driver.lap_time < average_lap,
+                'incident': driver.last_incident_lap == self.current_lap,
+                'dnf': driver.is_retired,
+                'race_finished': finished and not driver.is_retired,
+                'final_position': driver.position
+            }
+            reward = driver.policy.calculate_reward(state, driver.action, result)
+            driver.rl_reward += reward
+            next_state = None if finished or driver.is_retired else self.policy_state(driver, self.current_lap + 1)
+            if self.policy_training:
+                driver.policy.update_q_value(state, driver.action, reward, next_state)
+            driver.rl_state = next_state
+    
+    def add_lap_summary(self, leader: Driver, runner_up: Optional[Driver] = None):
+        """Add the periodic leader/gap summary for the current lap"""
+        lap = self.current_lap
         if lap % 5 == 0 or lap == 1 or lap == self.total_laps:
-            leader = active_drivers[0] if active_drivers else None
-            if leader:
-                gap_text = ""
-                if len(active_drivers) > 1:
-                    gap = active_drivers[1].total_time - leader.total_time
-                    gap_text = f" leads by {gap:.1f}s"
-                self.add_commentary(
-                    f"Lap {lap}/{self.total_laps}: {leader.name}{gap_text}",
-                    "lap_summary"
-                )
+            if runner_up is None:
+                self.record_event('lap_summary', leader)
+            else:
+                self.record_event('lap_summary', leader, runner_up.car_number - 1,
+                                  value=runner_up.total_time - leader.total_time)
     
     def calculate_lap_time(self, driver: Driver) -> float:
         """Calculate lap time based on driver, tire, weather, and track conditions"""
@@ -192,10 +439,8 @@ class RaceSimulator:
         # Driver skill effect (-5% to +5%)
         skill_factor = 1.0 - (driver.skill * 0.1 - 0.05)
         
-        # Tire effect
-        tire_data = TireCompound.COMPOUNDS[driver.current_tire]
-        tire_grip = tire_data['grip']
-        tire_factor = 1.0 / (tire_grip * driver.tire_condition)
+        # Tire effect (1 / (grip * condition))
+        tire_factor = self.lap_factor_table[driver.car_number - 1][TIRE_INDEX[driver.current_tire]][driver.tire_age]
         
         # Weather effect
         weather_factor = self.get_weather_factor(driver)
@@ -208,55 +453,45 @@ class RaceSimulator:
         difficulty_factor = 1.0 + (self.difficulty / 1000)
         
         # Random variation (0.5% to 1.5%)
-        random_factor = random.uniform(0.995, 1.015)
+        random_factor = uniform(self.rng.laps, 0.995, 1.015)
         
         lap_time = base_time * skill_factor * tire_factor * weather_factor * difficulty_factor * random_factor
+        if driver.policy is not None:
+            lap_time *= RLAction.EFFECTS[driver.action].pace
         
         return lap_time
     
     def update_tire_condition(self, driver: Driver):
-        """Update tire wear"""
-        driver.tire_age += 1
-        tire_data = TireCompound.COMPOUNDS[driver.current_tire]
-        wear_rate = tire_data['wear_rate']
-        optimal_laps = tire_data['optimal_laps']
-        
-        # Tire condition degrades faster after optimal window
-        if driver.tire_age <= optimal_laps:
-            wear_per_lap = 0.02 * wear_rate
+        """Age the tires one lap; wear comes from the precomputed tire model"""
+        if driver.policy is None:
+            driver.tire_age += 1
         else:
-            # Accelerated wear after optimal window
-            extra_laps = driver.tire_age - optimal_laps
-            wear_per_lap = 0.02 * wear_rate * (1 + extra_laps * 0.05)
-        
-        # Aggression increases wear
-        wear_per_lap *= (1 + driver.aggression * 0.2)
-        
-        # Weather effects
-        if self.weather == 'rain' and driver.current_tire not in ['intermediate', 'wet']:
-            wear_per_lap *= 2.0  # Wrong tires wear much faster
-        
-        driver.tire_condition = max(0.3, driver.tire_condition - wear_per_lap)
+            driver.wear_age += RLAction.EFFECTS[driver.action].wear
+            driver.tire_age = min(int(driver.wear_age), self.tire_model.max_age)
+        driver.tire_condition = self.condition_table[driver.car_number - 1][TIRE_INDEX[driver.current_tire]][driver.tire_age]
         
         # Warn about tire condition
         if driver.tire_condition < 0.5 and driver.tire_age % 5 == 0:
-            self.add_commentary(
-                f"{driver.name} struggling on {driver.tire_age}-lap old {driver.current_tire} tires",
-                "tire_warning"
-            )
+            self.announce_tire_warning(driver)
     
     def should_pit(self, driver: Driver) -> bool:
         """Determine if driver should pit"""
-        # Must pit at least once in race
-        if driver.pit_stops == 0 and self.current_lap > self.total_laps * 0.7:
+        plan = driver.plan
+        if driver.policy is not None and driver.action == PIT_NOW:
+            return True
+        if plan is None:
+            # Must pit at least once in race
+            if driver.pit_stops == 0 and self.current_lap > self.total_laps * 0.7:
+                return True
+        elif plan.pit_due(driver.stint, self.current_lap):
             return True
         
         # Tire condition critical
         if driver.tire_condition < 0.4:
             return True
         
-        # Strategic window (random element)
-        if driver.tire_age > 20 and random.random() < 0.2:
+        # Strategic window (random element), planned drivers stick to their plan
+        if plan is None and driver.tire_age > 20 and self.rng.pits.random() < 0.2:
             return True
         
         # Weather change
@@ -270,37 +505,42 @@ class RaceSimulator:
     
     def execute_pit_stop(self, driver: Driver):
         """Execute a pit stop"""
-        # Choose new tire compound
-        if self.weather == 'rain':
-            new_tire = 'wet' if random.random() > 0.3 else 'intermediate'
+        rng = self.rng.pits
+        planned = driver.plan.compound_after(driver.stint) if driver.plan else None
+        
+        # Choose new tire compound; in rain a planned slick gives way to wet tires
+        if planned and (self.weather != 'rain' or planned in ['intermediate', 'wet']):
+            new_tire = planned
+        elif self.weather == 'rain':
+            new_tire = 'wet' if rng.random() > 0.3 else 'intermediate'
         elif self.weather == 'variable':
-            new_tire = random.choice(['soft', 'medium', 'intermediate'])
+            new_tire = choice(rng, ['soft', 'medium', 'intermediate'])
         else:
             # Dry conditions - choose based on race phase
             if self.current_lap < self.total_laps * 0.3:
-                new_tire = random.choice(['medium', 'hard'])
+                new_tire = choice(rng, ['medium', 'hard'])
             elif self.current_lap < self.total_laps * 0.7:
-                new_tire = random.choice(['medium', 'soft', 'hard'])
+                new_tire = choice(rng, ['medium', 'soft', 'hard'])
             else:
-                new_tire = random.choice(['soft', 'medium'])
+                new_tire = choice(rng, ['soft', 'medium'])
         
         old_tire = driver.current_tire
         driver.current_tire = new_tire
         driver.tire_age = 0
+        driver.wear_age = 0.0
         driver.tire_condition = 1.0
         driver.pit_stops += 1
+        driver.stint += 1
         
         # Pit stop time loss (20-25 seconds)
-        pit_time = random.uniform(20.0, 25.0)
+        pit_time = uniform(rng, 20.0, 25.0)
         driver.total_time += pit_time
         
-        self.add_commentary(
-            f"Lap {self.current_lap}: {driver.name} pits! {old_tire} → {new_tire} (+{pit_time:.1f}s)",
-            "pit_stop"
-        )
+        self.announce_pit_stop(driver, old_tire, new_tire, pit_time)
     
     def simulate_overtakes(self, drivers: List[Driver]):
         """Simulate overtaking between nearby drivers"""
+        rng = self.rng.overtakes
         for i in range(len(drivers) - 1):
             driver_behind = drivers[i + 1]
             driver_ahead = drivers[i]
@@ -328,17 +568,20 @@ class RaceSimulator:
             )
             
             # Random component
-            overtake_chance += random.uniform(-0.1, 0.1)
+            overtake_chance += uniform(rng, -0.1, 0.1)
+            
+            # Attacking and defending policy drivers
+            if driver_behind.policy is not None:
+                overtake_chance += RLAction.EFFECTS[driver_behind.action].attack
+            if driver_ahead.policy is not None:
+                overtake_chance -= RLAction.EFFECTS[driver_ahead.action].defend
             
-            if overtake_chance > 0.3 and random.random() < overtake_chance:
+            if overtake_chance > 0.3 and rng.random() < overtake_chance:
                 # Successful overtake - swap positions slightly
-                time_advantage = random.uniform(0.3, 0.8)
+                time_advantage = uniform(rng, 0.3, 0.8)
                 driver_behind.total_time -= time_advantage
                 
-                self.add_commentary(
-                    f"Lap {self.current_lap}: {driver_behind.name} overtakes {driver_ahead.name}! 🏎️💨",
-                    "overtake"
-                )
+                self.announce_overtake(driver_behind, driver_ahead)
     
     def check_for_incidents(self, driver: Driver):
         """Check for random incidents (crashes, mechanical failures)"""
@@ -359,44 +602,39 @@ class RaceSimulator:
         if self.weather == 'rain':
             incident_prob += 0.015
         
-        if random.random() < incident_prob:
-            incident_type = random.choice([
-                'spin', 'crash', 'mechanical', 'puncture', 'collision'
-            ])
+        if driver.policy is not None:
+            incident_prob += RLAction.EFFECTS[driver.action].risk
+        
+        rng = self.rng.incidents
+        if rng.random() < incident_prob:
+            incident_type = choice(rng, INCIDENT_TYPES)
+            driver.last_incident_lap = self.current_lap
             
             if incident_type in ['crash', 'mechanical']:
                 # Retirement
                 driver.is_retired = True
+                self.retired_order.append(driver)
                 driver.retirement_reason = incident_type
-                self.add_commentary(
-                    f"Lap {self.current_lap}: {driver.name} OUT! {incident_type.upper()}! 💥",
-                    "retirement"
-                )
+                self.announce_retirement(driver, incident_type)
                 # Chance of safety car
-                if random.random() < 0.6:
+                if rng.random() < 0.6:
                     self.deploy_safety_car()
             else:
                 # Time penalty
-                time_loss = random.uniform(5.0, 15.0)
+                time_loss = uniform(rng, 5.0, 15.0)
                 driver.total_time += time_loss
-                self.add_commentary(
-                    f"Lap {self.current_lap}: {driver.name} has a {incident_type}! (+{time_loss:.1f}s)",
-                    "incident"
-                )
+                self.announce_incident(driver, incident_type, time_loss)
     
     def update_weather(self):
         """Update weather conditions"""
         if self.weather == 'variable':
             # 10% chance of weather change each lap
-            if random.random() < 0.1:
+            if self.rng.weather.random() < 0.1:
                 old_weather = self.weather_conditions[-1]
-                new_weather = random.choice(['dry', 'rain'])
+                new_weather = choice(self.rng.weather, ['dry', 'rain'])
                 if new_weather != old_weather:
                     self.weather_conditions.append(new_weather)
-                    self.add_commentary(
-                        f"Lap {self.current_lap}: Weather change! Now {new_weather.upper()}! 🌧️" if new_weather == 'rain' else f"Lap {self.current_lap}: Track drying! ☀️",
-                        "weather_change"
-                    )
+                    self.announce_weather_change(new_weather)
                     return
         
         self.weather_conditions.append(self.weather_conditions[-1] if self.weather_conditions else self.weather)
@@ -419,31 +657,103 @@ class RaceSimulator:
         
         return 1.0
     
+    def update_safety_car(self):
+        """Deploy or clear the safety car at the start of a lap"""
+        rng = self.rng.safety_car
+        if not self.safety_car_active and rng.random() < self.safety_car_prob:
+            self.deploy_safety_car()
+        elif self.safety_car_active:
+            self.safety_car_laps += 1
+            if self.safety_car_laps >= rng.integers(2, 5):
+                self.clear_safety_car()
+    
     def deploy_safety_car(self):
         """Deploy safety car"""
         if not self.safety_car_active:
             self.safety_car_active = True
             self.safety_car_laps = 0
-            self.add_commentary(
-                f"Lap {self.current_lap}: 🚨 SAFETY CAR DEPLOYED! 🚨",
-                "safety_car"
-            )
+            self.safety_car_periods += 1
+            self.record_event('safety_car')
     
     def clear_safety_car(self):
         """Clear safety car"""
         self.safety_car_active = False
-        self.add_commentary(
-            f"Lap {self.current_lap}: 🟢 SAFETY CAR IN! Racing resumes! 🟢",
-            "safety_car_in"
-        )
+        self.record_event('safety_car_in')
     
-    def add_commentary(self, text: str, event_type: str):
-        """Add commentary and event"""
-        self.commentary.append({
-            'lap': self.current_lap,
-            'text': text,
-            'type': event_type
-        })
+    # Event helpers, shared by the classic and vectorized engines
+    
+    def announce_weather_change(self, new_weather: str):
+        self.record_event('weather_change', detail=WEATHER_TYPES.index(new_weather))
+    
+    def announce_pit_stop(self, driver: Driver, old_tire: str, new_tire: str, pit_time: float):
+        self.record_event('pit_stop', driver, TIRE_INDEX[old_tire], TIRE_INDEX[new_tire], pit_time)
+    
+    def announce_tire_warning(self, driver: Driver):
+        self.record_event('tire_warning', driver, driver.tire_age, TIRE_INDEX[driver.current_tire])
+    
+    def announce_overtake(self, driver_behind: Driver, driver_ahead: Driver):
+        self.record_event('overtake', driver_behind, driver_ahead.car_number - 1)
+    
+    def announce_retirement(self, driver: Driver, incident_type: str):
+        self.record_event('retirement', driver, detail=INCIDENT_TYPES.index(incident_type))
+    
+    def announce_incident(self, driver: Driver, incident_type: str, time_loss: float):
+        self.record_event('incident', driver, detail=INCIDENT_TYPES.index(incident_type), value=time_loss)
+    
+    def record_event(self, event_type: str, driver: Optional[Driver] = None, other: int = -1,
+                     detail: int = -1, value: float = np.nan):
+        """Record a structured event for the current lap"""
+        if self.events.enabled:
+            self.events.record(self.current_lap, event_type,
+                               driver.car_number - 1 if driver is not None else -1, other, detail, value)
+    
+    @property
+    def commentary(self) -> List[Dict[str, Any]]:
+        """Commentary dicts ({'lap', 'text', 'type'}), rendered from events not formatted yet"""
+        if len(self.rendered_commentary) < len(self.events):
+            self.rendered_commentary.extend(self.render_events(len(self.rendered_commentary)))
+        return self.rendered_commentary
+    
+    def render_events(self, start: int = 0) -> List[Dict[str, Any]]:
+        """Format recorded events from index start on as commentary dicts"""
+        return [
+            {'lap': lap, 'text': self.event_text(EVENT_TYPES[code], lap, driver, other, detail, value),
+             'type': EVENT_TYPES[code]}
+            for lap, code, driver, other, detail, value in self.events.since(start).tolist()
+        ]
+    
+    def event_text(self, event_type: str, lap: int, driver: int, other: int, detail: int, value: float) -> str:
+        names = self.driver_names
+        name = names[driver] if driver >= 0 else None
+        
+        if event_type == 'race_start':
+            return "🏁 Race Start!"
+        if event_type == 'grid':
+            return f"Grid: {', '.join([f'P{i+1} {names[car]}' for i, car in enumerate(self.grid_order)])}"
+        if event_type == 'lap_summary':
+            gap_text = f" leads by {value:.1f}s" if other >= 0 else ""
+            return f"Lap {lap}/{self.total_laps}: {name}{gap_text}"
+        if event_type == 'pit_stop':
+            return f"Lap {lap}: {name} pits! {TIRE_NAMES[other]} → {TIRE_NAMES[detail]} (+{value:.1f}s)"
+        if event_type == 'tire_warning':
+            return f"{name} struggling on {other}-lap old {TIRE_NAMES[detail]} tires"
+        if event_type == 'overtake':
+            return f"Lap {lap}: {name} overtakes {names[other]}! 🏎️💨"
+        if event_type == 'retirement':
+            return f"Lap {lap}: {name} OUT! {INCIDENT_TYPES[detail].upper()}! 💥"
+        if event_type == 'incident':
+            return f"Lap {lap}: {name} has a {INCIDENT_TYPES[detail]}! (+{value:.1f}s)"
+        if event_type == 'weather_change':
+            if WEATHER_TYPES[detail] == 'rain':
+                return f"Lap {lap}: Weather change! Now RAIN! 🌧️"
+            return f"Lap {lap}: Track drying! ☀️"
+        if event_type == 'safety_car':
+            return f"Lap {lap}: 🚨 SAFETY CAR DEPLOYED! 🚨"
+        if event_type == 'safety_car_in':
+            return f"Lap {lap}: 🟢 SAFETY CAR IN! Racing resumes! 🟢"
+        if event_type == 'race_finish':
+            return f"🏁 {name} WINS THE RACE! 🏆"
+        return event_type
     
     def generate_results(self) -> Dict[str, Any]:
         """Generate final race results"""
@@ -459,11 +769,12 @@ class RaceSimulator:
                     'car_number': driver.car_number,
                     'total_time': round(driver.total_time, 3),
                     'gap_to_leader': round(driver.total_time - self.drivers[0].total_time, 3) if i > 0 else 0.0,
-                    'lap_times': [round(t, 3) for t in driver.lap_times],
+                    'lap_times': round_list(driver.lap_times),
                     'positions': driver.positions,
-                    'gaps': [round(g, 3) for g in driver.gaps],
+                    'gaps': round_list(driver.gaps),
                     'pit_stops': driver.pit_stops,
                     'final_tire': driver.current_tire,
+                    'best_lap': round(driver.best_lap_time, 3) if driver.best_lap_time < float('inf') else None,
                     'status': 'Finished',
                 }
             else:
@@ -473,29 +784,66 @@ class RaceSimulator:
                     'car_number': driver.car_number,
                     'total_time': round(driver.total_time, 3),
                     'gap_to_leader': 'DNF',
-                    'lap_times': [round(t, 3) for t in driver.lap_times],
+                    'lap_times': round_list(driver.lap_times),
                     'positions': driver.positions,
-                    'gaps': [round(g, 3) for g in driver.gaps],
+                    'gaps': round_list(driver.gaps),
                     'pit_stops': driver.pit_stops,
                     'final_tire': driver.current_tire,
+                    'best_lap': round(driver.best_lap_time, 3) if driver.best_lap_time < float('inf') else None,
                     'status': f'DNF - {driver.retirement_reason}',
                 }
             results.append(result)
         
-        # Race summary
-        winner = self.drivers[0]
-        fastest_lap = min([min(d.lap_times) for d in self.drivers if d.lap_times])
-        fastest_lap_driver = next(d for d in self.drivers if d.lap_times and min(d.lap_times) == fastest_lap)
+        return dict(self.race_summary(self.drivers), race_results=results)
+    
+    def generate_columnar_results(self) -> Dict[str, Any]:
+        """Final results as columns in classification order
+        
+        Per-driver values are lists; lap_times (float32, NaN after retirement),
+        positions (int8, int16 above 127 cars) and gaps (float32) are
+        drivers x laps NumPy matrices. Encode with result_encoding.encode_results.
+        """
+        ordered = sorted(self.drivers, key=lambda d: (d.is_retired, d.total_time))
+        position_dtype = np.int8 if len(ordered) <= np.iinfo(np.int8).max else np.int16
+        
+        if self.vector_engine is not None and self.vector_engine.record_history:
+            lap_times, positions, gaps = self.vector_engine.history_matrices(ordered)
+        else:
+            lap_times = np.full((len(ordered), len(ordered[0].positions) if ordered else 0), np.nan)
+            for row, driver in enumerate(ordered):
+                lap_times[row, :len(driver.lap_times)] = driver.lap_times
+            positions = [d.positions for d in ordered]
+            gaps = [d.gaps for d in ordered]
+        
+        return dict(
+            self.race_summary(ordered),
+            format='columnar',
+            drivers=[d.name for d in ordered],
+            car_numbers=[d.car_number for d in ordered],
+            status=['Finished' if not d.is_retired else f'DNF - {d.retirement_reason}' for d in ordered],
+            total_time=round_list([d.total_time for d in ordered]),
+            pit_stops=[d.pit_stops for d in ordered],
+            final_tire=[d.current_tire for d in ordered],
+            best_lap=[round(d.best_lap_time, 3) if d.best_lap_time < float('inf') else None for d in ordered],
+            lap_times=np.asarray(lap_times, dtype=np.float32),
+            positions=np.asarray(positions, dtype=position_dtype),
+            gaps=np.asarray(gaps, dtype=np.float32),
+        )
+    
+    def race_summary(self, ordered: List[Driver]) -> Dict[str, Any]:
+        """Race-level result fields shared by the row and columnar formats"""
+        winner = ordered[0]
+        fastest_lap_driver = min(ordered, key=lambda d: d.best_lap_time)
+        fastest_lap = fastest_lap_driver.best_lap_time
         
         return {
-            'race_results': results,
             'winner': winner.name,
             'winning_time': round(winner.total_time, 3),
             'total_laps': self.total_laps,
             'fastest_lap': round(fastest_lap, 3),
             'fastest_lap_driver': fastest_lap_driver.name,
             'commentary': self.commentary,
-            'safety_car_periods': sum(1 for c in self.commentary if c['type'] == 'safety_car'),
+            'safety_car_periods': self.safety_car_periods,
             'weather_summary': self.weather_conditions,
             'track_name': self.track_data.get('name', 'Unknown Track'),
         }
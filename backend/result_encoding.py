@@ -0,0 +1,134 @@
+"""
+Compact Race Result Encoding
+Serializes columnar race results (NumPy matrices for lap times, positions and
+gaps) as base64 arrays inside JSON, as MessagePack, or as raw little-endian
+buffers behind a small JSON header
+"""
+import base64
+import json
+import struct
+from typing import Any, Dict, Tuple
+
+import numpy as np
+
+try:
+    import msgpack
+    MSGPACK_AVAILABLE = True
+except ImportError:
+    MSGPACK_AVAILABLE = False
+
+
+ENCODINGS = ['base64', 'msgpack', 'binary']
+CONTENT_TYPES = {
+    'base64': 'application/json',
+    'msgpack': 'application/msgpack',
+    'binary': 'application/octet-stream',
+}
+
+# Binary layout: magic, uint32 header length, JSON header, then each array's
+# bytes starting on an 8-byte boundary
+BINARY_MAGIC = b'RSC1'
+ALIGNMENT = 8
+
+
+def _little_endian(array: np.ndarray) -> np.ndarray:
+    return np.ascontiguousarray(array, dtype=array.dtype.newbyteorder('<'))
+
+
+def _describe(array: np.ndarray) -> Dict[str, Any]:
+    return {'dtype': array.dtype.str, 'shape': list(array.shape)}
+
+
+def _split(results: Dict[str, Any]) -> Tuple[Dict[str, Any], Dict[str, np.ndarray]]:
+    """Separate the NumPy arrays of a result dict from its plain values"""
+    arrays = {k: _little_endian(v) for k, v in results.items() if isinstance(v, np.ndarray)}
+    plain = {k: v for k, v in results.items() if k not in arrays}
+    return plain, arrays
+
+
+def encode_base64(results: Dict[str, Any]) -> Dict[str, Any]:
+    """JSON-safe dict with every array replaced by {dtype, shape, data (base64)}"""
+    plain, arrays = _split(results)
+    for name, array in arrays.items():
+        plain[name] = dict(_describe(array), data=base64.b64encode(array.tobytes()).decode('ascii'))
+    return plain
+
+
+def decode_base64(payload: Dict[str, Any]) -> Dict[str, Any]:
+    """Inverse of encode_base64"""
+    results = dict(payload)
+    for name, value in payload.items():
+        if isinstance(value, dict) and {'dtype', 'shape', 'data'} <= set(value):
+            data = base64.b64decode(value['data'])
+            results[name] = np.frombuffer(data, dtype=value['dtype']).reshape(value['shape'])
+    return results
+
+
+def encode_msgpack(results: Dict[str, Any]) -> bytes:
+    """MessagePack document with arrays as {dtype, shape, data (raw bytes)}"""
+    if not MSGPACK_AVAILABLE:
+        raise ValueError('msgpack encoding requires the msgpack package')
+    plain, arrays = _split(results)
+    for name, array in arrays.items():
+        plain[name] = dict(_describe(array), data=array.tobytes())
+    return msgpack.packb(plain, use_bin_type=True)
+
+
+def decode_msgpack(data: bytes) -> Dict[str, Any]:
+    """Inverse of encode_msgpack"""
+    if not MSGPACK_AVAILABLE:
+        raise ValueError('msgpack encoding requires the msgpack package')
+    results = msgpack.unpackb(data, raw=False)
+    for name, value in results.items():
+        if isinstance(value, dict) and {'dtype', 'shape', 'data'} <= set(value):
+            results[name] = np.frombuffer(value['data'], dtype=value['dtype']).reshape(value['shape'])
+    return results
+
+
+def encode_binary(results: Dict[str, Any]) -> bytes:
+    """Raw little-endian buffers; the JSON header holds plain values and array offsets"""
+    plain, arrays = _split(results)
+    layout = {}
+    offset = 0
+    for name, array in arrays.items():
+        offset += -offset % ALIGNMENT
+        layout[name] = dict(_describe(array), offset=offset)
+        offset += array.nbytes
+
+    header = json.dumps(dict(plain, arrays=layout)).encode('utf-8')
+    preamble = BINARY_MAGIC + struct.pack('<I', len(header)) + header
+    preamble += b'\0' * (-len(preamble) % ALIGNMENT)
+
+    body = bytearray(offset)
+    for name, array in arrays.items():
+        start = layout[name]['offset']
+        body[start:start + array.nbytes] = array.tobytes()
+    return preamble + bytes(body)
+
+
+def decode_binary(data: bytes) -> Dict[str, Any]:
+    """Inverse of encode_binary; arrays are zero-copy views into data"""
+    if data[:4] != BINARY_MAGIC:
+        raise ValueError('Not a binary race result')
+    (header_length,) = struct.unpack_from('<I', data, 4)
+    header_end = 8 + header_length
+    results = json.loads(data[8:header_end].decode('utf-8'))
+    body_start = header_end + (-header_end % ALIGNMENT)
+
+    for name, spec in results.pop('arrays').items():
+        count = int(np.prod(spec['shape']))
+        results[name] = np.frombuffer(
+            data, dtype=spec['dtype'], count=count, offset=body_start + spec['offset']
+        ).reshape(spec['shape'])
+    return results
+
+
+def encode_results(results: Dict[str, Any], encoding: str = 'base64'):
+    """Encode columnar results; base64 returns a dict for jsonify, the others bytes"""
+    if encoding == 'base64':
+        return encode_base64(results)
+    if encoding == 'msgpack':
+        return encode_msgpack(results)
+    if encoding == 'binary':
+        return encode_binary(results)
+    raise ValueError(f"Unknown encoding '{encoding}', expected one of {ENCODINGS}")
@@ -0,0 +1,348 @@
+"""
+RL Driver Training
+Trains AIDriverRL agents by racing them. run_episode races one agent in a
+classic-engine race, its policy making every lap's decision; train_agents races
+whole batches at once on the vectorized engine, choosing actions and updating
+the agents' Q-tables with array operations
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ai_driver_rl import N_STATES, WEATHER_INDEX, ActionEffect, AIDriverRL, RLAction, RLState, scatter_update
+from race_simulator import RaceSimulator
+from seeding import SeedLike, as_seed_sequence
+from vectorized_engine import WEATHER_STATES, VectorizedRaceEngine
+
+TRAINING_LAPS = 20
+MAX_TRAINING_RACES = 20000
+MAX_TRAINING_LAPS = 100
+# Races stepped together by train_agents
+TRAINING_BATCH = 500
+# Races per train_parallel round, split into TRAINING_BATCH shards trained in parallel
+SYNC_RACES = 4000
+# Cars per training race; opponents fill the grid up to it
+TRAINING_FIELD = 10
+
+# The learner races a mid-field car, so its results come from its decisions
+TRAINING_SKILL = 0.78
+TRAINING_AGGRESSION = 0.5
+# Opponents spread like app.build_drivers stats
+TRAINING_OPPONENTS = [
+    {'name': f'Opponent {i + 1}', 'skill': float(skill), 'aggression': float(aggression)}
+    for i, (skill, aggression) in enumerate(zip(np.linspace(0.6, 0.95, 9), np.linspace(0.3, 0.8, 9)))
+]
+
+
+N_ACTIONS = len(RLAction.ACTIONS)
+PIT_NOW = RLAction.get_action_index('pit_now')
+NORMAL_PACE = RLAction.EFFECTS[RLAction.get_action_index('normal_pace')]
+# WEATHER_INDEX of each vectorized engine weather state
+WEATHER_ROW = np.array([WEATHER_INDEX[weather] for weather in WEATHER_STATES])
+
+
+class PolicyRaceEngine(VectorizedRaceEngine):
+    """Vectorized engine whose first cars are driven by AIDriverRL agents
+
+    Car i < len(car_agents) is driven by agents[car_agents[i]]. Every lap the
+    policy cars of all races pick epsilon-greedy actions from the agents'
+    Q-tables, stacked into one (agents, states, actions) array. When training,
+    the batch's transitions update it after the last lap, one scatter per lap
+    from the last lap back, so a race's result reaches its first lap within
+    the batch (see scatter_update), and they go into the replay buffer of
+    each agent with replay on.
+    """
+
+    def __init__(self, simulator, agents: Sequence[AIDriverRL], car_agents: Sequence[int], n_races: int,
+                 seed: SeedLike = None, training: bool = True):
+        super().__init__(simulator, n_races, seed, record_history=False)
+        self.agents = list(agents)
+        self.car_agents = np.asarray(car_agents, dtype=np.int64)
+        self.training = training
+        self.q_tables = np.stack([agent.q_table for agent in self.agents])
+        self.visits = np.stack([agent.visits for agent in self.agents])
+        self.learning_rate = np.array([agent.learning_rate for agent in self.agents])
+        self.discount = np.array([agent.discount_factor for agent in self.agents])
+        self.exploration = np.array([agent.exploration_rate for agent in self.agents])
+        self.policy_rng = np.random.default_rng(self.rng.spawn(1)[0])
+
+        # Grid order as in iter_laps; it is the running order going into lap 1
+        shape = self.total_time.shape
+        self.order = np.argsort(self.rng.grid.random(shape), axis=1)
+        # Tire wear in laps, fractional under actions that wear faster or slower
+        self.wear_age = self.tire_age.astype(float)
+        self.incident = np.zeros(shape, dtype=bool)
+        # Cars without a policy drive at normal pace
+        self.neutral = {name: np.full(shape, value) for name, value in zip(ActionEffect._fields, NORMAL_PACE)}
+
+        # Per policy car: the state going into the lap, its action and the reward so far
+        policy_shape = (n_races, len(self.car_agents))
+        self.state = self.state_position = self.state_condition = None
+        self.actions = np.zeros(policy_shape, dtype=np.int64)
+        self.total_reward = np.zeros(policy_shape)
+        # (mask, state, action, reward, next state, terminal) per lap
+        self.transitions = []
+
+    def run(self):
+        super().run()
+        if self.training:
+            for transition in reversed(self.transitions):
+                self.update_q_tables(*transition)
+            for agent, q_table, visits in zip(self.agents, self.q_tables, self.visits):
+                agent.q_table[:] = q_table
+                agent.visits[:] = visits
+            if any(agent.replay_buffer is not None for agent in self.agents):
+                self.store_transitions()
+        return self
+
+    def store_transitions(self):
+        """Add the batch's transitions to the replay buffers of the agents that have one"""
+        mask, state, actions, reward, next_state, terminal = (np.stack(arrays) for arrays in zip(*self.transitions))
+        for k, agent in enumerate(self.agents):
+            if agent.replay_buffer is not None:
+                stored = mask & (self.car_agents == k)
+                agent.replay_buffer.add_batch(state[stored], actions[stored], reward[stored], next_state[stored],
+                                              terminal[stored])
+
+    def observe(self, lap: int):
+        """Position, tire condition and Q-table row of every policy car going into a lap"""
+        cars = len(self.car_agents)
+        position = np.empty_like(self.order)
+        position[self.race_index, self.order] = self.driver_index + 1
+        position = position[:, :cars]
+        gap = self.total_time[:, :cars] - self.total_time[self.race_index, self.order[:, :1]]
+        condition = self.tire_condition[:, :cars]
+        state = RLState.batch_index(lap, self.sim.total_laps, position, self.tire_age[:, :cars], condition, gap,
+                                    WEATHER_ROW[self.weather_state][:, None])
+        return position, condition, state
+
+    def choose_effects(self, lap: int) -> Dict[str, np.ndarray]:
+        """Epsilon-greedy action of every policy car, ties broken at random"""
+        if self.state is None:
+            self.state_position, self.state_condition, self.state = self.observe(lap)
+        rng = self.policy_rng
+        q = self.q_tables[self.car_agents, self.state]
+        actions = np.argmax(np.where(q == q.max(axis=2, keepdims=True), rng.random(q.shape), -1.0), axis=2)
+        if self.training:
+            explore = rng.random(actions.shape) < self.exploration[self.car_agents]
+            actions = np.where(explore, rng.integers(N_ACTIONS, size=actions.shape), actions)
+        self.actions = actions
+
+        cars = len(self.car_agents)
+        effects = {name: values.copy() for name, values in self.neutral.items()}
+        for name, column in zip(ActionEffect._fields, RLAction.EFFECT_TABLE.T):
+            effects[name][:, :cars] = column[actions]
+        effects['pit'] = np.zeros(self.total_time.shape, dtype=bool)
+        effects['pit'][:, :cars] = actions == PIT_NOW
+        return effects
+
+    def simulate_lap(self, lap: int):
+        cars = len(self.car_agents)
+        was_running = ~self.retired[:, :cars]
+        self.incident[:] = False
+        super().simulate_lap(lap)
+
+        # Reward every policy car that started the lap, as RaceSimulator.learn_policy_actions
+        position, condition, next_state = self.observe(lap + 1)
+        running = ~self.retired
+        average_lap = (self.lap_time * running).sum(axis=1) / np.maximum(running.sum(axis=1), 1)
+        finished = lap == self.sim.total_laps
+        dnf = self.retired[:, :cars] & was_running
+        results = {
+            'position_gained': position < self.state_position,
+            'position_lost': position > self.state_position,
+            'faster_than_average': running[:, :cars] & (self.lap_time[:, :cars] < average_lap[:, None]),
+            'incident': self.incident[:, :cars],
+            'dnf': dnf,
+            'race_finished': finished & running[:, :cars],
+            'final_position': position
+        }
+        reward = AIDriverRL.calculate_rewards(self.state_condition, self.state_position, self.actions, results)
+        reward *= was_running
+        self.total_reward += reward
+        if self.training:
+            self.transitions.append((was_running, self.state, self.actions, reward, next_state, dnf | finished))
+        self.state_position, self.state_condition, self.state = position, condition, next_state
+
+    def update_q_tables(self, mask: np.ndarray, state: np.ndarray, actions: np.ndarray, reward: np.ndarray,
+                        next_state: np.ndarray, terminal: np.ndarray):
+        """Q-learning update of a lap's masked transitions in one scatter"""
+        agent = np.broadcast_to(self.car_agents, mask.shape)[mask]
+        next_value = self.q_tables[agent, next_state[mask]].max(axis=1)
+        target = reward[mask] + np.where(terminal[mask], 0.0, self.discount[agent] * next_value)
+        flat = (agent * N_STATES + state[mask]) * N_ACTIONS + actions[mask]
+        self.visits += scatter_update(self.q_tables, flat, target, self.learning_rate).reshape(self.visits.shape)
+
+    def execute_pit_stops(self, lap: int, pitting: np.ndarray):
+        super().execute_pit_stops(lap, pitting)
+        self.wear_age[pitting] = 0.0
+
+    def update_tires(self, active: np.ndarray):
+        """Tire wear scaled by each car's action, see RaceSimulator.update_tire_condition"""
+        self.wear_age += self.effects['wear'] * active
+        self.tire_age = np.minimum(self.wear_age.astype(np.int64), self.tire_model.max_age)
+        self.tire_condition = self.condition_table.take(self.tire_base + self.tire_age)
+
+    def resolve_incidents(self, incidents: np.ndarray):
+        self.incident |= incidents
+        super().resolve_incidents(incidents)
+
+    def results(self) -> List[List[Dict]]:
+        """Each race's result per policy car, in the form train_on_race takes"""
+        cars = len(self.car_agents)
+        position = np.empty_like(self.order)
+        position[self.race_index, self.order] = self.driver_index + 1
+        return [[{
+            'final_position': int(position[r, i]),
+            'fastest_lap': round(float(self.best_lap[r, i]), 3),
+            'pit_stops': int(self.pit_stops[r, i]),
+            'dnf': bool(self.retired[r, i]),
+            'total_reward': float(self.total_reward[r, i])
+        } for i in range(cars)] for r in range(self.n_races)]
+
+
+def run_episode(ai_driver: AIDriverRL, track_data: Optional[Dict] = None, total_laps: int = TRAINING_LAPS,
+                seed: SeedLike = None, weather: str = 'dry', opponents: Optional[List[Dict]] = None,
+                training: bool = True) -> Dict:
+    """Race the driver once against the opponents, learning lap by lap when training
+
+    Returns the learner's result in the form train_on_race takes.
+    """
+    learner = {'name': ai_driver.name, 'skill': TRAINING_SKILL, 'aggression': TRAINING_AGGRESSION,
+               'policy': ai_driver}
+    simulator = RaceSimulator(track_data or {}, [learner] + (opponents or TRAINING_OPPONENTS), total_laps,
+                              weather=weather, seed=seed, record_history=False, record_events=False,
+                              policy_training=training)
+    for _ in simulator.iter_laps(snapshots=False):
+        pass
+
+    driver = simulator.policy_drivers[0]
+    return {
+        'final_position': driver.position,
+        'fastest_lap': round(driver.best_lap_time, 3),
+        'pit_stops': driver.pit_stops,
+        'dnf': driver.is_retired,
+        'total_reward': driver.rl_reward
+    }
+
+
+def train_agents(agents: Sequence[AIDriverRL], num_races: int, track_data: Optional[Dict] = None,
+                 total_laps: int = TRAINING_LAPS, seed: SeedLike = None, weather: str = 'dry',
+                 batch_size: int = TRAINING_BATCH, opponents: Optional[List[Dict]] = None,
+                 progress_callback: Optional[Callable[[Dict], Optional[bool]]] = None) -> List[Dict]:
+    """Train agents on num_races races, batch_size at a time on a PolicyRaceEngine
+
+    Every agent drives one car in each race, so a population with different
+    learning and exploration rates trains on the same races. Opponents default
+    to enough of TRAINING_OPPONENTS to fill TRAINING_FIELD cars. Returns a row
+    per race and agent; the seed fixes every race and all exploration.
+    progress_callback gets each row; returning True stops training once the
+    race's batch is recorded.
+    """
+    if opponents is None:
+        opponents = TRAINING_OPPONENTS[:max(0, TRAINING_FIELD - len(agents))]
+    learners = [{'name': agent.name, 'skill': TRAINING_SKILL, 'aggression': TRAINING_AGGRESSION}
+                for agent in agents]
+    batches = [min(batch_size, num_races - start) for start in range(0, num_races, batch_size)]
+    rows = []
+    stop = False
+    for n_races, batch_seed in zip(batches, as_seed_sequence(seed).spawn(len(batches))):
+        simulator = RaceSimulator(track_data or {}, learners + opponents, total_laps, weather=weather,
+                                  seed=batch_seed, record_history=False, record_events=False)
+        engine = PolicyRaceEngine(simulator, agents, range(len(agents)), n_races, seed=batch_seed).run()
+        for race_results in engine.results():
+            race = len(rows) // len(agents) + 1
+            for index, (agent, result) in enumerate(zip(agents, race_results)):
+                agent.train_on_race(result)
+                rows.append({
+                    'race': race,
+                    'agent': index,
+                    'position': result['final_position'],
+                    'reward': round(result['total_reward'], 2),
+                    'q_table_size': agent.q_table_size
+                })
+                if progress_callback and progress_callback(rows[-1]):
+                    stop = True
+        if stop:
+            break
+    return rows
+
+
+def train_driver(ai_driver: AIDriverRL, num_races: int, track_data: Optional[Dict] = None,
+                 total_laps: int = TRAINING_LAPS, seed: SeedLike = None, weather: str = 'dry',
+                 progress_callback: Optional[Callable[[Dict], Optional[bool]]] = None,
+                 batch_size: int = TRAINING_BATCH) -> List[Dict]:
+    """Train the driver on num_races simulated races, one result row per race
+
+    Races are batched as in train_agents, so the same seed trains the same
+    driver. progress_callback gets each race's row; returning True stops
+    training after that race's batch.
+    """
+    rows = train_agents([ai_driver], num_races, track_data, total_laps, seed, weather, batch_size,
+                        progress_callback=progress_callback)
+    for row in rows:
+        del row['agent']
+    return rows
+
+
+def _train_shard(snapshot: Dict, num_races: int, track_data: Optional[Dict], total_laps: int,
+                 seed: np.random.SeedSequence, weather: str) -> Tuple[np.ndarray, np.ndarray, List[Dict]]:
+    """Worker entry point: train a copy of the snapshot driver, return its Q-table, added visits and rows
+
+    The copy's exploration and replay sampling are seeded from the shard's seed.
+    """
+    q_table = snapshot.pop('q_table')
+    copy = AIDriverRL(**snapshot, seed=int(seed.generate_state(1)[0]))
+    copy.q_table[:] = q_table
+    rows = train_driver(copy, num_races, track_data, total_laps, seed, weather, batch_size=num_races)
+    return copy.q_table, copy.visits, rows
+
+
+def train_parallel(ai_driver: AIDriverRL, num_races: int, track_data: Optional[Dict] = None,
+                   total_laps: int = TRAINING_LAPS, seed: SeedLike = None, weather: str = 'dry',
+                   workers: Optional[int] = None, sync_races: int = SYNC_RACES, batch_size: int = TRAINING_BATCH,
+                   progress_callback: Optional[Callable[[Dict], Optional[bool]]] = None) -> List[Dict]:
+    """Train the driver on num_races races spread over a process pool, one result row per race
+
+    Races run in rounds of sync_races, split into shards of batch_size. Each
+    shard trains a copy of the driver's Q-table as it stood at the start of
+    the round, and the copies are merged back weighted by visits
+    (AIDriverRL.merge_q_tables) before the next round. Every shard has its
+    own seed, so results depend on the seed, sync_races and batch_size but not
+    on the number of workers (None = one per CPU). With replay on, each copy
+    replays its own shard's transitions and its replayed updates count as
+    visits in the merge. progress_callback gets each race's row; returning
+    True stops training after that race's round.
+    """
+    rounds = [min(sync_races, num_races - start) for start in range(0, num_races, sync_races)]
+    shards = -(-min(sync_races, num_races) // batch_size)
+    workers = min(workers or os.cpu_count() or 1, shards)
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+    rows = []
+    try:
+        for round_races, round_seed in zip(rounds, as_seed_sequence(seed).spawn(len(rounds))):
+            sizes = [min(batch_size, round_races - start) for start in range(0, round_races, batch_size)]
+            snapshot = {'name': ai_driver.name, 'learning_rate': ai_driver.learning_rate,
+                        'discount_factor': ai_driver.discount_factor, 'exploration_rate': ai_driver.exploration_rate,
+                        'replay_batch_size': ai_driver.replay_batch_size,
+                        'prioritized_replay': ai_driver.prioritized_replay, 'q_table': ai_driver.q_table}
+            args = ([dict(snapshot) for _ in sizes], sizes, [track_data] * len(sizes), [total_laps] * len(sizes),
+                    round_seed.spawn(len(sizes)), [weather] * len(sizes))
+            results = list(pool.map(_train_shard, *args)) if pool else list(map(_train_shard, *args))
+            q_tables, visits, shard_rows = zip(*results)
+            ai_driver.merge_q_tables(np.stack(q_tables), np.stack(visits))
+
+            stop = False
+            for row in (row for rows_of_shard in shard_rows for row in rows_of_shard):
+                ai_driver.train_on_race({'final_position': row['position'], 'total_reward': row['reward']})
+                rows.append({**row, 'race': len(rows) + 1, 'q_table_size': ai_driver.q_table_size})
+                if progress_callback and progress_callback(rows[-1]):
+                    stop = True
+            if stop:
+                break
+    finally:
+        if pool:
+            pool.shutdown()
+    return rows
@@ -0,0 +1,200 @@
+"""
+Pit Strategy Optimizer
+Enumerates stint plans (compound sequence plus pit laps) for one driver, scores
+each plan with batches of vectorized races on a process pool and prunes the
+weaker plans by successive halving, so most races are spent on the contenders
+"""
+import itertools
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Union
+
+import numpy as np
+
+from race_simulator import RaceSimulator, StintPlan
+from seeding import SeedLike, as_seed_sequence
+from tire_model import TireModel
+from vectorized_engine import VectorizedRaceEngine
+
+
+DRY_COMPOUNDS = ['soft', 'medium', 'hard']
+WET_COMPOUNDS = ['intermediate', 'wet']
+OBJECTIVES = ['position', 'time']
+MAX_CANDIDATES = 5000
+MAX_RACES = 200000
+DEFAULT_BATCH_SIZE = 250
+Z_95 = 1.96
+
+
+def candidate_plans(total_laps: int, max_stops: int = 2, compounds: Optional[List[str]] = None,
+                    lap_step: Optional[int] = None, min_stint: Optional[int] = None,
+                    stint_limits: Optional[Dict[str, int]] = None) -> List[StintPlan]:
+    """Every plan with 1..max_stops stops, pitting on a grid of laps every lap_step laps
+
+    Stints shorter than min_stint laps (default lap_step) are skipped, as are
+    stints longer than stint_limits[compound] laps (see TireModel.stint_limit),
+    since worn tires would force an unplanned stop before the planned one.
+    """
+    compounds = compounds or DRY_COMPOUNDS
+    lap_step = lap_step or max(1, total_laps // 10)
+    min_stint = min_stint or lap_step
+    grid = range(lap_step, total_laps, lap_step)
+
+    plans = []
+    for stops in range(1, max_stops + 1):
+        for pit_laps in itertools.combinations(grid, stops):
+            if np.diff((0,) + pit_laps + (total_laps,)).min() < min_stint:
+                continue
+            # Cars pit before driving the pit lap, so stint k covers laps pit_laps[k-1]..pit_laps[k] - 1
+            laps_driven = np.diff((1,) + pit_laps + (total_laps + 1,))
+            for sequence in itertools.product(compounds, repeat=stops + 1):
+                if stint_limits and any(n > stint_limits[c] for n, c in zip(laps_driven, sequence)):
+                    continue
+                plans.append(StintPlan(list(sequence), list(pit_laps)))
+    return plans
+
+
+def _score_batch(config: Dict, car: int, plans: List[StintPlan], races_per_plan: int,
+                 seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    """Worker entry point: race every plan races_per_plan times, return car's results per plan"""
+    simulator = RaceSimulator(**config, seed=seed, record_events=False)
+    engine = VectorizedRaceEngine(simulator, n_races=len(plans) * races_per_plan, record_history=False)
+    engine.set_plans(car, [plan for plan in plans for _ in range(races_per_plan)])
+    outcomes = engine.run().outcomes()
+    shape = (len(plans), races_per_plan)
+    return {
+        'finishing_position': outcomes['finishing_position'][:, car].reshape(shape).astype(np.int16),
+        'total_time': outcomes['total_time'][:, car].reshape(shape),
+        'retired': outcomes['retired'][:, car].reshape(shape),
+    }
+
+
+def _interval(samples: np.ndarray) -> List[float]:
+    """Normal-approximation 95% confidence interval for the mean"""
+    mean = samples.mean()
+    half = Z_95 * samples.std(ddof=1) / math.sqrt(len(samples)) if len(samples) > 1 else float('inf')
+    return [round(float(mean - half), 3), round(float(mean + half), 3)]
+
+
+def _summarise(plan: StintPlan, samples: Dict[str, np.ndarray]) -> Dict:
+    positions = samples['finishing_position']
+    finished = ~samples['retired']
+    times = samples['total_time'][finished]
+    return dict(
+        plan.to_dict(),
+        races=len(positions),
+        mean_position=round(float(positions.mean()), 3),
+        position_ci=_interval(positions),
+        win_probability=round(float((positions == 1).mean()), 4),
+        dnf_rate=round(1.0 - float(finished.mean()), 4),
+        mean_total_time=round(float(times.mean()), 3) if len(times) else None,
+        total_time_ci=_interval(times) if len(times) else None,
+    )
+
+
+def _score(samples: Dict[str, np.ndarray], objective: str) -> float:
+    """Lower is better; races lost to retirement count as the worst time seen"""
+    if objective == 'position':
+        return float(samples['finishing_position'].mean())
+    times = samples['total_time']
+    finished = ~samples['retired']
+    if not finished.any():
+        return float('inf')
+    return float(np.where(finished, times, times[finished].max()).mean())
+
+
+def optimize_strategy(track_data: Dict, drivers: List[Dict], total_laps: int, driver: Union[str, int],
+                      weather: str = 'dry', safety_car_prob: float = 0.05, max_stops: int = 2,
+                      compounds: Optional[List[str]] = None, objective: str = 'position',
+                      min_races: int = 8, eta: int = 3, top: int = 5,
+                      workers: Optional[int] = None, batch_size: int = DEFAULT_BATCH_SIZE,
+                      seed: SeedLike = None) -> Dict:
+    """Find the best stint plans for one driver against the rest of the field
+
+    Round one races every candidate min_races times. Each following round keeps
+    the best 1/eta of the plans (never fewer than top) and races them eta times
+    as often, until only top plans remain; reported statistics use every race a
+    plan was in. Every round and batch gets its own seed spawned from `seed`, so
+    results depend on the seed and batch size but not on the number of workers.
+    """
+    if objective not in OBJECTIVES:
+        raise ValueError(f"Unknown objective '{objective}', expected one of {OBJECTIVES}")
+    if eta < 2 or min_races < 2 or top < 1:
+        raise ValueError('Successive halving needs eta >= 2, min_races >= 2 and top >= 1')
+
+    names = [d['name'] for d in drivers]
+    car = names.index(driver) if isinstance(driver, str) else driver
+    if not 0 <= car < len(drivers):
+        raise ValueError(f'Driver {driver} is not in the field')
+
+    compounds = compounds or (WET_COMPOUNDS if weather == 'rain' else DRY_COMPOUNDS)
+    tires = TireModel([drivers[car].get('aggression', 0.5)], weather, total_laps)
+    stint_limits = {c: tires.stint_limit(0, c) for c in compounds}
+    plans = candidate_plans(total_laps, max_stops, compounds, stint_limits=stint_limits)
+    if not plans:
+        raise ValueError('Race is too short for any pit strategy')
+    if len(plans) > MAX_CANDIDATES:
+        raise ValueError(f'{len(plans)} candidate plans, at most {MAX_CANDIDATES} allowed')
+
+    # Budget of the full schedule: every round races about len(plans) * min_races times
+    survivors, races_per_plan, schedule = len(plans), min_races, []
+    while True:
+        schedule.append((survivors, races_per_plan))
+        if survivors <= top:
+            break
+        survivors = max(top, math.ceil(survivors / eta))
+        races_per_plan *= eta
+    total_races = sum(n * k for n, k in schedule)
+    if total_races > MAX_RACES:
+        raise ValueError(f'Search needs {total_races} races, at most {MAX_RACES} allowed; '
+                         f'reduce max_stops or min_races')
+
+    config = {
+        'track_data': track_data,
+        'drivers': drivers,
+        'total_laps': total_laps,
+        'weather': weather,
+        'safety_car_prob': safety_car_prob,
+    }
+    round_seeds = as_seed_sequence(seed).spawn(len(schedule))
+    workers = workers or os.cpu_count() or 1
+    pool = ProcessPoolExecutor(max_workers=workers) if workers > 1 else None
+
+    samples: Dict[int, List[Dict[str, np.ndarray]]] = {i: [] for i in range(len(plans))}
+    alive = list(range(len(plans)))
+    rounds = []
+    try:
+        for (_, races_per_plan), round_seed in zip(schedule, round_seeds):
+            chunk = max(1, batch_size // races_per_plan)
+            batches = [alive[i:i + chunk] for i in range(0, len(alive), chunk)]
+            seeds = round_seed.spawn(len(batches))
+            args = ([config] * len(batches), [car] * len(batches),
+                    [[plans[i] for i in batch] for batch in batches],
+                    [races_per_plan] * len(batches), seeds)
+            results = list(pool.map(_score_batch, *args)) if pool else list(map(_score_batch, *args))
+
+            for batch, result in zip(batches, results):
+                for row, i in enumerate(batch):
+                    samples[i].append({key: values[row] for key, values in result.items()})
+            rounds.append({'plans': len(alive), 'races_per_plan': races_per_plan})
+
+            merged = {i: {key: np.concatenate([s[key] for s in samples[i]]) for key in samples[i][0]}
+                      for i in alive}
+            alive.sort(key=lambda i: _score(merged[i], objective))
+            alive = alive[:max(top, math.ceil(len(alive) / eta))] if len(alive) > top else alive
+    finally:
+        if pool:
+            pool.shutdown()
+
+    best = [_summarise(plans[i], merged[i]) for i in alive[:top]]
+    return {
+        'driver': names[car],
+        'objective': objective,
+        'candidates': len(plans),
+        'stint_limits': stint_limits,
+        'rounds': rounds,
+        'total_races': sum(r['plans'] * r['races_per_plan'] for r in rounds),
+        'total_laps': total_laps,
+        'best': best,
+    }
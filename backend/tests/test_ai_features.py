@@ -1,9 +1,20 @@
 """
 AI Features Unit Tests
 """
+import json
+import numpy as np
 import pytest
-from track_ai_designer import TrackAIDesigner, TrackElement, TrackMetricsCalculator, generate_ai_track
-from ai_driver_rl import AIDriverRL, RLState, RLAction
+from track_ai_designer import (CORNER_LEFT, CORNER_RIGHT, PADDING, FitnessCache, IncrementalTrackMetrics, TrackAIDesigner, TrackElement,
+                               TrackMetricsCalculator, generate_ai_track, generate_pareto_tracks, from_genome,
+                               close_population, from_population, population_fitness, seed_population, to_genome,
+                               track_fitness, track_layouts)
+from track_library import TrackLibrary, library_track
+from track_geometry import layout_checks, polylines
+from track_simulation import SURROGATE_METRICS, SurrogateModel, simulate_tracks
+from ai_driver_rl import HISTORY_LENGTH, N_STATES, AIDriverRL, ReplayBuffer, RLState, RLAction
+from race_simulator import RaceSimulator
+from rl_training import TRAINING_OPPONENTS, PolicyRaceEngine, run_episode, train_agents, train_driver, train_parallel
+from pareto import crowding_distance, non_dominated_sort
 
 
 def test_track_element_creation():
@@ -32,6 +43,55 @@ def test_track_metrics_calculation():
     assert metrics['elevationChange'] == 10
 
 
+def test_batched_metrics_match_single_tracks():
+    """Test metrics of a padded population matrix equal those of each track"""
+    drs_straight = TrackElement('straight', 400, 0, 0)
+    drs_straight.isDRS = True
+    elements = [drs_straight, TrackElement('corner-left', 200, 2, 25), TrackElement('straight', 350, 0, 0)]
+    
+    metrics = TrackMetricsCalculator.calculate_metrics(to_genome(elements))
+    assert metrics == TrackMetricsCalculator.calculate_metrics(elements)
+    assert metrics['possibleOvertakes'] == 2  # the last straight leads back onto a straight
+    assert metrics['safetyRating'] == 93
+    assert metrics['drsZoneCount'] == 1
+    
+    designer = TrackAIDesigner('speed', seed=3)
+    population = designer.random_population(50, 1, 15)
+    batch = TrackMetricsCalculator.calculate_batch(population)
+    fitness = designer.evaluate_population(population)
+    for i, genome in enumerate(from_population(population)):
+        track = from_genome(genome)
+        assert [e.to_dict(element_id='e') for e in from_genome(to_genome(track))] == \
+            [e.to_dict(element_id='e') for e in track]
+        assert TrackMetricsCalculator.calculate_metrics(track) == {name: values[i].item() for name, values in batch.items()}
+        assert designer.fitness_function(track) == fitness[i]
+
+
+def test_incremental_metrics_match_full_recompute():
+    """Test metrics kept up to date per edit equal metrics computed from scratch"""
+    designer = TrackAIDesigner('balanced', seed=8)
+    tracker = IncrementalTrackMetrics(designer.generate_random_track())
+    edits = designer.generate_random_track(20, 20)
+    
+    for step, element in enumerate(edits):
+        element.isDRS = step % 3 == 0
+        if step % 4 == 3:
+            tracker.remove(step % len(tracker))
+        elif step % 2:
+            tracker.insert(step % (len(tracker) + 1), element)
+        else:
+            tracker.replace(step % len(tracker), element)
+        
+        metrics = tracker.metrics()
+        expected = TrackMetricsCalculator.calculate_metrics(tracker.elements)
+        assert metrics.pop('estimatedLapTime') == pytest.approx(expected.pop('estimatedLapTime'))
+        assert metrics == expected
+    
+    while len(tracker):
+        tracker.remove(0)
+    assert tracker.metrics() == TrackMetricsCalculator.calculate_metrics([])
+
+
 def test_ai_track_generation():
     """Test AI track generation"""
     track_data = generate_ai_track('balanced')
@@ -90,7 +150,7 @@ def test_rl_driver_creation():
     assert ai_driver.name == "TestAI"
     assert ai_driver.learning_rate == 0.1
     assert ai_driver.races_completed == 0
-    assert len(ai_driver.q_table) == 0
+    assert ai_driver.q_table_size == 0
 
 
 def test_rl_action_selection():
@@ -135,6 +195,150 @@ def test_rl_training():
     assert ai_driver.races_completed == initial_races + 1
 
 
+def test_policy_driver_learns_from_simulated_races():
+    """Test policy drivers act every lap, learn per-lap transitions and train reproducibly"""
+    ai_driver = AIDriverRL(seed=1)
+    result = run_episode(ai_driver, total_laps=10, seed=3)
+    assert 1 <= result['final_position'] <= 10
+    assert ai_driver.q_table_size > 0  # one update per lap raced
+    
+    frozen = AIDriverRL(seed=1)
+    run_episode(frozen, total_laps=10, seed=3, training=False)
+    assert frozen.q_table_size == 0
+    
+    pit_every_lap = AIDriverRL()
+    pit_every_lap.choose_action = lambda state, is_training=True: RLAction.get_action_index('pit_now')
+    assert run_episode(pit_every_lap, total_laps=5, seed=2, training=False)['pit_stops'] == 5
+    
+    rows = train_driver(AIDriverRL(), 20, seed=7)
+    assert rows == train_driver(AIDriverRL(), 20, seed=7)
+    assert [row['race'] for row in rows] == list(range(1, 21))
+    
+    with pytest.raises(ValueError):
+        RaceSimulator({}, [{'name': 'AI', 'policy': ai_driver}], 5, engine='vectorized')
+
+
+def test_rl_state_index_and_dense_q_table():
+    """Test every state gets its own Q-table row and dict Q-tables from older models still load"""
+    states = [RLState(lap, 10, position, tire_age, condition, gap, weather)
+              for lap in (1, 5, 9) for position in (1, 2, 5, 15) for tire_age in (0, 15, 25)
+              for condition in (0.9, 0.6, 0.3) for gap in (0, 5, 20) for weather in ('dry', 'rain', 'variable')]
+    indices = [state.to_index() for state in states]
+    assert sorted(indices) == list(range(N_STATES))
+    assert all(RLState.key_to_index(state.to_key()) == index for state, index in zip(states, indices))
+    
+    ai_driver = AIDriverRL()
+    assert ai_driver.q_table.shape == (N_STATES, len(RLAction.ACTIONS))
+    ai_driver.update_q_value(states[7], 4, 10.0)
+    assert ai_driver.choose_action(states[7], is_training=False) == 4
+    assert ai_driver.q_table_size == 1
+    
+    import os
+    import pickle
+    os.makedirs('ai_models', exist_ok=True)
+    with open('ai_models/legacy_model.pkl', 'wb') as f:
+        pickle.dump({'name': 'Legacy', 'q_table': {(states[3].to_key(), 2): 1.5}}, f)
+    legacy = AIDriverRL.load_model('legacy_model.pkl')
+    os.remove('ai_models/legacy_model.pkl')
+    assert legacy.get_q_value(states[3], 2) == 1.5
+    assert legacy.q_table_size == 1
+
+
+def test_batched_policy_training():
+    """Test batched races match the scalar state and reward rules and train a population together"""
+    rng = np.random.default_rng(0)
+    position, tire_age = rng.integers(1, 13, 200), rng.integers(0, 30, 200)
+    condition, gap, weather = rng.random(200), rng.random(200) * 15, rng.integers(0, 3, 200)
+    indices = RLState.batch_index(12, 20, position, tire_age, condition, gap, weather)
+    states = [RLState(12, 20, *values, ['dry', 'rain', 'variable'][w])
+              for *values, w in zip(position.tolist(), tire_age.tolist(), condition.tolist(), gap.tolist(), weather)]
+    assert indices.tolist() == [state.to_index() for state in states]
+    
+    flags = {name: rng.random(200) < 0.3 for name in
+             ['position_gained', 'position_lost', 'faster_than_average', 'incident', 'dnf', 'race_finished']}
+    flags['final_position'] = position
+    actions = rng.integers(0, len(RLAction.ACTIONS), 200)
+    rewards = AIDriverRL.calculate_rewards(condition, position, actions, flags)
+    ai_driver = AIDriverRL()
+    assert rewards.tolist() == [ai_driver.calculate_reward(state, int(action), {k: v[i] for k, v in flags.items()})
+                                for i, (state, action) in enumerate(zip(states, actions))]
+    
+    pit_every_lap = AIDriverRL()
+    pit_every_lap.q_table[:, RLAction.get_action_index('pit_now')] = 1.0
+    simulator = RaceSimulator({}, [{'name': 'AI'}] + TRAINING_OPPONENTS, 5, seed=1, record_events=False)
+    engine = PolicyRaceEngine(simulator, [pit_every_lap], [0], n_races=4, seed=1, training=False).run()
+    assert [race[0]['pit_stops'] for race in engine.results()] == [5, 5, 5, 5]
+    
+    population = [AIDriverRL(learning_rate=0.05, exploration_rate=0.1), AIDriverRL(learning_rate=0.3)]
+    rows = train_agents(population, 30, total_laps=10, seed=4, batch_size=8)
+    assert len(rows) == 60 and rows[-1]['race'] == 30
+    assert all(agent.races_completed == 30 and agent.visits.sum() > 0 for agent in population)
+    assert not np.array_equal(population[0].q_table, population[1].q_table)
+    assert train_driver(AIDriverRL(), 30, seed=4, batch_size=8) == train_driver(AIDriverRL(), 30, seed=4, batch_size=8)
+
+
+def test_replay_buffer():
+    """Test the replay ring buffer keeps the newest transitions, samples by priority and replays into the Q-table"""
+    buffer = ReplayBuffer(capacity=5, seed=0)
+    nbytes = buffer.nbytes
+    for i in range(7):
+        buffer.add(i, i % 6, float(i), i + 1, i == 6)
+    assert len(buffer) == 5 and buffer.nbytes == nbytes
+    assert sorted(buffer.states.tolist()) == [2, 3, 4, 5, 6]
+    buffer.add_batch(np.arange(10, 18), np.zeros(8, dtype=int), np.ones(8), np.arange(11, 19), np.zeros(8, dtype=bool))
+    assert sorted(buffer.states.tolist()) == [13, 14, 15, 16, 17]
+    
+    batch = buffer.sample(32)
+    assert batch.weights is None and set(batch.states.tolist()) <= {13, 14, 15, 16, 17}
+    buffer.update_priorities(np.arange(5), np.array([100.0, 0.0, 0.0, 0.0, 0.0]))
+    batch = buffer.sample(200, prioritized=True)
+    assert np.mean(batch.indices == 0) > 0.5
+    assert batch.weights.max() == 1.0 and batch.weights[batch.indices == 0].max() < 1.0
+    
+    without_replay = AIDriverRL()
+    without_replay.update_q_value(RLState(5, 10, 2, 3, 0.9, 1.0, 'dry'), 3, 10.0)
+    assert without_replay.replay_buffer is None and without_replay.replay() == 0
+    
+    ai_driver = AIDriverRL(seed=2, replay_batch_size=16, prioritized_replay=True)
+    state = RLState(5, 10, 2, 3, 0.9, 1.0, 'dry')
+    ai_driver.update_q_value(state, 3, 10.0)
+    before = ai_driver.get_q_value(state, 3)
+    assert ai_driver.replay() == 16
+    assert ai_driver.get_q_value(state, 3) > before
+    
+    for _ in range(HISTORY_LENGTH + 5):
+        ai_driver.train_on_race({'final_position': 3})
+    assert len(ai_driver.learning_history) == HISTORY_LENGTH
+    assert ai_driver.learning_history[0]['race'] == 6
+
+
+def test_parallel_training_merges_copies():
+    """Test parallel training merges copies by visits and does not depend on the number of workers"""
+    ai_driver = AIDriverRL()
+    ai_driver.q_table[0, 0] = ai_driver.q_table[1, 0] = 5.0
+    q_tables = np.zeros((2,) + ai_driver.q_table.shape, dtype=np.float32)
+    visits = np.zeros((2,) + ai_driver.visits.shape, dtype=np.int32)
+    q_tables[:, 0, 0] = [10.0, 40.0]
+    visits[:, 0, 0] = [3, 1]
+    ai_driver.merge_q_tables(q_tables, visits)
+    assert ai_driver.q_table[0, 0] == 17.5 and ai_driver.visits[0, 0] == 4
+    assert ai_driver.q_table[1, 0] == 5.0 and ai_driver.visits[1, 0] == 0
+    
+    serial, pooled = AIDriverRL(), AIDriverRL()
+    rows = train_parallel(serial, 12, total_laps=5, seed=3, workers=1, sync_races=6, batch_size=3)
+    assert rows == train_parallel(pooled, 12, total_laps=5, seed=3, workers=2, sync_races=6, batch_size=3)
+    assert np.array_equal(serial.q_table, pooled.q_table)
+    assert [row['race'] for row in rows] == list(range(1, 13)) and serial.races_completed == 12
+    assert serial.visits.sum() > 0
+    
+    replaying = [AIDriverRL(seed=1, replay_batch_size=32) for _ in range(2)]
+    for ai_driver in replaying:
+        train_parallel(ai_driver, 12, total_laps=5, seed=3, workers=1, sync_races=6, batch_size=3)
+    assert np.array_equal(replaying[0].q_table, replaying[1].q_table)
+    # Each race's replay adds 32 visits on top of the laps raced
+    assert replaying[0].visits.sum() == serial.visits.sum() + 12 * 32
+
+
 def test_rl_save_load():
     """Test model persistence"""
     ai_driver = AIDriverRL(name="SaveTest")
@@ -170,3 +374,224 @@ def test_genetic_algorithm_convergence():
     # Best should be better than random
     assert best_fitness >= initial_fitness or metrics['totalLength'] > 0
 
+
+
+def test_seeded_track_generation_is_reproducible():
+    """Test the same seed evolves the same track"""
+    first = generate_ai_track('overtakes', seed=3)
+    second = generate_ai_track('overtakes', seed=3)
+    
+    assert first == second
+    assert first != generate_ai_track('overtakes', seed=4)
+
+
+def test_parallel_evolution_matches_serial():
+    """Test scoring a large population on a process pool evolves the same track"""
+    serial = generate_ai_track('balanced', seed=5, population_size=1000, generations=3, workers=1)
+    parallel = generate_ai_track('balanced', seed=5, population_size=1000, generations=3, workers=2)
+    
+    assert parallel['generation_stats']['workers'] == 2
+    parallel['generation_stats']['workers'] = 1
+    assert parallel == serial
+    
+    with pytest.raises(ValueError):
+        TrackAIDesigner('balanced', population_size=1)
+
+
+def test_fitness_cache_scores_each_genome_once():
+    """Test survivors and repeated genomes are not rescored and the track is unchanged"""
+    cached = TrackAIDesigner('speed', seed=9, population_size=40, generations=20)
+    uncached = TrackAIDesigner('speed', seed=9, population_size=40, generations=20, cache_size=0)
+    track, metrics = cached.evolve()
+    expected_track, expected_metrics = uncached.evolve()
+    assert metrics == expected_metrics
+    assert [e.to_dict(element_id='e') for e in track] == [e.to_dict(element_id='e') for e in expected_track]
+    
+    # The first generation is scored in full, later ones only score their 20 children
+    stats = cached.fitness_cache.stats()
+    assert stats['hits'] + stats['misses'] == 40 + 19 * 20
+    assert cached.fitness_evaluations <= stats['misses']
+    
+    cache = FitnessCache(maxsize=2)
+    cache.store([b'a', b'b'], [1.0, 2.0])
+    assert cache.lookup([b'a', b'c'])[0] == 1.0
+    cache.store([b'c'], [3.0])  # evicts b, the least recently used
+    assert cache.lookup([b'b', b'a', b'c']).tolist()[1:] == [1.0, 3.0]
+    assert cache.stats()['hits'] == 3
+
+
+def test_island_model_migrates_best_tracks():
+    """Test islands evolve the same track on any number of workers and share their best"""
+    serial = generate_ai_track('difficulty', seed=2, generations=12, islands=3, migration_interval=4, workers=1)
+    parallel = generate_ai_track('difficulty', seed=2, generations=12, islands=3, migration_interval=4, workers=3)
+    
+    assert serial['generation_stats']['islands'] == 3
+    assert parallel['generation_stats']['workers'] == 3
+    parallel['generation_stats']['workers'] = 1
+    assert parallel == serial
+    
+    designer = TrackAIDesigner('balanced', seed=1, population_size=4, islands=2, migrants=1)
+    populations = [designer.random_population(4), designer.random_population(4)]
+    fitnesses = [designer.evaluate_population(p) for p in populations]
+    best = [p[np.argmax(f)].copy() for p, f in zip(populations, fitnesses)]
+    worst = [np.argmin(f) for f in fitnesses]
+    designer.migrate(populations, fitnesses)
+    assert populations[1][worst[1]].tolist() == best[0].tolist()
+    assert populations[0][worst[0]].tolist() == best[1].tolist()
+
+
+def test_progress_callback_reports_and_stops_early():
+    """Test evolve reports every generation and keeps the best track when stopped"""
+    reports = []
+    full = generate_ai_track('speed', seed=4, generations=8, progress_callback=reports.append)
+    assert [r['generation'] for r in reports] == list(range(1, 9))
+    assert full == generate_ai_track('speed', seed=4, generations=8)
+    
+    reports = []
+    stopped = generate_ai_track('speed', seed=4, generations=8,
+                                progress_callback=lambda r: reports.append(r) or r['generation'] == 3)
+    assert stopped['generation_stats']['completed_generations'] == 3
+    assert reports[-1]['best_metrics']['totalLength'] == stopped['metrics']['totalLength']
+    
+    reports = []
+    generate_ai_track('speed', seed=4, generations=10, islands=2, migration_interval=4, progress_callback=reports.append)
+    assert [r['generation'] for r in reports] == [1, 5, 9, 10]
+
+
+def test_seeded_evolution_starts_from_stored_tracks():
+    """Test stored tracks in every supported form seed an evolution that keeps their fitness"""
+    previous = generate_ai_track('speed', seed=1, generations=20)
+    elements = previous['elements']
+    stored = [
+        elements,  # element list
+        previous,  # generated track
+        {'id': 1, 'name': 'A', 'trackData': {'elements': elements}},  # app.py tracks entry
+        json.dumps({'name': 'B', 'elements': elements}),  # SavedTrack.track_data
+        {'id': 2, 'name': 'C', 'trackData': None},  # no elements, skipped
+    ]
+    seeds = seed_population(stored)
+    assert len(seeds) == 4
+    assert (seeds == seeds[0]).all()
+    with pytest.raises(ValueError):
+        seed_population([[{'type': 'loop'}]])
+    
+    start = track_fitness(seeds[0], 'speed')
+    refined = generate_ai_track('speed', seed=2, generations=3, seed_tracks=stored)
+    assert track_fitness(seed_population([refined])[0], 'speed') >= start
+    
+    designer = TrackAIDesigner('speed', seed=2, population_size=6, seed_tracks=seeds[:2])
+    population = designer.initial_population()
+    assert len(population) == 6 and (population[:2] == seeds[:2]).all()
+
+
+def test_simulated_fitness_races_preselected_children():
+    """Test simulated overtakes, the surrogate fit and that only preselected children are raced"""
+    metrics = {'totalLength': np.array([5000, 5000, 5000]), 'estimatedLapTime': np.array([90.0, 90.0, 90.0]),
+               'difficultyScore': np.array([30.0, 30.0, 30.0]), 'possibleOvertakes': np.array([4, 16, 4])}
+    overtakes = simulate_tracks(metrics, 'overtakes', seed=5)
+    assert overtakes[1] > overtakes[0] == overtakes[2]
+    
+    x = np.linspace(0, 10, 50)
+    surrogate = SurrogateModel(ridge=1e-6)
+    assert (surrogate.predict({name: x for name in SURROGATE_METRICS}) == 0).all()
+    surrogate.add({name: x for name in SURROGATE_METRICS}, x ** 2)
+    assert np.allclose(surrogate.predict({name: x for name in SURROGATE_METRICS}), x ** 2, atol=1e-3)
+    
+    track = generate_ai_track('overtakes', seed=3, population_size=10, generations=4, simulate=True)
+    assert track['generation_stats']['simulation']['simulated_tracks'] <= 10 + 3 * 5
+    with pytest.raises(ValueError):
+        TrackAIDesigner('safety', simulate=True)
+
+
+def test_track_geometry_closure_and_crossings():
+    """Test real layouts: closed loops, a crossing track, and the grid against every segment pair"""
+    square = [300, 157, 300, 157, 300, 157, 300, 157]
+    crossing = [400, 157, 400, 157, 400, 157, 800, 157, 200, 157, 600]
+    lengths = np.zeros((2, 11))
+    turns = np.zeros((2, 11), dtype=int)
+    lengths[0, :8], turns[0, 1:8:2] = square, 1
+    lengths[1], turns[1, 1::2] = crossing, 1
+    checks = layout_checks(lengths, turns)
+    assert checks['closed'].tolist() == [True, False]
+    assert checks['self_intersecting'].tolist() == [False, True]
+    assert checks['closure_gap'][0] < 1e-6
+    
+    designer = TrackAIDesigner('speed', seed=5)
+    population = designer.random_population(300)
+    layouts = track_layouts(population)
+    lengths = np.where(population['type'] == PADDING, 0, population['length'])
+    turns = (population['type'] == CORNER_LEFT).astype(int) - (population['type'] == CORNER_RIGHT)
+    for points, crosses in zip(polylines(lengths, turns), layouts['self_intersecting']):
+        points = points[np.r_[True, np.diff(points, axis=0).any(axis=1)]]
+        segments = list(zip(points[:-1], points[1:]))
+        
+        def side(p, q, r):
+            return np.sign((q[0] - p[0]) * (r[1] - p[1]) - (q[1] - p[1]) * (r[0] - p[0]))
+        
+        brute = any(side(*segments[i], segments[j][0]) * side(*segments[i], segments[j][1]) < 0
+                    and side(*segments[j], segments[i][0]) * side(*segments[j], segments[i][1]) < 0
+                    for i in range(len(segments)) for j in range(i + 2, len(segments)))
+        assert brute == crosses
+    
+    closed = close_population(designer.random_closed_population(50))
+    assert track_layouts(closed)['valid'].all()
+    
+    track = generate_ai_track('speed', seed=3, generations=10, closed_layout=True)
+    assert track['layout']['closed'] and not track['layout']['self_intersecting']
+    assert all(50 <= e['x'] <= 750 and 50 <= e['y'] <= 550 for e in track['elements'])
+
+
+def test_track_library_nearest_lookup(tmp_path):
+    """Test the track library answers targets from its tracks and survives a save"""
+    library = TrackLibrary()
+    stats = library.build(runs_per_target=2, population_size=10, generations=5, seed=3)
+    assert stats['added'] == stats['size'] == len(library) > 0
+    assert library.add(library.genomes) == 0  # already in the library
+    
+    difficulty = library.metrics['difficultyScore']
+    nearest = library.nearest('difficulty', 30, count=5)
+    fitness = population_fitness(nearest, 'difficulty', 30)
+    assert fitness.tolist() == sorted(fitness.tolist(), reverse=True)
+    speed = population_fitness(library.genomes, 'speed')
+    assert track_fitness(library.nearest('speed', count=1)[0], 'speed') == speed.max()
+    
+    track = library_track('speed', seed=1, library=library)
+    assert track['metrics']['estimatedLapTime'] > 0
+    assert track['generation_stats']['library']['size'] == len(library)
+    assert library_track('speed', library=TrackLibrary()) is None
+    
+    path = str(tmp_path / 'library.npz')
+    library.save(path)
+    loaded = TrackLibrary.load(path)
+    assert loaded.metrics['difficultyScore'].tolist() == difficulty.tolist()
+    assert len(TrackLibrary.load(str(tmp_path / 'missing.npz'))) == 0
+
+
+def test_non_dominated_sort_and_crowding():
+    """Test Pareto fronts and crowding distance on a small hand-checked set"""
+    objectives = np.array([[3, 1], [1, 3], [2, 2], [2, 2], [1, 1], [0, 0], [2, 0]])
+    fronts = non_dominated_sort(objectives)
+    assert fronts.tolist() == [0, 0, 0, 0, 1, 2, 1]
+    
+    crowding = crowding_distance(objectives.astype(float), fronts)
+    assert np.isinf(crowding[[0, 1, 4, 5, 6]]).all()  # front extremes
+    assert crowding[[2, 3]].tolist() == [1.0, 1.0]
+
+
+def test_pareto_tracks_do_not_dominate_each_other():
+    """Test one multi-objective run returns mutually non-dominated tracks"""
+    result = generate_pareto_tracks(['overtakes', 'lapTime', 'safety'], seed=4, population_size=40,
+                                    generations=10, front_size=8)
+    tracks = result['tracks']
+    assert 1 <= len(tracks) <= 8
+    assert result['generation_stats']['front_size'] >= len(tracks)
+    
+    scores = np.array([[t['objectives']['overtakes'], -t['objectives']['lapTime'], t['objectives']['safety']]
+                       for t in tracks])
+    assert (non_dominated_sort(scores) == 0).all()
+    assert tracks[0]['objectives'] == {o: tracks[0]['metrics'][m]
+                                       for o, m in [('overtakes', 'possibleOvertakes'),
+                                                    ('lapTime', 'estimatedLapTime'), ('safety', 'safetyRating')]}
+    
+    with pytest.raises(ValueError):
+        generate_pareto_tracks(['overtakes'])
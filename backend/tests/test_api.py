@@ -111,6 +111,347 @@ def test_simulate_race(client):
     data = json.loads(response.data)
     assert 'winner' in data
     assert 'race_results' in data
+    
+    for options in ({'laps': 'abc'}, {'laps': 500}, {'weather': 'snow'}, {'safetyCarProbability': 2}):
+        response = client.post(
+            '/api/simulate-race',
+            data=json.dumps(dict(race_data, **options)),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+    
+    for plan in ({'compounds': ['soft'], 'pitLaps': [20, 10]}, {'compounds': ['soft', 'hard'], 'pitLaps': [3]},
+                 {'compounds': 'soft', 'pitLaps': 'x'}):
+        response = client.post(
+            '/api/simulate-race',
+            data=json.dumps({'track': 'Test Race Track', 'drivers': [{'name': 'A', 'stintPlan': plan}, 'B']}),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+
+
+def test_stint_plan_schema():
+    """Test that race requests reject inconsistent stint plans"""
+    from validation import RaceSimulationSchema, StintPlanSchema
+    
+    assert StintPlanSchema().validate({'compounds': ['soft', 'hard'], 'pitLaps': [10]}) == {}
+    assert StintPlanSchema().validate({'compounds': ['soft'], 'pitLaps': [20, 10]})
+    assert StintPlanSchema().validate({'compounds': ['soft', 'hard', 'medium'], 'pitLaps': [10, 10]})
+    
+    race = {'track': 'T', 'drivers': [{'name': 'A', 'stintPlan': {'compounds': ['soft', 'hard'], 'pitLaps': [10]}},
+                                      {'name': 'B'}]}
+    assert RaceSimulationSchema().validate(dict(race, laps=20)) == {}
+    assert RaceSimulationSchema().validate(dict(race, laps=10))
+
+
+def test_simulate_race_monte_carlo(client):
+    """Test Monte Carlo batch simulation endpoint"""
+    client.post(
+        '/api/create-track',
+        data=json.dumps({'name': 'Monte Carlo Track', 'laps': 5}),
+        content_type='application/json'
+    )
+    
+    response = client.post(
+        '/api/simulate-race/monte-carlo',
+        data=json.dumps({'track': 'Monte Carlo Track', 'racers': ['A', 'B', 'C'], 'iterations': 50}),
+        content_type='application/json'
+    )
+    
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['iterations'] == 50
+    assert len(data['drivers']) == 3
+    assert 'win_probability' in data['drivers'][0]
+    
+    for options in ({'laps': 'many'}, {'weather': 'snow'}, {'safetyCarProbability': '0.1'}, {'iterations': True}):
+        response = client.post(
+            '/api/simulate-race/monte-carlo',
+            data=json.dumps({'track': 'Monte Carlo Track', 'racers': ['A', 'B'], 'iterations': 5, **options}),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+
+
+def test_optimize_pit_strategy(client):
+    """Test pit strategy search endpoint"""
+    client.post(
+        '/api/create-track',
+        data=json.dumps({'name': 'Strategy Track', 'laps': 12}),
+        content_type='application/json'
+    )
+    
+    response = client.post(
+        '/api/strategy/optimize',
+        data=json.dumps({'track': 'Strategy Track', 'racers': ['A', 'B', 'C'], 'driver': 'B',
+                         'maxStops': 1, 'minRaces': 4, 'top': 2, 'seed': 3}),
+        content_type='application/json'
+    )
+    
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['driver'] == 'B'
+    assert len(data['best']) == 2
+    assert 'position_ci' in data['best'][0]
+    
+    response = client.post(
+        '/api/strategy/optimize',
+        data=json.dumps({'track': 'Strategy Track', 'racers': ['A', 'B'], 'driver': 'Z'}),
+        content_type='application/json'
+    )
+    assert response.status_code == 400
+    
+    for options in ({'laps': '12'}, {'minRaces': 'eight'}, {'top': 0}, {'maxStops': True}, {'weather': 5}):
+        response = client.post(
+            '/api/strategy/optimize',
+            data=json.dumps({'track': 'Strategy Track', 'racers': ['A', 'B'], **options}),
+            content_type='application/json'
+        )
+        assert response.status_code == 400
+
+
+def test_track_editor_session(client):
+    """Test editor metrics follow element edits"""
+    elements = [
+        {'type': 'straight', 'length': 500, 'banking': 0, 'elevation': 0, 'isDRS': True},
+        {'type': 'corner-left', 'length': 200, 'banking': 10, 'elevation': 5},
+    ]
+    response = client.post('/api/ai/editor/sessions', data=json.dumps({'elements': elements}),
+                           content_type='application/json')
+    assert response.status_code == 201
+    data = json.loads(response.data)
+    session_id = data['session_id']
+    assert data['metrics']['possibleOvertakes'] == 2
+    
+    # Dragging the straight shorter loses the long-straight overtake
+    response = client.put(f'/api/ai/editor/sessions/{session_id}/elements/0', data=json.dumps({'length': 250}),
+                          content_type='application/json')
+    assert response.status_code == 200
+    metrics = json.loads(response.data)['metrics']
+    assert metrics['totalLength'] == 450
+    assert metrics['possibleOvertakes'] == 1
+    
+    response = client.post(f'/api/ai/editor/sessions/{session_id}/elements',
+                           data=json.dumps({'index': 1, 'element': {'type': 'straight', 'length': 300}}),
+                           content_type='application/json')
+    assert json.loads(response.data)['metrics']['straightCount'] == 2
+    
+    response = client.delete(f'/api/ai/editor/sessions/{session_id}/elements/0')
+    assert json.loads(response.data)['elements'] == 2
+    
+    response = client.put(f'/api/ai/editor/sessions/{session_id}/elements/0', data=json.dumps({'type': 'loop'}),
+                          content_type='application/json')
+    assert response.status_code == 400
+    assert client.delete(f'/api/ai/editor/sessions/{session_id}/elements/5').status_code == 404
+    assert client.delete(f'/api/ai/editor/sessions/{session_id}').status_code == 200
+    assert client.get(f'/api/ai/editor/sessions/{session_id}').status_code == 404
+    
+    for elements in (5, 'straight', {'type': 'straight', 'length': 100}, [['straight', 100]]):
+        response = client.post('/api/ai/editor/sessions', data=json.dumps({'elements': elements}),
+                               content_type='application/json')
+        assert response.status_code == 400
+
+
+def test_track_job_stream_and_stop(client):
+    """Test a track job streams its progress and finishes early with the best track so far"""
+    from track_jobs import jobs
+    
+    response = client.post('/api/ai/jobs', data=json.dumps({'target': 'overtakes', 'seed': 1,
+                                                            'populationSize': 200, 'generations': 1000}),
+                           content_type='application/json')
+    assert response.status_code == 202
+    job_id = json.loads(response.data)['job_id']
+    jobs[job_id].wait(0, timeout=30)
+    
+    response = client.post(f'/api/ai/jobs/{job_id}/stop', data=json.dumps({'action': 'finish'}),
+                           content_type='application/json')
+    assert response.status_code == 200
+    
+    response = client.get(f'/api/ai/jobs/{job_id}/stream')
+    assert response.mimetype == 'text/event-stream'
+    events = [block.split('\n') for block in response.get_data(as_text=True).split('\n\n') if block.startswith('event')]
+    names = [lines[0][len('event: '):] for lines in events]
+    assert names[-1] == 'finish' and set(names[:-1]) == {'progress'}
+    
+    track = json.loads(events[-1][1][len('data: '):])
+    progress = json.loads(events[-2][1][len('data: '):])
+    assert track['generation_stats']['completed_generations'] == progress['generation'] < 1000
+    assert progress['best_fitness'] >= progress['mean_fitness']
+    
+    status = json.loads(client.get(f'/api/ai/jobs/{job_id}').data)
+    assert status['state'] == 'completed'
+    assert client.post(f'/api/ai/jobs/{job_id}/stop', data=json.dumps({'action': 'pause'}),
+                       content_type='application/json').status_code == 400
+    assert client.get('/api/ai/jobs/missing').status_code == 404
+
+
+def test_track_jobs_never_evict_running_jobs(client, monkeypatch):
+    """Test a full job table drops finished jobs but refuses new jobs while all are running"""
+    import track_jobs
+    
+    monkeypatch.setattr(track_jobs, 'MAX_JOBS', 1)
+    track_jobs.jobs.clear()
+    running = track_jobs.TrackJob(lambda progress_callback: {})
+    track_jobs.jobs[running.job_id] = running
+    
+    body = json.dumps({'target': 'safety', 'seed': 1, 'populationSize': 2, 'generations': 1})
+    response = client.post('/api/ai/jobs', data=body, content_type='application/json')
+    assert response.status_code == 503
+    assert list(track_jobs.jobs) == [running.job_id] and running.stop_action is None
+    
+    running.state = track_jobs.COMPLETED
+    response = client.post('/api/ai/jobs', data=body, content_type='application/json')
+    assert response.status_code == 202
+    assert list(track_jobs.jobs) == [json.loads(response.data)['job_id']]
+    
+    monkeypatch.setattr(track_jobs, 'MAX_JOBS', 100)
+    monkeypatch.setattr(track_jobs, 'MAX_RUNNING_JOBS', 1)
+    track_jobs.jobs.clear()
+    track_jobs.jobs[running.job_id] = running
+    running.state = track_jobs.RUNNING
+    response = client.post('/api/ai/jobs', data=body, content_type='application/json')
+    assert response.status_code == 503
+    assert list(track_jobs.jobs) == [running.job_id]
+
+
+def test_improve_track(client):
+    """Test improving a track runs a short seeded evolution that never makes it worse"""
+    elements = [{'type': 'straight', 'length': 300}, {'type': 'corner-left', 'length': 150, 'banking': 5},
+                {'type': 'straight', 'length': 250}, {'type': 'corner-right', 'length': 200},
+                {'type': 'straight', 'length': 400}, {'type': 'corner-left', 'length': 120}]
+    response = client.post('/api/ai/improve-track',
+                           data=json.dumps({'track': {'elements': elements}, 'target': 'speed', 'seed': 1}),
+                           content_type='application/json')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['track']['generation_stats']['generations'] == 10
+    assert data['fitness']['after'] >= data['fitness']['before']
+    
+    response = client.post('/api/ai/improve-track', data=json.dumps({'track': {'elements': [{'type': 'loop'}]}}),
+                           content_type='application/json')
+    assert response.status_code == 400
+    assert client.post('/api/ai/improve-track', data=json.dumps({}),
+                       content_type='application/json').status_code == 400
+
+
+def test_batch_train_ai_driver(client):
+    """Test batch training races the AI driver and rejects bad options"""
+    response = client.post('/api/ai/driver/create', data=json.dumps({'name': 'Trainee'}),
+                           content_type='application/json')
+    driver_id = json.loads(response.data)['driver_id']
+    
+    response = client.post(f'/api/ai/driver/{driver_id}/batch-train',
+                           data=json.dumps({'num_races': 5, 'laps': 10, 'seed': 1}),
+                           content_type='application/json')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['driver']['races_completed'] == 5
+    assert [row['race'] for row in data['training_results']] == [1, 2, 3, 4, 5]
+    assert data['driver']['q_table_size'] > 0
+    
+    for options in ({'num_races': 0}, {'laps': 'many'}, {'weather': 'snow'}):
+        assert client.post(f'/api/ai/driver/{driver_id}/batch-train', data=json.dumps(options),
+                           content_type='application/json').status_code == 400
+
+
+def test_generate_track_from_library(client, monkeypatch):
+    """Test track generation answers from the track library unless told not to"""
+    import track_library
+    
+    library = track_library.TrackLibrary()
+    library.build(runs_per_target=1, population_size=10, generations=3, seed=2)
+    monkeypatch.setattr(track_library, '_library', library)
+    assert json.loads(client.get('/api/ai/library').data)['size'] == len(library)
+    
+    def generate(body):
+        response = client.post('/api/ai/generate-track', data=json.dumps(body), content_type='application/json')
+        assert response.status_code == 200
+        return json.loads(response.data)['track']['generation_stats']
+    
+    stats = generate({'target': 'safety', 'seed': 1})
+    assert stats['library']['refine_generations'] == 0 and stats['generations'] == 1
+    assert generate({'target': 'safety', 'seed': 1, 'refineGenerations': 5})['generations'] == 6
+    assert 'library' not in generate({'target': 'safety', 'seed': 1, 'library': False, 'generations': 5})
+    stats = generate({'target': 'safety', 'seed': 1, 'generations': 4})
+    assert 'library' not in stats and stats['generations'] == 4
+    assert 'library' not in generate({'target': 'safety', 'seed': 1, 'islands': 2, 'generations': 4})
+    assert 'library' not in generate({'target': 'safety', 'seed': 1, 'islands': 2})
+    
+    for body in ({'refineGenerations': -1}, {'seed': True}, {'target': 'difficulty', 'value': 'hard'},
+                 {'target': 'difficulty', 'value': 250}, {'target': 'speed', 'value': [1]}):
+        response = client.post('/api/ai/generate-track', data=json.dumps(body), content_type='application/json')
+        assert response.status_code == 400
+
+
+def test_closed_layout_skips_track_library(client, monkeypatch):
+    """Test closedLayout requests never get an open track back from the track library"""
+    import track_library
+    from track_ai_designer import TrackElement, to_genome
+    
+    library = track_library.TrackLibrary()
+    library.add(to_genome([TrackElement('straight', 500, 0, 0) for _ in range(6)])[None])
+    monkeypatch.setattr(track_library, '_library', library)
+    
+    response = client.post('/api/ai/generate-track', data=json.dumps({'target': 'safety', 'seed': 1}),
+                           content_type='application/json')
+    assert not json.loads(response.data)['track']['layout']['closed']
+    
+    response = client.post('/api/ai/generate-track',
+                           data=json.dumps({'target': 'safety', 'seed': 1, 'closedLayout': True}),
+                           content_type='application/json')
+    assert response.status_code == 200
+    track = json.loads(response.data)['track']
+    assert 'library' not in track['generation_stats']
+    assert track['layout']['closed'] and not track['layout']['self_intersecting']
+
+
+def test_simulate_race_columnar(client):
+    """Test columnar results as base64 JSON and as raw binary"""
+    client.post(
+        '/api/create-track',
+        data=json.dumps({'name': 'Columnar Track', 'laps': 5}),
+        content_type='application/json'
+    )
+    race_data = {'track': 'Columnar Track', 'racers': ['A', 'B', 'C'], 'resultFormat': 'columnar'}
+    
+    response = client.post('/api/simulate-race', data=json.dumps(race_data), content_type='application/json')
+    assert response.status_code == 200
+    data = json.loads(response.data)
+    assert data['format'] == 'columnar'
+    assert data['positions']['dtype'] == '|i1'
+    assert data['lap_times']['shape'] == [3, 5]
+    
+    race_data['encoding'] = 'binary'
+    response = client.post('/api/simulate-race', data=json.dumps(race_data), content_type='application/json')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/octet-stream'
+    assert response.data[:4] == b'RSC1'
+
+
+def test_simulate_race_stream(client):
+    """Test lap-by-lap Server-Sent Events stream"""
+    client.post(
+        '/api/create-track',
+        data=json.dumps({'name': 'Stream Track', 'laps': 4}),
+        content_type='application/json'
+    )
+    
+    response = client.get('/api/simulate-race/stream?track=Stream Track&drivers=A,B,C&seed=1')
+    
+    assert response.status_code == 200
+    assert response.mimetype == 'text/event-stream'
+    events = [
+        (lines[0][len('event: '):], json.loads(lines[1][len('data: '):]))
+        for lines in (block.split('\n') for block in response.get_data(as_text=True).strip().split('\n\n'))
+    ]
+    assert [name for name, _ in events] == ['lap'] * 4 + ['finish']
+    assert [data['lap'] for _, data in events[:4]] == [1, 2, 3, 4]
+    assert len(events[0][1]['standings']) == 3
+    assert events[-1][1]['winner'] in ['A', 'B', 'C']
+    
+    for query in ('laps=abc', 'seed=xyz', 'weather=snow', 'laps=500', 'safetyCarProbability=high'):
+        response = client.get(f'/api/simulate-race/stream?track=Stream Track&drivers=A,B&{query}')
+        assert response.status_code == 400
 
 
 def test_simulate_race_insufficient_drivers(client):
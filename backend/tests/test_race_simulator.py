@@ -2,6 +2,7 @@
 Race Simulator Unit Tests
 """
 import pytest
+import numpy as np
 from race_simulator import RaceSimulator, Driver, TireCompound
 
 
@@ -123,3 +124,270 @@ def test_race_results_structure():
         assert 'lap_times' in result
         assert 'pit_stops' in result
 
+
+
+def test_vectorized_engine_results_structure():
+    """Test vectorized engine produces the same results shape as the classic engine"""
+    track_data = {
+        'name': 'Test',
+        'metrics': {'estimatedLapTime': 90.0, 'totalLength': 5000, 'difficultyScore': 50, 'possibleOvertakes': 3}
+    }
+    drivers = [{'name': f'D{i}', 'skill': 0.7 + i * 0.02, 'aggression': 0.5} for i in range(6)]
+    
+    classic = RaceSimulator(track_data, drivers, total_laps=20).simulate_race()
+    vectorized = RaceSimulator(track_data, drivers, total_laps=20, engine='vectorized').simulate_race()
+    
+    assert set(vectorized) == set(classic)
+    assert len(vectorized['race_results']) == 6
+    assert len(vectorized['weather_summary']) == len(classic['weather_summary'])
+    for result in vectorized['race_results']:
+        assert set(result) == set(classic['race_results'][0])
+        assert len(result['positions']) == 20
+        assert len(result['gaps']) == 20
+        if result['status'] == 'Finished':
+            assert len(result['lap_times']) == 20
+
+
+def test_vectorized_engine_batch_outcomes():
+    """Test a batch of independent races stepped together"""
+    from vectorized_engine import VectorizedRaceEngine
+    
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.8, 'aggression': 0.5} for i in range(4)]
+    simulator = RaceSimulator(track_data, drivers, total_laps=15)
+    
+    outcomes = VectorizedRaceEngine(simulator, n_races=50).run().outcomes()
+    
+    assert outcomes['finishing_position'].shape == (50, 4)
+    assert (np.sort(outcomes['finishing_position'], axis=1) == [1, 2, 3, 4]).all()
+    assert (outcomes['laps_completed'] <= 15).all()
+    assert (outcomes['laps_completed'][~outcomes['retired']] == 15).all()
+    assert simulator.commentary == []
+
+
+def test_unknown_engine_rejected():
+    """Test simulator rejects unknown engine names"""
+    with pytest.raises(ValueError):
+        RaceSimulator({'metrics': {}}, [{'name': 'D1'}], total_laps=1, engine='warp')
+
+
+def test_simulate_many_aggregates():
+    """Test Monte Carlo batch returns per-driver aggregates"""
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [
+        {'name': 'Fast', 'skill': 0.95, 'aggression': 0.3},
+        {'name': 'Slow', 'skill': 0.5, 'aggression': 0.3},
+        {'name': 'Mid', 'skill': 0.7, 'aggression': 0.3},
+    ]
+    simulator = RaceSimulator(track_data, drivers, total_laps=10, seed=0)
+    
+    summary = simulator.simulate_many(300, workers=1)
+    
+    assert summary['iterations'] == 300
+    assert summary['favourite'] == 'Fast'
+    # Probabilities are rounded to 4 places
+    assert abs(sum(d['win_probability'] for d in summary['drivers']) - 1.0) < 1e-3
+    for driver in summary['drivers']:
+        assert sum(driver['position_histogram']) == 300
+        assert 0.0 <= driver['dnf_rate'] <= 1.0
+    assert 'commentary' not in summary
+
+
+def test_seeded_races_are_reproducible():
+    """Test the same seed gives bit-identical races on both engines"""
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.7 + i * 0.03, 'aggression': 0.6} for i in range(8)]
+    
+    for engine in RaceSimulator.ENGINES:
+        first = RaceSimulator(track_data, drivers, 25, weather='variable', engine=engine, seed=42).simulate_race()
+        second = RaceSimulator(track_data, drivers, 25, weather='variable', engine=engine, seed=42).simulate_race()
+        other = RaceSimulator(track_data, drivers, 25, weather='variable', engine=engine, seed=43).simulate_race()
+        
+        assert first == second
+        assert first != other
+
+
+def test_seeded_simulate_many_ignores_worker_count():
+    """Test Monte Carlo results depend on the seed, not on how batches are spread over workers"""
+    from monte_carlo import simulate_many
+    
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.6 + i * 0.1, 'aggression': 0.5} for i in range(3)]
+    
+    inline = simulate_many(track_data, drivers, 10, 200, workers=1, batch_size=50, seed=7)
+    pooled = simulate_many(track_data, drivers, 10, 200, workers=2, batch_size=50, seed=7)
+    
+    assert inline == pooled
+
+
+def test_iter_laps_without_history_matches_full_race():
+    """Test streaming laps without history gives the same race as simulate_race"""
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.7, 'aggression': 0.7} for i in range(5)]
+    
+    for engine in RaceSimulator.ENGINES:
+        full = RaceSimulator(track_data, drivers, 12, engine=engine, seed=9).simulate_race()
+        
+        simulator = RaceSimulator(track_data, drivers, 12, engine=engine, seed=9, record_history=False)
+        snapshots = list(simulator.iter_laps())
+        streamed = simulator.generate_results()
+        
+        assert [s['lap'] for s in snapshots] == list(range(1, 13))
+        assert all(len(s['standings']) == 5 for s in snapshots)
+        assert streamed['winner'] == full['winner']
+        assert streamed['fastest_lap'] == full['fastest_lap']
+        assert [r['total_time'] for r in streamed['race_results']] == [r['total_time'] for r in full['race_results']]
+        assert all(r['lap_times'] == [] for r in streamed['race_results'])
+
+
+def test_columnar_results_match_rows():
+    """Test columnar matrices hold the same history as the per-driver rows"""
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.7, 'aggression': 0.9} for i in range(10)]
+    
+    for engine in RaceSimulator.ENGINES:
+        rows = RaceSimulator(track_data, drivers, 30, engine=engine, seed=5).simulate_race()
+        columns = RaceSimulator(track_data, drivers, 30, engine=engine, seed=5).simulate_race('columnar')
+        
+        assert columns['positions'].dtype == np.int8
+        assert columns['lap_times'].shape == columns['gaps'].shape == (10, 30)
+        assert columns['drivers'] == [r['driver'] for r in rows['race_results']]
+        for row, result in enumerate(rows['race_results']):
+            laps = len(result['lap_times'])
+            assert columns['positions'][row].tolist() == result['positions']
+            assert np.allclose(columns['lap_times'][row, :laps], result['lap_times'], atol=1e-3)
+            assert np.isnan(columns['lap_times'][row, laps:]).all()
+
+
+def test_result_encodings_round_trip():
+    """Test base64 and binary encodings decode back to the same arrays"""
+    import json
+    from result_encoding import decode_base64, decode_binary, encode_base64, encode_binary
+    
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.7, 'aggression': 0.5} for i in range(4)]
+    columns = RaceSimulator(track_data, drivers, 8, seed=1).simulate_race('columnar')
+    
+    for decoded in [decode_base64(json.loads(json.dumps(encode_base64(columns)))),
+                    decode_binary(encode_binary(columns))]:
+        assert decoded['drivers'] == columns['drivers']
+        assert decoded['winner'] == columns['winner']
+        for name in ['lap_times', 'positions', 'gaps']:
+            assert decoded[name].dtype == columns[name].dtype
+            assert np.array_equal(decoded[name], columns[name], equal_nan=True)
+
+
+def test_retired_drivers_placed_in_retirement_order():
+    """Test retired cars sit behind the field in the order they retired on both engines"""
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.7, 'aggression': 1.0} for i in range(30)]
+    
+    for engine in RaceSimulator.ENGINES:
+        results = RaceSimulator(track_data, drivers, 40, weather='rain', engine=engine, seed=2).simulate_race()
+        retired = [r for r in results['race_results'] if r['status'] != 'Finished']
+        assert len(retired) > 1
+        
+        for lap in range(40):
+            out = sorted((len(r['lap_times']), r['positions'][lap]) for r in retired if len(r['lap_times']) <= lap + 1)
+            running = 30 - len(out)
+            assert [position for _, position in out] == list(range(running + 1, 31))
+
+
+def test_events_rendered_lazily_and_optional():
+    """Test commentary is rendered from the event log and can be switched off"""
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.7, 'aggression': 0.8} for i in range(8)]
+    
+    simulator = RaceSimulator(track_data, drivers, 20, seed=4)
+    results = simulator.simulate_race()
+    events = simulator.events.since()
+    
+    assert len(events) == len(results['commentary'])
+    assert simulator.events.types() == [c['type'] for c in results['commentary']]
+    assert events['lap'].tolist() == [c['lap'] for c in results['commentary']]
+    assert simulator.events.count('pit_stop') == sum(r['pit_stops'] for r in results['race_results'])
+    
+    quiet = RaceSimulator(track_data, drivers, 20, seed=4, record_events=False).simulate_race()
+    assert quiet['commentary'] == []
+    assert quiet['race_results'] == results['race_results']
+
+
+def test_stint_plans_followed_by_both_engines():
+    """Test planned pit laps and compounds are used in place of adaptive pit calls"""
+    from race_simulator import StintPlan
+    
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [
+        {'name': 'Planned', 'stintPlan': {'compounds': ['soft', 'medium', 'hard'], 'pitLaps': [8, 20]}},
+        {'name': 'Derived', 'pitStrategy': 'one-stop', 'tireStrategy': 'conservative', 'preferredTire': 'soft'},
+        {'name': 'Adaptive'},
+    ]
+    
+    for engine in RaceSimulator.ENGINES:
+        simulator = RaceSimulator(track_data, drivers, 30, engine=engine, seed=5)
+        results = simulator.simulate_race()
+        pits = [e for e in results['commentary'] if e['type'] == 'pit_stop']
+        planned = [e['text'] for e in pits if 'Planned pits' in e['text']]
+        derived = [e['text'] for e in pits if 'Derived pits' in e['text']]
+        
+        assert planned[0].startswith('Lap 8: Planned pits! soft → medium')
+        assert planned[1].startswith('Lap 20: Planned pits! medium → hard')
+        assert derived[0].startswith('Lap 15: Derived pits! soft → hard')
+    
+    assert StintPlan.from_config({'pitStrategy': 'two-stop', 'undercut': True}, 30).pit_laps == [8, 18]
+    assert StintPlan.from_config({'pitStrategy': 'adaptive'}, 30) is None
+    with pytest.raises(ValueError):
+        StintPlan(['soft', 'medium'], [10, 20])
+    with pytest.raises(ValueError):
+        StintPlan.from_config({'stintPlan': {'compounds': ['soft', 'hard'], 'pitLaps': [30]}}, 30)
+
+
+def test_strategy_optimizer_halves_candidates():
+    """Test successive halving narrows the plans and reports confidence intervals"""
+    from strategy_optimizer import optimize_strategy, candidate_plans
+    
+    track_data = {'name': 'Test', 'metrics': {'estimatedLapTime': 90.0}}
+    drivers = [{'name': f'D{i}', 'skill': 0.7 + i * 0.05, 'aggression': 0.4} for i in range(4)]
+    
+    result = optimize_strategy(track_data, drivers, 40, 'D1', max_stops=1, min_races=4, top=3,
+                               workers=1, seed=11)
+    
+    # Soft tires are worn out long before the end of a 40-lap race, so lopsided soft stints are dropped
+    limits = result['stint_limits']
+    assert limits['soft'] < limits['medium'] < limits['hard']
+    assert result['candidates'] == len(candidate_plans(40, max_stops=1, stint_limits=limits))
+    assert result['candidates'] < len(candidate_plans(40, max_stops=1)) == 81
+    plans_per_round = [r['plans'] for r in result['rounds']]
+    assert plans_per_round[0] == result['candidates']
+    assert plans_per_round == sorted(plans_per_round, reverse=True) and plans_per_round[-1] == 3
+    assert len(result['best']) == 3
+    positions = [plan['mean_position'] for plan in result['best']]
+    assert positions == sorted(positions)
+    for plan in result['best']:
+        assert plan['races'] == sum(r['races_per_plan'] for r in result['rounds'])
+        assert plan['position_ci'][0] <= plan['mean_position'] <= plan['position_ci'][1]
+        assert len(plan['compounds']) == len(plan['pitLaps']) + 1
+    
+    assert optimize_strategy(track_data, drivers, 40, 'D1', max_stops=1, min_races=4, top=3,
+                             workers=2, seed=11) == result
+
+
+def test_tire_model_matches_lap_by_lap_wear():
+    """Test precomputed tire tables equal the per-lap wear recurrence exactly"""
+    from tire_model import TireModel, COMPOUND_INDEX
+    
+    for weather in ['dry', 'rain']:
+        model = TireModel([0.2, 0.9], weather, 60)
+        for d, aggression in enumerate([0.2, 0.9]):
+            for compound, data in TireCompound.COMPOUNDS.items():
+                condition = 1.0
+                for age in range(1, 61):
+                    wear = 0.02 * data['wear_rate'] * (1 + max(0, age - data['optimal_laps']) * 0.05)
+                    wear *= 1 + aggression * 0.2
+                    if weather == 'rain' and compound not in ['intermediate', 'wet']:
+                        wear *= 2.0
+                    condition = max(0.3, condition - wear)
+                    assert model.condition[d, COMPOUND_INDEX[compound], age] == condition
+                    assert model.lap_factor[d, COMPOUND_INDEX[compound], age] == 1.0 / (data['grip'] * condition)
+    
+    assert model.stint_limit(0, 'soft') < model.stint_limit(0, 'hard')
@@ -0,0 +1,71 @@
+"""
+Tire Degradation Model
+Tire wear depends only on compound, tire age, driver aggression and the race
+weather, so the condition and lap time multiplier for every age a race can
+reach are precomputed once per simulator and the lap loops just index them
+"""
+from typing import List, Sequence
+
+import numpy as np
+
+
+class TireCompound:
+    """Tire compound characteristics"""
+    COMPOUNDS = {
+        'soft': {'grip': 1.0, 'wear_rate': 1.5, 'optimal_laps': 15, 'name': 'Soft'},
+        'medium': {'grip': 0.85, 'wear_rate': 1.0, 'optimal_laps': 25, 'name': 'Medium'},
+        'hard': {'grip': 0.7, 'wear_rate': 0.6, 'optimal_laps': 40, 'name': 'Hard'},
+        'intermediate': {'grip': 0.9, 'wear_rate': 0.8, 'optimal_laps': 30, 'name': 'Intermediate'},
+        'wet': {'grip': 1.0, 'wear_rate': 0.5, 'optimal_laps': 35, 'name': 'Wet'},
+    }
+
+
+# Compound lookup tables, indexed by position in TireCompound.COMPOUNDS
+COMPOUND_NAMES: List[str] = list(TireCompound.COMPOUNDS)
+COMPOUND_INDEX = {name: i for i, name in enumerate(COMPOUND_NAMES)}
+GRIP = np.array([TireCompound.COMPOUNDS[c]['grip'] for c in COMPOUND_NAMES])
+WEAR_RATE = np.array([TireCompound.COMPOUNDS[c]['wear_rate'] for c in COMPOUND_NAMES])
+OPTIMAL_LAPS = np.array([TireCompound.COMPOUNDS[c]['optimal_laps'] for c in COMPOUND_NAMES])
+IS_WET_TIRE = np.array([c in ['intermediate', 'wet'] for c in COMPOUND_NAMES])
+
+MIN_CONDITION = 0.3
+CRITICAL_CONDITION = 0.4  # below this a car pits on its next lap
+
+
+class TireModel:
+    """Condition and lap time multiplier tables indexed [driver, compound, tire age]
+
+    One row per driver rather than per aggression bucket, so the tables give
+    exactly the values the lap-by-lap recurrence would. Age runs from 0 (fresh
+    tires, condition 1.0) to max_age.
+    """
+
+    def __init__(self, aggression: Sequence[float], weather: str, max_age: int):
+        self.weather = weather
+        self.max_age = max_age
+        aggression = np.asarray(aggression, dtype=float)
+
+        # wear[d, c, a] is the wear of the lap that takes the tire from age a - 1 to a
+        age = np.arange(max_age + 1)
+        extra_laps = np.maximum(age - OPTIMAL_LAPS[:, None], 0)
+        wear = 0.02 * WEAR_RATE[:, None] * (1 + extra_laps * 0.05)
+        wear = wear[None] * (1 + aggression * 0.2)[:, None, None]
+        if weather == 'rain':
+            wear = wear * np.where(IS_WET_TIRE, 1.0, 2.0)[None, :, None]  # wrong tires wear much faster
+
+        # Subtracting left to right gives the same floats as the lap-by-lap
+        # recurrence; wear is positive, so clamping afterwards equals clamping each lap
+        wear[:, :, 0] = 1.0
+        condition = np.maximum(MIN_CONDITION, np.subtract.accumulate(wear, axis=2))
+
+        self.condition = condition
+        self.lap_factor = 1.0 / (GRIP[None, :, None] * condition)
+
+    def flat_index(self, driver: np.ndarray, compound: np.ndarray, age: np.ndarray) -> np.ndarray:
+        """Positions in the raveled tables; np.take on these beats 3-axis fancy indexing"""
+        return (driver * len(COMPOUND_NAMES) + compound) * (self.max_age + 1) + age
+
+    def stint_limit(self, driver: int, compound: str) -> int:
+        """Longest stint before the tire drops below critical condition and forces a stop"""
+        worn = np.flatnonzero(self.condition[driver, COMPOUND_INDEX[compound]] < CRITICAL_CONDITION)
+        return int(worn[0]) if len(worn) else self.max_age
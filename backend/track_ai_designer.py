@@ -2,10 +2,51 @@
 AI Track Designer - Procedural Track Generation
 Generates tracks optimized for specific metrics using genetic algorithms
 """
-import random
 import json
-from typing import List, Dict, Tuple, Optional
-import copy
+import math
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import compress, repeat
+from typing import Callable, List, Dict, Tuple, Optional
+from collections import Counter, OrderedDict
+
+import numpy as np
+
+from pareto import crowding_distance, non_dominated_sort
+from seeding import RandomStreams, SeedLike, choice
+from track_geometry import ELEMENT_SEGMENTS, close_layouts, layout_checks, polylines
+from track_simulation import (SIMULATED_TARGETS, SIMULATION_LAPS, SIMULATION_RACES, SurrogateModel,
+                              simulate_tracks)
+
+
+MAX_POPULATION = 5000
+MAX_GENERATIONS = 1000
+# Smaller populations are scored in-process: one batched call beats shipping them to a pool
+PARALLEL_MIN_POPULATION = 1000
+FITNESS_CACHE_SIZE = 50000
+MAX_ISLANDS = 32
+ISLAND_MUTATION_RATES = (0.1, 0.4)  # lowest and highest island mutation rate
+# Multi-objective mode: objective name -> (metric, 1 to maximise or -1 to minimise)
+PARETO_OBJECTIVES = {
+    'overtakes': ('possibleOvertakes', 1),
+    'lapTime': ('estimatedLapTime', -1),
+    'difficulty': ('difficultyScore', 1),
+    'safety': ('safetyRating', 1),
+}
+MAX_FRONT_SIZE = 100
+# Simulation mode breeds this many candidates per child and races only the
+# ones the surrogate ranks best
+SIMULATION_OVERSAMPLE = 4
+
+# position_elements draws tracks inside this (x, y) box, at most LAYOUT_SCALE px per metre
+LAYOUT_CANVAS = ((50, 50), (750, 550))
+LAYOUT_SCALE = 0.2
+
+# Targets generate_ai_track can optimise for
+TARGET_METRICS = ['overtakes', 'speed', 'difficulty', 'safety', 'balanced']
+
+# Called with a progress report per generation; returning True stops the evolution early
+ProgressCallback = Callable[[Dict], Optional[bool]]
 
 
 class TrackElement:
@@ -20,9 +61,10 @@ class TrackElement:
         self.isDRS = False
         self.sectorNumber = None
     
-    def to_dict(self, x: int = 0, y: int = 0) -> Dict:
+    def to_dict(self, x: int = 0, y: int = 0, *, element_id: str) -> Dict:
+        """Editor JSON of the element; ids come from the caller so seeded tracks are reproducible"""
         return {
-            'id': f'element-{random.randint(1000000, 9999999)}',
+            'id': element_id,
             'type': self.type,
             'x': x,
             'y': y,
@@ -35,15 +77,153 @@ class TrackElement:
         }
     
     def clone(self):
-        return TrackElement(self.type, self.length, self.banking, self.elevation)
+        element = TrackElement(self.type, self.length, self.banking, self.elevation)
+        element.isDRS = self.isDRS
+        return element
+    
+    @classmethod
+    def from_dict(cls, data: Dict, base: Optional['TrackElement'] = None) -> 'TrackElement':
+        """Track element from editor JSON; missing fields are taken from base"""
+        if not isinstance(data, dict):
+            raise ValueError('Element must be an object')
+        fields = {'type': 'straight', 'length': 100, 'banking': 0, 'elevation': 0, 'isDRS': False}
+        if base is not None:
+            fields.update(type=base.type, length=base.length, banking=base.banking,
+                          elevation=base.elevation, isDRS=base.isDRS)
+        fields.update({key: data[key] for key in fields if key in data})
+        
+        if fields['type'] not in ELEMENT_TYPES:
+            raise ValueError(f'Element type must be one of: {ELEMENT_TYPES}')
+        for key in ['length', 'banking', 'elevation']:
+            if isinstance(fields[key], bool) or not isinstance(fields[key], (int, float)):
+                raise ValueError(f'Element {key} must be a number')
+        if fields['length'] <= 0:
+            raise ValueError('Element length must be positive')
+        
+        element = cls(fields['type'], fields['length'], fields['banking'], fields['elevation'])
+        element.isDRS = bool(fields['isDRS'])
+        return element
+
+
+# Genome: one row per track element. A population is a (tracks, elements)
+# matrix of these rows; shorter tracks are padded at the end with PADDING rows
+ELEMENT_TYPES = ['straight', 'corner-left', 'corner-right', 'pit']
+STRAIGHT, CORNER_LEFT, CORNER_RIGHT, PIT = range(len(ELEMENT_TYPES))
+PADDING = -1
+GENOME_DTYPE = np.dtype([
+    ('type', np.int8),
+    ('length', np.int32),
+    ('banking', np.int16),
+    ('elevation', np.int16),
+    ('drs', np.bool_),
+])
+
+
+def to_genome(elements: List[TrackElement]) -> np.ndarray:
+    """Pack track elements into a genome"""
+    return np.array([(ELEMENT_TYPES.index(e.type), e.length, e.banking, e.elevation, e.isDRS)
+                     for e in elements], dtype=GENOME_DTYPE)
+
+
+def from_genome(genome: np.ndarray) -> List[TrackElement]:
+    """Unpack a genome (or one padded population row) into track elements"""
+    elements = []
+    for row in genome[genome['type'] != PADDING].tolist():
+        element = TrackElement(ELEMENT_TYPES[row[0]], row[1], row[2], row[3])
+        element.isDRS = row[4]
+        elements.append(element)
+    return elements
+
+
+def to_population(genomes: List[np.ndarray]) -> np.ndarray:
+    """Stack genomes of any length into a padded population matrix"""
+    lengths = np.array([len(g) for g in genomes])
+    population = np.zeros((len(genomes), max(lengths.max(initial=0), 1)), dtype=GENOME_DTYPE)
+    population['type'] = PADDING
+    population[np.arange(population.shape[1]) < lengths[:, None]] = np.concatenate(genomes)
+    return population
+
+
+def from_population(population: np.ndarray) -> List[np.ndarray]:
+    """Split a population matrix back into genomes"""
+    return [row[row['type'] != PADDING] for row in population]
+
+
+def _widen(population: np.ndarray, width: int) -> np.ndarray:
+    """Pad a population matrix with PADDING columns up to width elements"""
+    if population.shape[1] >= width:
+        return population
+    padding = np.zeros((len(population), width - population.shape[1]), dtype=GENOME_DTYPE)
+    padding['type'] = PADDING
+    return np.concatenate([population, padding], axis=1)
+
+
+def _stack(*populations: np.ndarray) -> np.ndarray:
+    """Concatenate population matrices of possibly different widths"""
+    width = max(population.shape[1] for population in populations)
+    return np.concatenate([_widen(population, width) for population in populations])
+
+
+def _stored_elements(track) -> List:
+    """Element dicts of a stored track in any form seed_population accepts"""
+    if isinstance(track, str):
+        return _stored_elements(json.loads(track))
+    if isinstance(track, dict):
+        if 'elements' in track:
+            return track['elements'] or []
+        return _stored_elements(track.get('trackData', track.get('track_data')))
+    return track or []
+
+
+def _layout_arrays(population: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Element lengths (0 for padding) and turns (+1 left, -1 right) for track_geometry"""
+    lengths = np.where(population['type'] == PADDING, 0, population['length'])
+    turns = (population['type'] == CORNER_LEFT).astype(np.int64) - (population['type'] == CORNER_RIGHT)
+    return lengths, turns
+
+
+def track_layouts(population: np.ndarray) -> Dict[str, np.ndarray]:
+    """Closure and self-intersection of every track laid out for real, see track_geometry.layout_checks"""
+    return layout_checks(*_layout_arrays(population))
+
+
+def close_population(population: np.ndarray) -> np.ndarray:
+    """Copy of a population with straights stretched to close each track where possible
+
+    See track_geometry.close_layouts; tracks that cannot be closed that way
+    are copied unchanged.
+    """
+    closed = population.copy()
+    lengths = close_layouts(*_layout_arrays(population), population['type'] == STRAIGHT)
+    elements = population['type'] != PADDING
+    closed['length'][elements] = np.rint(lengths[elements])
+    return closed
+
+
+def seed_population(tracks: List) -> np.ndarray:
+    """Population matrix of stored tracks, to seed an evolution with
+
+    A track can be a list of element dicts, a track dict with 'elements' (as
+    generate_ai_track, generate_pareto_tracks and the editor produce), a dict
+    holding one of those under 'trackData' or 'track_data' (app.py tracks,
+    SavedTrack.to_dict), or a JSON string of any of them (SavedTrack.track_data).
+    Tracks without elements, like app.py tracks created without trackData, are
+    skipped; malformed elements raise ValueError.
+    """
+    genomes = [to_genome([TrackElement.from_dict(element) for element in elements])
+               for elements in map(_stored_elements, tracks) if elements]
+    if not genomes:
+        return np.zeros((0, 1), dtype=GENOME_DTYPE)
+    return to_population(genomes)
 
 
 class TrackMetricsCalculator:
     """Calculate track metrics for optimization"""
     
     @staticmethod
-    def calculate_metrics(elements: List[TrackElement]) -> Dict:
-        if not elements:
+    def calculate_metrics(elements) -> Dict:
+        """Metrics of one track, given as track elements or a genome"""
+        if not len(elements):
             return {
                 'totalLength': 0,
                 'estimatedLapTime': 0,
@@ -56,61 +236,61 @@ class TrackMetricsCalculator:
                 'drsZoneCount': 0
             }
         
-        total_length = sum(e.length for e in elements)
-        corner_count = sum(1 for e in elements if 'corner' in e.type)
-        straight_count = sum(1 for e in elements if e.type == 'straight')
-        drs_count = sum(1 for e in elements if e.isDRS)
-        
-        elevations = [e.elevation for e in elements]
-        elevation_change = max(elevations) - min(elevations)
-        
-        # Estimate lap time
-        lap_time = 0
-        for el in elements:
-            if el.type == 'straight':
-                lap_time += el.length / 50
-                if el.isDRS:
-                    lap_time -= el.length / 70
-            else:
-                corner_time = el.length / 30
-                banking_reduction = el.banking * 0.01
-                lap_time += corner_time * (1 - banking_reduction)
-            lap_time += abs(el.elevation) * 0.05
+        genome = elements if isinstance(elements, np.ndarray) else to_genome(elements)
+        metrics = TrackMetricsCalculator.calculate_batch(genome[None])
+        return {name: values[0].item() for name, values in metrics.items()}
+    
+    @staticmethod
+    def calculate_batch(population: np.ndarray) -> Dict[str, np.ndarray]:
+        """Metrics of every track in a population matrix, one array per metric
+        
+        Every track needs at least one element. Sums are taken in the same order
+        as a loop over the elements would, so the values equal calculate_metrics.
+        """
+        kind = population['type']
+        valid = kind != PADDING
+        straight = kind == STRAIGHT
+        corner = (kind == CORNER_LEFT) | (kind == CORNER_RIGHT)
+        length = population['length'].astype(np.int64)
+        banking = population['banking'].astype(np.int64)
+        elevation = population['elevation'].astype(np.int64)
+        drs = population['drs'] & valid
+        
+        total_length = np.where(valid, length, 0).sum(axis=1)
+        corner_count = corner.sum(axis=1)
+        straight_count = straight.sum(axis=1)
+        drs_count = drs.sum(axis=1)
+        elevation_change = (np.where(valid, elevation, np.iinfo(np.int64).min).max(axis=1)
+                            - np.where(valid, elevation, np.iinfo(np.int64).max).min(axis=1))
+        
+        # Estimate lap time: anything but a straight is driven like a corner.
+        # Running total over [element time, DRS gain, elevation] per element
+        element_time = np.where(straight, length / 50, (length / 30) * (1 - banking * 0.01))
+        terms = np.stack([
+            np.where(valid, element_time, 0.0),
+            np.where(straight & drs, -(length / 70), 0.0),
+            np.where(valid, np.abs(elevation) * 0.05, 0.0),
+        ], axis=2).reshape(len(population), -1)
+        lap_time = np.add.accumulate(terms, axis=1)[:, -1]
         
         # Calculate difficulty
-        difficulty = 0
-        difficulty += corner_count * 2
-        difficulty += (elevation_change / 10) * 3
-        difficulty += (total_length / 1000) * 1
-        difficulty -= drs_count * 2
-        difficulty = max(0, min(100, difficulty))
-        
-        # Possible overtakes
-        overtakes = 0
-        for i in range(len(elements)):
-            el = elements[i]
-            next_el = elements[(i + 1) % len(elements)]
-            
-            if el.type == 'straight' and 'corner' in next_el.type:
-                if el.length > 300:
-                    overtakes += 1
-                if el.isDRS:
-                    overtakes += 1
-            
-            if 'corner' in el.type and el.banking < 5:
-                overtakes += 0.5
-        overtakes = int(overtakes)
+        difficulty = corner_count * 2 + (elevation_change / 10) * 3 + (total_length / 1000) * 1 - drs_count * 2
+        difficulty = np.clip(difficulty, 0, 100)
+        
+        # Possible overtakes: straights into a corner, the track wrapping around
+        n_elements = np.maximum(valid.sum(axis=1), 1)
+        following = (np.arange(population.shape[1]) + 1) % n_elements[:, None]
+        into_corner = straight & np.take_along_axis(corner, following, axis=1)
+        overtakes = ((into_corner & (length > 300)).sum(axis=1)
+                     + (into_corner & drs).sum(axis=1)
+                     + 0.5 * (corner & (banking < 5)).sum(axis=1)).astype(np.int64)
         
         # Safety rating
-        safety = 100
-        for el in elements:
-            if 'corner' in el.type and el.length > 200:
-                safety -= 5
-            if 'corner' in el.type and el.banking < 3:
-                safety -= 3
-            if abs(el.elevation) > 20:
-                safety -= 4
-        safety = max(0, min(100, safety))
+        safety = (100
+                  - 5 * (corner & (length > 200)).sum(axis=1)
+                  - 3 * (corner & (banking < 3)).sum(axis=1)
+                  - 4 * (valid & (np.abs(elevation) > 20)).sum(axis=1))
+        safety = np.clip(safety, 0, 100)
         
         return {
             'totalLength': total_length,
@@ -125,169 +305,554 @@ class TrackMetricsCalculator:
         }
 
 
+class IncrementalTrackMetrics:
+    """Track metrics kept up to date while single elements change
+
+    Holds running sums and counts, with each element's overtake and safety
+    contribution folded in. Changing, inserting or removing an element only
+    revisits that element and the one before it, whose overtake chance depends
+    on what follows. The lap time is a running float sum, so after many edits it
+    can differ from calculate_metrics in the last few digits.
+    """
+    
+    def __init__(self, elements: Optional[List[TrackElement]] = None):
+        self.elements: List[TrackElement] = []
+        self.total_length = 0
+        self.corner_count = 0
+        self.straight_count = 0
+        self.drs_count = 0
+        self.lap_time = 0.0
+        self.half_overtakes = 0  # in half overtakes, so the running total stays exact
+        self.safety_penalty = 0
+        self.elevations: Counter = Counter()
+        self.min_elevation = None
+        self.max_elevation = None
+        
+        for element in elements or []:
+            self.insert(len(self.elements), element)
+    
+    def __len__(self) -> int:
+        return len(self.elements)
+    
+    def _add_element(self, el: TrackElement, sign: int):
+        """Fold one element's own contributions in (sign 1) or out (sign -1)"""
+        is_corner = 'corner' in el.type
+        self.total_length += sign * el.length
+        self.corner_count += sign * is_corner
+        self.straight_count += sign * (el.type == 'straight')
+        self.drs_count += sign * el.isDRS
+        
+        lap_time = abs(el.elevation) * 0.05
+        if el.type == 'straight':
+            lap_time += el.length / 50 - (el.length / 70 if el.isDRS else 0)
+        else:
+            lap_time += (el.length / 30) * (1 - el.banking * 0.01)
+        self.lap_time += sign * lap_time
+        
+        self.half_overtakes += sign * (is_corner and el.banking < 5)
+        self.safety_penalty += sign * (5 * (is_corner and el.length > 200)
+                                       + 3 * (is_corner and el.banking < 3)
+                                       + 4 * (abs(el.elevation) > 20))
+        
+        if sign > 0:
+            self.elevations[el.elevation] += 1
+            if self.min_elevation is None or el.elevation < self.min_elevation:
+                self.min_elevation = el.elevation
+            if self.max_elevation is None or el.elevation > self.max_elevation:
+                self.max_elevation = el.elevation
+        else:
+            self.elevations[el.elevation] -= 1
+            if not self.elevations[el.elevation]:
+                del self.elevations[el.elevation]
+                # Only dropping the last element at an extreme needs a rescan
+                if el.elevation in (self.min_elevation, self.max_elevation):
+                    self.min_elevation = min(self.elevations, default=None)
+                    self.max_elevation = max(self.elevations, default=None)
+    
+    def _add_link(self, index: int, sign: int):
+        """Fold in or out the overtake chance of element index into the one after it"""
+        el = self.elements[index]
+        next_el = self.elements[(index + 1) % len(self.elements)]
+        if el.type == 'straight' and 'corner' in next_el.type:
+            self.half_overtakes += sign * 2 * ((el.length > 300) + el.isDRS)
+    
+    def replace(self, index: int, element: TrackElement):
+        """Swap the element at index for another one"""
+        linked = {(index - 1) % len(self.elements), index}
+        for i in linked:
+            self._add_link(i, -1)
+        self._add_element(self.elements[index], -1)
+        self.elements[index] = element
+        self._add_element(element, 1)
+        for i in linked:
+            self._add_link(i, 1)
+    
+    def insert(self, index: int, element: TrackElement):
+        """Insert an element before position index"""
+        if self.elements:
+            self._add_link((index - 1) % len(self.elements), -1)
+        self.elements.insert(index, element)
+        self._add_element(element, 1)
+        for i in {(index - 1) % len(self.elements), index}:
+            self._add_link(i, 1)
+    
+    def remove(self, index: int) -> TrackElement:
+        """Remove and return the element at index"""
+        for i in {(index - 1) % len(self.elements), index}:
+            self._add_link(i, -1)
+        element = self.elements.pop(index)
+        self._add_element(element, -1)
+        if self.elements:
+            self._add_link((index - 1) % len(self.elements), 1)
+        return element
+    
+    def metrics(self) -> Dict:
+        """Same metrics as TrackMetricsCalculator.calculate_metrics"""
+        if not self.elements:
+            return TrackMetricsCalculator.calculate_metrics([])
+        
+        elevation_change = self.max_elevation - self.min_elevation
+        difficulty = (self.corner_count * 2 + (elevation_change / 10) * 3
+                      + (self.total_length / 1000) * 1 - self.drs_count * 2)
+        return {
+            'totalLength': self.total_length,
+            'estimatedLapTime': self.lap_time,
+            'difficultyScore': float(max(0, min(100, difficulty))),
+            'possibleOvertakes': self.half_overtakes // 2,
+            'safetyRating': max(0, min(100, 100 - self.safety_penalty)),
+            'elevationChange': elevation_change,
+            'cornerCount': self.corner_count,
+            'straightCount': self.straight_count,
+            'drsZoneCount': self.drs_count
+        }
+
+
+def population_fitness(population: np.ndarray, target_metric: str,
+                       target_value: Optional[float] = None) -> np.ndarray:
+    """Fitness score of every track in a population matrix (higher is better)"""
+    metrics = TrackMetricsCalculator.calculate_batch(population)
+    
+    if target_metric == 'overtakes':
+        # Maximize overtaking opportunities
+        return (metrics['possibleOvertakes'] * 20
+                + metrics['straightCount'] * 5
+                - np.abs(metrics['difficultyScore'] - 50) * 0.5)
+    
+    elif target_metric == 'speed':
+        # Minimize lap time, maximize straights
+        corner = (population['type'] == CORNER_LEFT) | (population['type'] == CORNER_RIGHT)
+        corner_banking = np.where(corner, population['banking'].astype(np.int64), 0).sum(axis=1)
+        return (metrics['straightCount'] * 10
+                + corner_banking * 2
+                - metrics['estimatedLapTime']
+                - metrics['elevationChange'] * 0.2)
+    
+    elif target_metric == 'difficulty':
+        # Target specific difficulty or maximize
+        target_diff = target_value if target_value else 80
+        return (100 - np.abs(metrics['difficultyScore'] - target_diff)
+                + metrics['cornerCount'] * 2
+                + metrics['elevationChange'] * 0.5)
+    
+    elif target_metric == 'safety':
+        # Maximize safety rating
+        return (metrics['safetyRating']
+                - metrics['difficultyScore'] * 0.3
+                + metrics['straightCount'] * 2)
+    
+    elif target_metric == 'balanced':
+        # Create well-balanced track: 4-6km long, 4-6 overtaking points,
+        # medium difficulty and good safety
+        ideal_length = 5000
+        return (100
+                - np.abs(metrics['totalLength'] - ideal_length) / 100
+                - np.abs(metrics['possibleOvertakes'] - 5) * 5
+                - np.abs(metrics['difficultyScore'] - 50) * 0.5
+                + (metrics['safetyRating'] - 60) * 0.3)
+    
+    return np.zeros(len(population))
+
+
+def track_fitness(elements, target_metric: str, target_value: Optional[float] = None) -> float:
+    """Fitness score of one track, given as track elements or a genome"""
+    genome = elements if isinstance(elements, np.ndarray) else to_genome(elements)
+    return float(population_fitness(genome[None], target_metric, target_value)[0])
+
+
+def _fitness_chunk(target_metric: str, target_value: Optional[float], population: np.ndarray) -> np.ndarray:
+    """Worker entry point: fitness of a slice of the population matrix"""
+    return population_fitness(population, target_metric, target_value)
+
+
+def _simulation_chunk(target_metric: str, seed: int, population: np.ndarray) -> np.ndarray:
+    """Worker entry point: simulated measure of a slice of the population matrix"""
+    return simulate_tracks(TrackMetricsCalculator.calculate_batch(population), target_metric, seed)
+
+
+def _evolve_island(island: 'TrackAIDesigner', population: np.ndarray, fitness: np.ndarray,
+                   generations: int) -> Tuple['TrackAIDesigner', np.ndarray, np.ndarray]:
+    """Worker entry point: evolve one island for some generations
+
+    The island's fitness cache is emptied before it is sent back, so the cache
+    spans one migration interval and islands stay cheap to pass between processes.
+    """
+    for _ in range(generations):
+        population, fitness = island.breed(population, fitness)
+    island.fitness_cache.entries.clear()
+    return island, population, fitness
+
+
+class FitnessCache:
+    """Bounded map from track genome to fitness, evicting the least recently used"""
+    
+    def __init__(self, maxsize: int = FITNESS_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+    
+    @staticmethod
+    def keys(population: np.ndarray) -> List[bytes]:
+        """Canonical key per track: the bytes of its elements, padding left out"""
+        row_size = population.shape[1] * population.itemsize
+        starts = range(0, len(population) * row_size, row_size)
+        lengths = ((population['type'] != PADDING).sum(axis=1) * population.itemsize).tolist()
+        data = np.ascontiguousarray(population).tobytes()
+        return [data[start:start + length] for start, length in zip(starts, lengths)]
+    
+    def lookup(self, keys: List[bytes]) -> np.ndarray:
+        """Cached fitness per key, NaN where it is not cached"""
+        fitness = np.array(list(map(self.entries.get, keys)), dtype=float)
+        found = ~np.isnan(fitness)
+        for key in compress(keys, found):
+            self.entries.move_to_end(key)
+        hits = int(found.sum())
+        self.hits += hits
+        self.misses += len(keys) - hits
+        return fitness
+    
+    def store(self, keys: List[bytes], fitness: List[float]):
+        self.entries.update(zip(keys, fitness))
+        while len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+    
+    def stats(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+            'size': len(self.entries)
+        }
+
+
 class TrackAIDesigner:
     """AI-powered track designer using genetic algorithms"""
+    # Independent random stream per GA stage, see seeding.RandomStreams
+    RANDOM_STREAMS = ['population', 'selection', 'crossover', 'mutation', 'layout']
+    MIN_ELEMENTS = 6
     
-    def __init__(self, target_metric: str, target_value: Optional[float] = None):
+    def __init__(self, target_metric: str, target_value: Optional[float] = None,
+                 seed: SeedLike = None, population_size: int = 20, generations: int = 50,
+                 workers: Optional[int] = 1, cache_size: int = FITNESS_CACHE_SIZE,
+                 mutation_rate: float = 0.2, islands: int = 1, migration_interval: int = 10,
+                 migrants: int = 2, seed_tracks: Optional[np.ndarray] = None, closed_layout: bool = False,
+                 simulate: bool = False):
         """
         target_metric: 'overtakes', 'speed', 'difficulty', 'safety', 'balanced'
         target_value: optional specific value for metric
+        seed: int, SeedSequence or numpy Generator; the same seed evolves the same track
+        workers: processes scoring fitness (None = one per CPU); results do not depend on it
+        cache_size: tracks whose fitness is remembered across generations (0 disables)
+        islands: independent populations of population_size tracks (see evolve_islands),
+            run on up to `workers` processes; migration_interval and migrants set
+            how often and how many of their best tracks they exchange
+        seed_tracks: population matrix of tracks to start from (see seed_population),
+            split between the islands; mutated copies of them fill the rest of
+            each population, so the run refines them instead of starting over
+        closed_layout: only closed tracks that do not cross themselves when laid
+            out for real (see track_geometry) are kept; the rest are rejected
+            before their fitness is computed
+        simulate: add the target's measured result from short batched races on
+            each track to its fitness (see track_simulation); only targets in
+            SIMULATED_TARGETS have one. Each generation breeds
+            SIMULATION_OVERSAMPLE candidates per child and races only the ones
+            a surrogate model of the results so far ranks best
         """
+        if not 2 <= population_size <= MAX_POPULATION:
+            raise ValueError(f'Population size must be between 2 and {MAX_POPULATION}')
+        if not 1 <= generations <= MAX_GENERATIONS:
+            raise ValueError(f'Generations must be between 1 and {MAX_GENERATIONS}')
+        if cache_size < 0:
+            raise ValueError('Cache size cannot be negative')
+        if not 1 <= islands <= MAX_ISLANDS:
+            raise ValueError(f'Islands must be between 1 and {MAX_ISLANDS}')
+        if islands > 1 and (migration_interval < 1 or not 0 <= migrants <= population_size // 2):
+            raise ValueError('Migration needs an interval of at least 1 and at most half the population as migrants')
+        if simulate and target_metric not in SIMULATED_TARGETS:
+            raise ValueError(f'Simulated fitness is available for: {list(SIMULATED_TARGETS)}')
         self.target_metric = target_metric
         self.target_value = target_value
-        self.population_size = 20
-        self.generations = 50
-        self.mutation_rate = 0.2
+        self.population_size = population_size
+        self.generations = generations
+        self.workers = workers or os.cpu_count() or 1
+        self.mutation_rate = mutation_rate
+        self.islands = islands
+        self.migration_interval = migration_interval
+        self.migrants = migrants
+        self.seed_tracks = seed_tracks
+        self.closed_layout = closed_layout
+        self.simulate = simulate
+        self.rng = RandomStreams(self.RANDOM_STREAMS, seed)
+        self.fitness_cache = FitnessCache(cache_size)
+        self.fitness_evaluations = 0
+        self.completed_generations = 0
+        self.surrogate = SurrogateModel() if simulate else None
+        # Every track is raced with this seed; drawn only in simulation mode so other runs are unchanged
+        self.simulation_seed = int(self.rng.spawn(1)[0].generate_state(1)[0]) if simulate else None
+    
+    def random_population(self, size: int, min_elements: int = 8, max_elements: int = 15) -> np.ndarray:
+        """Population matrix of random valid tracks"""
+        rng = self.rng.population
+        num_elements = rng.integers(min_elements, max_elements + 1, size=size)
+        shape = (size, max_elements)
+        
+        # Straights are twice as likely as either corner
+        population = np.zeros(shape, dtype=GENOME_DTYPE)
+        population['type'] = np.array([STRAIGHT, STRAIGHT, CORNER_LEFT, CORNER_RIGHT])[rng.integers(0, 4, size=shape)]
+        straight = population['type'] == STRAIGHT
+        population['length'] = np.where(straight, rng.integers(200, 801, size=shape), rng.integers(100, 401, size=shape))
+        population['banking'] = np.where(straight, 0, rng.integers(0, 26, size=shape))
+        population['elevation'] = rng.integers(-30, 31, size=shape)
+        population['type'][np.arange(max_elements) >= num_elements[:, None]] = PADDING
+        return population
+    
+    def random_closed_population(self, size: int, attempts: int = 20) -> np.ndarray:
+        """Population matrix of random tracks that close without crossing themselves
+
+        Each candidate starts as four corners turning the same way with a
+        straight before each (a rounded rectangle) and up to three chicanes (a
+        left and a right corner) inserted after straights. close_population then
+        stretches its straights to close the loop; candidates still invalid are
+        drawn again, up to `attempts` rounds.
+        """
+        rng = self.rng.population
+        accepted = []
+        for _ in range(attempts):
+            missing = size - sum(len(p) for p in accepted)
+            if missing <= 0:
+                break
+            # Twice the missing count, as some candidates cross themselves
+            count = 2 * missing
+            direction = np.where(rng.random(count) < 0.5, CORNER_LEFT, CORNER_RIGHT)
+            chicanes = rng.integers(0, 4, size=count)
+            positions = rng.integers(0, 4, size=(count, 3))
+            genomes = []
+            for turn, chicane_count, sides in zip(direction, chicanes, positions):
+                types = []
+                for side in range(4):
+                    types.append(STRAIGHT)
+                    for _ in range(int((sides[:chicane_count] == side).sum())):
+                        types += [CORNER_LEFT, CORNER_RIGHT, STRAIGHT]
+                    types.append(turn)
+                genome = np.zeros(len(types), dtype=GENOME_DTYPE)
+                genome['type'] = types
+                genomes.append(genome)
+            candidates = to_population(genomes)
+            straight = candidates['type'] == STRAIGHT
+            shape = candidates.shape
+            candidates['length'] = np.where(straight, rng.integers(200, 801, size=shape),
+                                            rng.integers(100, 401, size=shape))
+            candidates['banking'] = np.where(straight, 0, rng.integers(0, 26, size=shape))
+            candidates['elevation'] = rng.integers(-30, 31, size=shape)
+            candidates = close_population(candidates)
+            accepted.append(candidates[track_layouts(candidates)['valid']])
+        population = _stack(*accepted)
+        if len(population) < size:
+            # Give up on validity for the rest; evaluate_population rejects them
+            population = _stack(population, self.random_population(size - len(population)))
+        return population[:size]
+    
+    def initial_population(self) -> np.ndarray:
+        """The seed tracks, topped up with mutated copies of them to population_size"""
+        if self.seed_tracks is None or not len(self.seed_tracks):
+            if self.closed_layout:
+                return self.random_closed_population(self.population_size)
+            return self.random_population(self.population_size)
+        seeds = self.seed_tracks[:self.population_size].copy()
+        missing = self.population_size - len(seeds)
+        if not missing:
+            return seeds
+        copies = self.mutate(seeds[np.arange(missing) % len(seeds)])
+        return _stack(seeds, close_population(copies) if self.closed_layout else copies)
     
     def generate_random_track(self, min_elements: int = 8, max_elements: int = 15) -> List[TrackElement]:
         """Generate a random valid track"""
-        num_elements = random.randint(min_elements, max_elements)
-        elements = []
-        
-        for i in range(num_elements):
-            # Choose element type
-            element_type = random.choice(['straight', 'straight', 'corner-left', 'corner-right'])
-            
-            # Set properties based on type
-            if element_type == 'straight':
-                length = random.randint(200, 800)
-                banking = 0
-            else:
-                length = random.randint(100, 400)
-                banking = random.randint(0, 25)
-            
-            elevation = random.randint(-30, 30)
-            
-            element = TrackElement(element_type, length, banking, elevation)
-            elements.append(element)
-        
-        return elements
+        return from_genome(self.random_population(1, min_elements, max_elements)[0])
     
-    def fitness_function(self, elements: List[TrackElement]) -> float:
+    def fitness_function(self, elements) -> float:
         """Calculate fitness score based on target metric"""
-        metrics = TrackMetricsCalculator.calculate_metrics(elements)
+        return track_fitness(elements, self.target_metric, self.target_value)
+    
+    def evaluate_population(self, population: np.ndarray,
+                            pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+        """Fitness of every track, -inf for tracks breaking the closed_layout constraint
+
+        Rejected tracks are never scored; see cached_fitness for the rest.
+        """
+        if not self.closed_layout:
+            return self.cached_fitness(population, pool)
+        valid = track_layouts(population)['valid']
+        fitness = np.full(len(population), -np.inf)
+        if valid.any():
+            fitness[valid] = self.cached_fitness(population[valid], pool)
+        return fitness
+    
+    def cached_fitness(self, population: np.ndarray,
+                       pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+        """Fitness of every track; only distinct tracks missing from the fitness cache are scored"""
+        keys = FitnessCache.keys(population)
+        fitness = self.fitness_cache.lookup(keys)
+        missing = np.isnan(fitness)
+        if missing.any():
+            # Score each distinct genome once, however often it appears
+            distinct = dict(zip(compress(keys, missing), np.flatnonzero(missing).tolist()))
+            rows = list(distinct.values())
+            scores = self.score_population(population[rows], pool)
+            fitness[rows] = scores
+            self.fitness_cache.store(list(distinct), scores.tolist())
+            self.fitness_evaluations += len(rows)
+            if len(rows) < missing.sum():
+                scored = dict(zip(distinct, scores.tolist()))
+                fitness[missing] = [scored[key] for key in compress(keys, missing)]
+        return fitness
+    
+    def score_population(self, population: np.ndarray,
+                         pool: Optional[ProcessPoolExecutor] = None) -> np.ndarray:
+        """Fitness of every track, in chunks across the pool when one is given
+
+        In simulation mode the simulated measure is added, and the raced tracks
+        train the surrogate.
+        """
+        if pool is None:
+            fitness = population_fitness(population, self.target_metric, self.target_value)
+            if not self.simulate:
+                return fitness
+            measures = _simulation_chunk(self.target_metric, self.simulation_seed, population)
+        else:
+            # A few chunks per worker keeps them busy without paying per-track IPC
+            chunk_size = math.ceil(len(population) / (self.workers * 4))
+            chunks = [population[i:i + chunk_size] for i in range(0, len(population), chunk_size)]
+            fitness = np.concatenate(list(pool.map(_fitness_chunk, repeat(self.target_metric),
+                                                   repeat(self.target_value), chunks)))
+            if not self.simulate:
+                return fitness
+            measures = np.concatenate(list(pool.map(_simulation_chunk, repeat(self.target_metric),
+                                                    repeat(self.simulation_seed), chunks)))
         
-        if self.target_metric == 'overtakes':
-            # Maximize overtaking opportunities
-            score = metrics['possibleOvertakes'] * 20
-            score += metrics['straightCount'] * 5
-            score -= abs(metrics['difficultyScore'] - 50) * 0.5
-            return score
-        
-        elif self.target_metric == 'speed':
-            # Minimize lap time, maximize straights
-            score = metrics['straightCount'] * 10
-            score += sum(e.banking for e in elements if 'corner' in e.type) * 2
-            score -= metrics['estimatedLapTime']
-            score -= metrics['elevationChange'] * 0.2
-            return score
-        
-        elif self.target_metric == 'difficulty':
-            # Target specific difficulty or maximize
-            target_diff = self.target_value if self.target_value else 80
-            score = 100 - abs(metrics['difficultyScore'] - target_diff)
-            score += metrics['cornerCount'] * 2
-            score += metrics['elevationChange'] * 0.5
-            return score
-        
-        elif self.target_metric == 'safety':
-            # Maximize safety rating
-            score = metrics['safetyRating']
-            score -= metrics['difficultyScore'] * 0.3
-            score += metrics['straightCount'] * 2
-            return score
-        
-        elif self.target_metric == 'balanced':
-            # Create well-balanced track
-            score = 100
-            # Prefer 4-6km tracks
-            ideal_length = 5000
-            score -= abs(metrics['totalLength'] - ideal_length) / 100
-            # Prefer 4-6 overtaking points
-            score -= abs(metrics['possibleOvertakes'] - 5) * 5
-            # Prefer medium difficulty
-            score -= abs(metrics['difficultyScore'] - 50) * 0.5
-            # Prefer good safety
-            score += (metrics['safetyRating'] - 60) * 0.3
-            return score
-        
-        return 0
-    
-    def crossover(self, parent1: List[TrackElement], parent2: List[TrackElement]) -> List[TrackElement]:
-        """Combine two parent tracks"""
-        if len(parent1) < 2 or len(parent2) < 2:
-            return parent1
-        
-        crossover_point = random.randint(1, min(len(parent1), len(parent2)) - 1)
-        child = parent1[:crossover_point] + parent2[crossover_point:]
+        self.surrogate.add(TrackMetricsCalculator.calculate_batch(population), measures)
+        return fitness + SIMULATED_TARGETS[self.target_metric][1] * measures
+    
+    def preselect(self, candidates: np.ndarray, count: int) -> np.ndarray:
+        """Rows of the `count` candidates with the best fitness as the surrogate predicts it"""
+        predicted = (population_fitness(candidates, self.target_metric, self.target_value)
+                     + SIMULATED_TARGETS[self.target_metric][1]
+                     * self.surrogate.predict(TrackMetricsCalculator.calculate_batch(candidates)))
+        if self.closed_layout:
+            predicted[~track_layouts(candidates)['valid']] = -np.inf
+        return np.argsort(-predicted, kind='stable')[:count]
+    
+    def crossover(self, parents1: np.ndarray, parents2: np.ndarray) -> np.ndarray:
+        """Combine pairs of parent tracks: the head of one with the tail of the other"""
+        lengths1 = (parents1['type'] != PADDING).sum(axis=1)
+        lengths2 = (parents2['type'] != PADDING).sum(axis=1)
+        shortest = np.minimum(lengths1, lengths2)
+        crossover_point = self.rng.crossover.integers(1, np.maximum(shortest, 2))
+        # Tracks too short to split are passed on unchanged
+        crossover_point[shortest < 2] = parents1.shape[1]
+        children = np.where(np.arange(parents1.shape[1]) < crossover_point[:, None], parents1, parents2)
         
         # Ensure minimum length
-        while len(child) < 6:
-            child.append(self.generate_random_track(1, 1)[0])
-        
-        return child
-    
-    def mutate(self, elements: List[TrackElement]) -> List[TrackElement]:
-        """Randomly mutate track elements"""
-        mutated = [e.clone() for e in elements]
-        
-        for element in mutated:
-            if random.random() < self.mutation_rate:
-                # Mutate a random property
-                mutation_type = random.choice(['length', 'banking', 'elevation', 'type', 'drs'])
-                
-                if mutation_type == 'length':
-                    if element.type == 'straight':
-                        element.length = random.randint(200, 800)
-                    else:
-                        element.length = random.randint(100, 400)
-                
-                elif mutation_type == 'banking':
-                    element.banking = random.randint(0, 25)
-                
-                elif mutation_type == 'elevation':
-                    element.elevation = random.randint(-30, 30)
-                
-                elif mutation_type == 'type':
-                    element.type = random.choice(['straight', 'corner-left', 'corner-right'])
-                
-                elif mutation_type == 'drs' and element.type == 'straight':
-                    element.isDRS = random.random() < 0.3
+        lengths = (children['type'] != PADDING).sum(axis=1)
+        short = np.flatnonzero(lengths < self.MIN_ELEMENTS)
+        if len(short):
+            genomes = from_population(children)
+            for i in short:
+                missing = self.MIN_ELEMENTS - lengths[i]
+                genomes[i] = np.concatenate([genomes[i], self.random_population(1, missing, missing)[0]])
+            children = to_population(genomes)
+        
+        return children
+    
+    def mutate(self, population: np.ndarray) -> np.ndarray:
+        """Randomly mutate track elements of every track in the population"""
+        rng = self.rng.mutation
+        mutated = population.copy()
+        # Children start without DRS zones; optimize_drs_zones places them on the final track
+        mutated['drs'] = False
+        
+        rows, cols = np.nonzero(mutated['type'] != PADDING)
+        hit = rng.random(len(rows)) < self.mutation_rate
+        rows, cols = rows[hit], cols[hit]
+        # Mutate a random property: length, banking, elevation, type or DRS
+        mutation_type = rng.integers(0, 5, size=len(rows))
+        
+        at = (rows[mutation_type == 0], cols[mutation_type == 0])
+        straight = mutated['type'][at] == STRAIGHT
+        mutated['length'][at] = np.where(straight, rng.integers(200, 801, size=len(straight)),
+                                         rng.integers(100, 401, size=len(straight)))
+        at = (rows[mutation_type == 1], cols[mutation_type == 1])
+        mutated['banking'][at] = rng.integers(0, 26, size=len(at[0]))
+        at = (rows[mutation_type == 2], cols[mutation_type == 2])
+        mutated['elevation'][at] = rng.integers(-30, 31, size=len(at[0]))
+        at = (rows[mutation_type == 3], cols[mutation_type == 3])
+        mutated['type'][at] = rng.integers(STRAIGHT, CORNER_RIGHT + 1, size=len(at[0]))
+        at = (rows[mutation_type == 4], cols[mutation_type == 4])
+        mutated['drs'][at] = (mutated['type'][at] == STRAIGHT) & (rng.random(len(at[0])) < 0.3)
         
         return mutated
     
-    def evolve(self) -> Tuple[List[TrackElement], Dict]:
-        """Run genetic algorithm to evolve optimal track"""
-        # Initialize population
-        population = [self.generate_random_track() for _ in range(self.population_size)]
+    def breed(self, population: np.ndarray, fitness: np.ndarray,
+              pool: Optional[ProcessPoolExecutor] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """One generation: keep the fitter half and fill up with their mutated children"""
+        ranking = np.argsort(-fitness, kind='stable')
         
-        best_track = None
-        best_fitness = float('-inf')
+        # Selection - keep top 50%
+        kept = ranking[:len(population) // 2]
+        survivors = population[kept]
         
-        for generation in range(self.generations):
-            # Calculate fitness for each track
-            fitness_scores = [(track, self.fitness_function(track)) for track in population]
-            fitness_scores.sort(key=lambda x: x[1], reverse=True)
-            
-            # Track best
-            if fitness_scores[0][1] > best_fitness:
-                best_fitness = fitness_scores[0][1]
-                best_track = fitness_scores[0][0]
-            
-            # Selection - keep top 50%
-            survivors = [track for track, _ in fitness_scores[:self.population_size // 2]]
-            
-            # Reproduction - create new generation
-            new_population = survivors.copy()
-            
-            while len(new_population) < self.population_size:
-                parent1 = random.choice(survivors)
-                parent2 = random.choice(survivors)
-                child = self.crossover(parent1, parent2)
-                child = self.mutate(child)
-                new_population.append(child)
-            
-            population = new_population
+        # Reproduction - create new generation
+        num_children = len(population) - len(survivors)
+        num_candidates = num_children * SIMULATION_OVERSAMPLE if self.simulate else num_children
+        parents1 = survivors[self.rng.selection.integers(0, len(survivors), size=num_candidates)]
+        parents2 = survivors[self.rng.selection.integers(0, len(survivors), size=num_candidates)]
+        children = self.mutate(self.crossover(parents1, parents2))
+        if self.closed_layout:
+            children = close_population(children)
+        if self.simulate:
+            children = children[self.preselect(children, num_children)]
+        
+        # Survivors keep their fitness, only the children are scored
+        return (_stack(survivors, children),
+                np.concatenate([fitness[kept], self.evaluate_population(children, pool)]))
+    
+    def evolve(self, progress_callback: Optional[ProgressCallback] = None) -> Tuple[List[TrackElement], Dict]:
+        """Run genetic algorithm to evolve optimal track
+
+        progress_callback gets a progress report (see progress_report) after every
+        generation, or every migration in island mode; returning True stops the
+        evolution there and keeps the best track found so far.
+        """
+        if self.islands > 1:
+            population, fitness = self.evolve_islands(progress_callback)
+        else:
+            population, fitness = self.evolve_population(progress_callback)
+        # The best track always survives, so the final population holds it
+        return self.finish_track(population[np.argmax(fitness)])
+    
+    def finish_track(self, genome: np.ndarray) -> Tuple[List[TrackElement], Dict]:
+        """Track elements of a genome with DRS zones and sectors added, and their metrics"""
+        best_track = from_genome(genome)
         
         # Add DRS zones to best track
         best_track = self.optimize_drs_zones(best_track)
@@ -299,6 +864,154 @@ class TrackAIDesigner:
         final_metrics = TrackMetricsCalculator.calculate_metrics(best_track)
         
         return best_track, final_metrics
+
+    def objective_matrix(self, population: np.ndarray, objectives: List[str]) -> np.ndarray:
+        """One column per objective, signed so that larger is always better"""
+        metrics = TrackMetricsCalculator.calculate_batch(population)
+        return np.stack([sign * metrics[metric].astype(float)
+                         for metric, sign in (PARETO_OBJECTIVES[o] for o in objectives)], axis=1)
+    
+    def tournament(self, fronts: np.ndarray, crowding: np.ndarray) -> np.ndarray:
+        """Binary tournaments: the lower front wins, then the larger crowding distance"""
+        a, b = self.rng.selection.integers(0, len(fronts), size=(2, self.population_size))
+        a_wins = (fronts[a] < fronts[b]) | ((fronts[a] == fronts[b]) & (crowding[a] >= crowding[b]))
+        return np.where(a_wins, a, b)
+    
+    def evolve_pareto(self, objectives: Optional[List[str]] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """NSGA-II: evolve towards the Pareto front of several objectives at once
+
+        Each generation breeds population_size children from tournament winners,
+        then keeps the best population_size of parents and children by front
+        and, within the last front that fits, by crowding distance. Returns the
+        distinct genomes of the final Pareto front and their objective rows.
+        """
+        objectives = objectives or list(PARETO_OBJECTIVES)
+        population = self.initial_population()
+        scores = self.objective_matrix(population, objectives)
+        fronts = non_dominated_sort(scores)
+        crowding = crowding_distance(scores, fronts)
+        
+        for _ in range(self.generations - 1):
+            parents1 = population[self.tournament(fronts, crowding)]
+            parents2 = population[self.tournament(fronts, crowding)]
+            children = self.mutate(self.crossover(parents1, parents2))
+            
+            population = _stack(population, children)
+            scores = np.concatenate([scores, self.objective_matrix(children, objectives)])
+            fronts = non_dominated_sort(scores)
+            crowding = crowding_distance(scores, fronts)
+            kept = np.lexsort((-crowding, fronts))[:self.population_size]
+            population, scores, fronts, crowding = population[kept], scores[kept], fronts[kept], crowding[kept]
+        
+        front = np.flatnonzero(fronts == 0)
+        distinct = list(dict(zip(FitnessCache.keys(population[front]), front.tolist())).values())
+        return population[distinct], scores[distinct]
+    
+    def pool_size(self) -> int:
+        """Processes evolve() runs on: one per island, else fitness scoring of large populations"""
+        if self.islands > 1:
+            return min(self.workers, self.islands)
+        return self.workers if self.population_size >= PARALLEL_MIN_POPULATION else 1
+    
+    def progress_report(self, populations: List[np.ndarray], fitnesses: List[np.ndarray]) -> Dict:
+        """Best and mean fitness so far, with the metrics of the best track"""
+        best = int(np.argmax([fitness.max() for fitness in fitnesses]))
+        best_index = int(np.argmax(fitnesses[best]))
+        scores = np.concatenate(fitnesses)
+        return {
+            'generation': self.completed_generations,
+            'generations': self.generations,
+            'best_fitness': float(fitnesses[best][best_index]),
+            # Tracks rejected by closed_layout (fitness -inf) are left out of the mean
+            'mean_fitness': float(np.mean(scores[np.isfinite(scores)])) if np.isfinite(scores).any() else None,
+            'best_metrics': TrackMetricsCalculator.calculate_metrics(populations[best][best_index])
+        }
+    
+    def stop_requested(self, progress_callback: Optional[ProgressCallback],
+                       populations: List[np.ndarray], fitnesses: List[np.ndarray]) -> bool:
+        """Report progress to the callback, True if it asked to stop"""
+        return bool(progress_callback and progress_callback(self.progress_report(populations, fitnesses)))
+    
+    def evolve_population(self, progress_callback: Optional[ProgressCallback] = None
+                          ) -> Tuple[np.ndarray, np.ndarray]:
+        """Evolve one population, return the final population and its fitness"""
+        # Initialize population
+        population = self.initial_population()
+        
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.pool_size() > 1 else None
+        try:
+            fitness = self.evaluate_population(population, pool)
+            self.completed_generations = 1
+            while (not self.stop_requested(progress_callback, [population], [fitness])
+                   and self.completed_generations < self.generations):
+                population, fitness = self.breed(population, fitness, pool)
+                self.completed_generations += 1
+        finally:
+            if pool:
+                pool.shutdown()
+        
+        return population, fitness
+    
+    def evolve_islands(self, progress_callback: Optional[ProgressCallback] = None
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+        """Island model: evolve separate populations, ring-migrating their best tracks
+
+        Every migration_interval generations each island sends copies of its
+        `migrants` best tracks to the next island, replacing that island's worst.
+        Island i mutates at ISLAND_MUTATION_RATES spread over the islands, and
+        every island has its own seed, so the result does not depend on workers.
+        Returns all islands' final populations stacked, with their fitness.
+        """
+        rates = np.linspace(*ISLAND_MUTATION_RATES, self.islands)
+        islands = [TrackAIDesigner(self.target_metric, self.target_value, seed=seed,
+                                   population_size=self.population_size, generations=self.generations,
+                                   cache_size=self.fitness_cache.maxsize // self.islands,
+                                   mutation_rate=float(rate), closed_layout=self.closed_layout,
+                                   simulate=self.simulate,
+                                   seed_tracks=None if self.seed_tracks is None else self.seed_tracks[i::self.islands])
+                   for i, (seed, rate) in enumerate(zip(self.rng.spawn(self.islands), rates))]
+        populations = [island.initial_population() for island in islands]
+        fitnesses = [island.evaluate_population(population) for island, population in zip(islands, populations)]
+        
+        pool = ProcessPoolExecutor(max_workers=self.pool_size()) if self.pool_size() > 1 else None
+        try:
+            self.completed_generations = 1
+            while (not self.stop_requested(progress_callback, populations, fitnesses)
+                   and self.completed_generations < self.generations):
+                epoch = min(self.migration_interval, self.generations - self.completed_generations)
+                args = (islands, populations, fitnesses, repeat(epoch))
+                results = list(pool.map(_evolve_island, *args)) if pool else list(map(_evolve_island, *args))
+                islands, populations, fitnesses = (list(column) for column in zip(*results))
+                self.completed_generations += epoch
+                if self.completed_generations < self.generations:
+                    self.migrate(populations, fitnesses)
+        finally:
+            if pool:
+                pool.shutdown()
+        
+        for island in islands:
+            self.fitness_evaluations += island.fitness_evaluations
+            self.fitness_cache.hits += island.fitness_cache.hits
+            self.fitness_cache.misses += island.fitness_cache.misses
+        
+        return _stack(*populations), np.concatenate(fitnesses)
+    
+    def migrate(self, populations: List[np.ndarray], fitnesses: List[np.ndarray]):
+        """Copy each island's best tracks over the worst tracks of the next island, in place"""
+        outgoing = []
+        for population, fitness in zip(populations, fitnesses):
+            best = np.argsort(-fitness, kind='stable')[:self.migrants]
+            outgoing.append((population[best], fitness[best]))
+        
+        for i, (migrants, migrant_fitness) in enumerate(outgoing):
+            target = (i + 1) % len(populations)
+            population, fitness = populations[target], fitnesses[target]
+            worst = np.argsort(fitness, kind='stable')[:len(migrants)]
+            width = max(population.shape[1], migrants.shape[1])
+            population, migrants = _widen(population, width), _widen(migrants, width)
+            population[worst] = migrants
+            fitness[worst] = migrant_fitness
+            populations[target], fitnesses[target] = population, fitness
     
     def optimize_drs_zones(self, elements: List[TrackElement]) -> List[TrackElement]:
         """Add DRS zones to optimal locations"""
@@ -331,62 +1044,46 @@ class TrackAIDesigner:
         return sectored
     
     def position_elements(self, elements: List[TrackElement]) -> List[Dict]:
-        """Position elements in 2D space for visualization"""
-        positioned = []
-        x, y = 400, 50
-        angle = 90  # Start going down
-        
-        for element in elements:
-            element_dict = element.to_dict(x, y)
-            positioned.append(element_dict)
-            
-            # Calculate next position based on element type
-            if element.type == 'straight':
-                # Continue in current direction
-                if angle == 90:  # Down
-                    y += element.length / 5
-                elif angle == 270:  # Up
-                    y -= element.length / 5
-                elif angle == 0:  # Right
-                    x += element.length / 5
-                else:  # Left
-                    x -= element.length / 5
-            
-            elif element.type == 'corner-left':
-                # Turn left
-                angle = (angle - 90) % 360
-                # Adjust position
-                offset = element.length / 10
-                if angle == 90:
-                    y += offset
-                elif angle == 270:
-                    y -= offset
-                elif angle == 0:
-                    x += offset
-                else:
-                    x -= offset
-            
-            elif element.type == 'corner-right':
-                # Turn right
-                angle = (angle + 90) % 360
-                offset = element.length / 10
-                if angle == 90:
-                    y += offset
-                elif angle == 270:
-                    y -= offset
-                elif angle == 0:
-                    x += offset
-                else:
-                    x -= offset
-            
-            # Keep within bounds
-            x = max(50, min(750, x))
-            y = max(50, min(550, y))
+        """Position elements in 2D space for visualization
+
+        Each element starts where the real layout (see track_geometry) puts it,
+        drawn at LAYOUT_SCALE or smaller so the whole track fits the canvas.
+        """
+        ids = self.rng.layout.integers(1000000, 10000000, size=len(elements))
+        if not elements:
+            return []
+        
+        points = polylines(*_layout_arrays(to_genome(elements)[None]))[0, :-1:ELEMENT_SEGMENTS]
+        low, high = points.min(axis=0), points.max(axis=0)
+        scale = min(LAYOUT_SCALE, *(np.subtract(LAYOUT_CANVAS[1], LAYOUT_CANVAS[0]) / np.maximum(high - low, 1)))
+        center = np.add(LAYOUT_CANVAS[0], LAYOUT_CANVAS[1]) / 2
+        # Canvas y points down
+        x = center[0] + (points[:, 0] - (low[0] + high[0]) / 2) * scale
+        y = center[1] - (points[:, 1] - (low[1] + high[1]) / 2) * scale
         
-        return positioned
+        return [element.to_dict(round(float(ex), 1), round(float(ey), 1), element_id=f'element-{element_id}')
+                for element, ex, ey, element_id in zip(elements, x, y, ids)]
 
 
-def generate_ai_track(target_metric: str, target_value: Optional[float] = None) -> Dict:
+def _layout_report(genome: np.ndarray) -> Dict:
+    layout = track_layouts(genome[None])
+    return {
+        'closed': bool(layout['closed'][0]),
+        'self_intersecting': bool(layout['self_intersecting'][0]),
+        'closure_gap': round(float(layout['closure_gap'][0]), 1)
+    }
+
+
+def _difficulty_label(difficulty_score: float) -> str:
+    return 'easy' if difficulty_score < 25 else 'medium' if difficulty_score < 50 else 'hard' if difficulty_score < 75 else 'extreme'
+
+
+def generate_ai_track(target_metric: str, target_value: Optional[float] = None,
+                      seed: SeedLike = None, population_size: int = 20, generations: int = 50,
+                      workers: Optional[int] = 1, islands: int = 1, migration_interval: int = 10,
+                      progress_callback: Optional[ProgressCallback] = None,
+                      seed_tracks: Optional[List] = None, closed_layout: bool = False,
+                      simulate: bool = False) -> Dict:
     """
     Generate optimized track using AI
     
@@ -396,10 +1093,31 @@ def generate_ai_track(target_metric: str, target_value: Optional[float] = None)
     - 'difficulty': High difficulty/technical track
     - 'safety': Maximum safety rating
     - 'balanced': Well-balanced all-around track
+    
+    Passing a seed makes the generated track reproducible. Populations of
+    PARALLEL_MIN_POPULATION or more are scored on `workers` processes
+    (None = one per CPU), which changes the run time but not the track.
+    With islands > 1 that many populations of population_size evolve on up to
+    `workers` processes and exchange their best tracks every migration_interval
+    generations.
+    
+    progress_callback is passed on to TrackAIDesigner.evolve: it sees every
+    generation's progress report and can stop the run early by returning True.
+    seed_tracks start the evolution instead of random tracks: a population
+    matrix (e.g. from the track library) or stored tracks, see seed_population.
+    closed_layout keeps only tracks that close without crossing themselves;
+    either way the result's 'layout' reports the track's closure and crossings.
+    simulate races candidate tracks and scores them on the results (overtakes
+    and speed only), see TrackAIDesigner.
     """
+    if seed_tracks is not None and not isinstance(seed_tracks, np.ndarray):
+        seed_tracks = seed_population(seed_tracks)
     
-    designer = TrackAIDesigner(target_metric, target_value)
-    best_elements, metrics = designer.evolve()
+    designer = TrackAIDesigner(target_metric, target_value, seed=seed, population_size=population_size,
+                               generations=generations, workers=workers, islands=islands,
+                               migration_interval=migration_interval, seed_tracks=seed_tracks,
+                               closed_layout=closed_layout, simulate=simulate)
+    best_elements, metrics = designer.evolve(progress_callback)
     
     # Position elements for visualization
     positioned_elements = designer.position_elements(best_elements)
@@ -413,18 +1131,88 @@ def generate_ai_track(target_metric: str, target_value: Optional[float] = None)
         'balanced': ['Perfect Balance', 'Harmony Circuit', 'Equilibrium Track', 'Balanced Beauty']
     }
     
-    track_name = random.choice(track_names.get(target_metric, ['AI Generated Track']))
+    track_name = choice(designer.rng.layout, track_names.get(target_metric, ['AI Generated Track']))
+    
+    generation_stats = {
+        'generations': designer.generations,
+        'completed_generations': designer.completed_generations,
+        'population_size': designer.population_size,
+        'workers': designer.pool_size(),
+        'islands': designer.islands,
+        'fitness_evaluations': designer.fitness_evaluations,
+        'fitness_cache': designer.fitness_cache.stats()
+    }
+    if simulate:
+        # Every fitness evaluation raced its track
+        generation_stats['simulation'] = {
+            'simulated_tracks': designer.fitness_evaluations,
+            'candidates_per_child': SIMULATION_OVERSAMPLE,
+            'races_per_track': SIMULATION_RACES,
+            'laps': SIMULATION_LAPS
+        }
     
     return {
         'name': f"{track_name} (AI)",
         'elements': positioned_elements,
         'metrics': metrics,
-        'difficulty': 'easy' if metrics['difficultyScore'] < 25 else 'medium' if metrics['difficultyScore'] < 50 else 'hard' if metrics['difficultyScore'] < 75 else 'extreme',
+        'difficulty': _difficulty_label(metrics['difficultyScore']),
         'laps': 3,
         'generated_for': target_metric,
+        'layout': _layout_report(to_genome(best_elements)),
+        'generation_stats': generation_stats
+    }
+
+
+def generate_pareto_tracks(objectives: Optional[List[str]] = None, seed: SeedLike = None,
+                           population_size: int = 100, generations: int = 50,
+                           front_size: int = 20, seed_tracks: Optional[List] = None) -> Dict:
+    """
+    Generate the trade-off tracks between several objectives in one run
+    
+    objectives: two or more of PARETO_OBJECTIVES (default all four)
+    
+    Returns up to front_size tracks of the evolved Pareto front: none of them
+    beats another in every objective. Larger fronts are thinned by crowding
+    distance, which keeps the extremes and the most spread out tracks.
+    Passing a previous result's tracks as seed_tracks continues from that front.
+    """
+    objectives = objectives or list(PARETO_OBJECTIVES)
+    unknown = [o for o in objectives if o not in PARETO_OBJECTIVES]
+    if unknown or len(set(objectives)) < 2:
+        raise ValueError(f'Objectives must be two or more of: {list(PARETO_OBJECTIVES)}')
+    if not 1 <= front_size <= MAX_FRONT_SIZE:
+        raise ValueError(f'Front size must be between 1 and {MAX_FRONT_SIZE}')
+    
+    if seed_tracks is not None and not isinstance(seed_tracks, np.ndarray):
+        seed_tracks = seed_population(seed_tracks)
+    designer = TrackAIDesigner('pareto', seed=seed, population_size=population_size, generations=generations,
+                               seed_tracks=seed_tracks)
+    genomes, scores = designer.evolve_pareto(objectives)
+    front_found = len(genomes)
+    if len(genomes) > front_size:
+        spread = np.argsort(-crowding_distance(scores, np.zeros(len(scores), dtype=np.int64)), kind='stable')
+        genomes, scores = genomes[spread[:front_size]], scores[spread[:front_size]]
+    order = np.lexsort(scores.T[::-1])[::-1]
+    
+    tracks = []
+    for rank, i in enumerate(order):
+        elements = designer.add_sectors(from_genome(genomes[i]))
+        metrics = TrackMetricsCalculator.calculate_metrics(elements)
+        tracks.append({
+            'name': f'Pareto Track {rank + 1} (AI)',
+            'elements': designer.position_elements(elements),
+            'metrics': metrics,
+            'difficulty': _difficulty_label(metrics['difficultyScore']),
+            'laps': 3,
+            'objectives': {o: metrics[PARETO_OBJECTIVES[o][0]] for o in objectives}
+        })
+    
+    return {
+        'objectives': objectives,
+        'tracks': tracks,
         'generation_stats': {
             'generations': designer.generations,
-            'population_size': designer.population_size
+            'population_size': designer.population_size,
+            'front_size': front_found
         }
     }
-
@@ -0,0 +1,174 @@
+"""
+Track Geometry
+Real layouts of track element sequences: straights as segments and corners as
+90 degree arcs. Whole populations are checked for closure and self-intersection
+at once, with a uniform grid instead of comparing every pair of segments
+"""
+from typing import Dict
+
+import numpy as np
+
+
+# Every corner turns the track by this much, as in the editor
+CORNER_ANGLE = np.pi / 2
+# Chords per element: corners are drawn as this many chords of their arc
+ELEMENT_SEGMENTS = 4
+# A track is closed when its end lands within this fraction of its length of
+# the start, heading the way it started
+CLOSURE_TOLERANCE = 0.05
+# Lengths close_layouts may give a straight
+STRAIGHT_LENGTHS = (100, 1200)
+
+
+def polylines(lengths: np.ndarray, turns: np.ndarray) -> np.ndarray:
+    """Vertices of every track's centre line, shape (tracks, elements * ELEMENT_SEGMENTS + 1, 2)
+
+    lengths and turns have one row per track and one column per element;
+    turns is +1 for a left corner, -1 for a right corner and 0 otherwise.
+    Padding elements should have length 0, which repeats the end point.
+    The track starts at the origin heading along +x, with y pointing left.
+    """
+    lengths = lengths.astype(float)
+    turns = turns.astype(float)
+    heading = CORNER_ANGLE * (np.cumsum(turns, axis=1) - turns)
+
+    # Heading at each chord's start, as a fraction of the element's turn
+    steps = np.arange(ELEMENT_SEGMENTS + 1) / ELEMENT_SEGMENTS
+    angles = heading[:, :, None] + CORNER_ANGLE * turns[:, :, None] * steps
+    straight = turns == 0
+    # Arc radius for corners; straights move along their heading
+    radius = np.divide(lengths, CORNER_ANGLE, out=np.zeros_like(lengths), where=~straight)
+    sign = np.where(straight, 1.0, turns)[:, :, None]
+    offset_x = np.where(straight[:, :, None], lengths[:, :, None] * steps * np.cos(heading)[:, :, None],
+                        radius[:, :, None] * sign * (np.sin(angles) - np.sin(heading)[:, :, None]))
+    offset_y = np.where(straight[:, :, None], lengths[:, :, None] * steps * np.sin(heading)[:, :, None],
+                        radius[:, :, None] * sign * (np.cos(heading)[:, :, None] - np.cos(angles)))
+
+    # Chain the elements: each starts where the previous one ended
+    start_x = np.cumsum(offset_x[:, :, -1], axis=1) - offset_x[:, :, -1]
+    start_y = np.cumsum(offset_y[:, :, -1], axis=1) - offset_y[:, :, -1]
+    x = (start_x[:, :, None] + offset_x[:, :, 1:]).reshape(len(lengths), -1)
+    y = (start_y[:, :, None] + offset_y[:, :, 1:]).reshape(len(lengths), -1)
+    origin = np.zeros((len(lengths), 1))
+    return np.stack([np.concatenate([origin, x], axis=1), np.concatenate([origin, y], axis=1)], axis=2)
+
+
+def crossing_tracks(starts: np.ndarray, ends: np.ndarray, active: np.ndarray, closed: np.ndarray) -> np.ndarray:
+    """Which tracks have two non-adjacent segments that cross
+
+    starts and ends have shape (tracks, segments, 2); inactive segments are
+    ignored, and on closed tracks the last active segment is adjacent to the
+    first. Segments are bucketed into square grid cells at least as large as
+    the longest segment, so each touches at most four cells and only segments
+    sharing a cell are compared: O(n log n) for the sort instead of O(n^2).
+    """
+    tracks, segments = active.shape
+    track, index = np.nonzero(active)
+    if not len(track):
+        return np.zeros(tracks, dtype=bool)
+    a, b = starts[track, index], ends[track, index]
+    cell_size = max(np.abs(b - a).max(), 1e-9)
+    low = np.floor(np.minimum(a, b) / cell_size).astype(np.int64)
+    high = np.floor(np.maximum(a, b) / cell_size).astype(np.int64)
+
+    # One entry per (segment, cell) pair; high is at most low + 1 per axis
+    entries, cells = [], []
+    for dx in (0, 1):
+        for dy in (0, 1):
+            used = (low[:, 0] + dx <= high[:, 0]) & (low[:, 1] + dy <= high[:, 1])
+            entries.append(np.flatnonzero(used))
+            cells.append(low[used] + [dx, dy])
+    entries, cells = np.concatenate(entries), np.concatenate(cells)
+    cells -= cells.min(axis=0)
+    span = cells.max(axis=0) + 1
+    keys = (track[entries] * span[0] + cells[:, 0]) * span[1] + cells[:, 1]
+    order = np.argsort(keys, kind='stable')
+    entries, keys = entries[order], keys[order]
+
+    # Pair every entry with the later entries of its cell
+    group_end = np.searchsorted(keys, keys, side='right')
+    counts = group_end - np.arange(len(keys)) - 1
+    first = np.repeat(np.arange(len(keys)), counts)
+    second = first + 1 + np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    i, j = entries[first], entries[second]
+
+    # Neighbouring segments share an end point, so they do not count
+    last = np.zeros(tracks, dtype=np.int64)
+    np.maximum.at(last, track, index)
+    gap = np.abs(index[i] - index[j])
+    wraps = closed[track[i]] & (gap == last[track[i]])
+    candidate = (gap > 1) & ~wraps
+    i, j = i[candidate], j[candidate]
+
+    ai, bi, aj, bj = a[i], b[i], a[j], b[j]
+
+    def orientation(p, q, r):
+        return np.sign((q[:, 0] - p[:, 0]) * (r[:, 1] - p[:, 1]) - (q[:, 1] - p[:, 1]) * (r[:, 0] - p[:, 0]))
+
+    crosses = ((orientation(ai, bi, aj) * orientation(ai, bi, bj) < 0)
+               & (orientation(aj, bj, ai) * orientation(aj, bj, bi) < 0))
+    crossing = np.zeros(tracks, dtype=bool)
+    crossing[track[i[crosses]]] = True
+    return crossing
+
+
+def layout_checks(lengths: np.ndarray, turns: np.ndarray) -> Dict[str, np.ndarray]:
+    """Closure and self-intersection of every track, see polylines for the arguments
+
+    A closed track is also checked across the gap from its end back to its
+    start. 'valid' tracks are closed and do not cross themselves.
+    """
+    points = polylines(lengths, turns)
+    total = lengths.sum(axis=1).astype(float)
+    gap = np.linalg.norm(points[:, -1] - points[:, 0], axis=1)
+    closed = (turns.sum(axis=1) % 4 == 0) & (gap <= CLOSURE_TOLERANCE * total)
+
+    starts, ends = points[:, :-1], points[:, 1:]
+    active = np.repeat(lengths > 0, ELEMENT_SEGMENTS, axis=1)
+    # The closing segment runs from the last vertex back to the origin
+    starts = np.concatenate([starts, points[:, -1:]], axis=1)
+    ends = np.concatenate([ends, points[:, :1]], axis=1)
+    active = np.concatenate([active, (closed & (gap > 0))[:, None]], axis=1)
+    # Compact each track's active segments to the front so adjacency is by index
+    order = np.argsort(~active, axis=1, kind='stable')
+    rows = np.arange(len(active))[:, None]
+    crossing = crossing_tracks(starts[rows, order], ends[rows, order], active[rows, order], closed)
+
+    return {
+        'closed': closed,
+        'closure_gap': gap,
+        'self_intersecting': crossing,
+        'valid': closed & ~crossing
+    }
+
+
+def close_layouts(lengths: np.ndarray, turns: np.ndarray, straight: np.ndarray) -> np.ndarray:
+    """Lengths with the straights stretched or shrunk so that each track ends where it started
+
+    Corners turn by right angles, so every straight runs along x or y and its
+    length only moves the end point along that axis. The gap along an axis is
+    shared equally between the straights running back towards the start, or
+    taken off the ones running away from it if there are none. Only tracks
+    already heading the way they started can be closed, and only if every
+    changed straight stays within STRAIGHT_LENGTHS; the others keep their
+    lengths. straight marks the elements that may change.
+    """
+    points = polylines(lengths, turns)
+    gap = points[:, -1] - points[:, 0]
+    heading = (np.cumsum(turns, axis=1) - turns) % 4
+    closed = lengths.astype(float)
+    low, high = STRAIGHT_LENGTHS
+    can_close = turns.sum(axis=1) % 4 == 0
+    for axis in (0, 1):
+        # Signed direction of each straight along this axis, relative to the gap
+        direction = np.where(heading == axis, 1, np.where(heading == axis + 2, -1, 0)) * straight
+        away = direction * np.sign(gap[:, axis, None])
+        back = (away < 0).sum(axis=1)
+        forward = (away > 0).sum(axis=1)
+        changes = np.where(back[:, None] > 0, away < 0, away > 0)
+        count = np.maximum(np.where(back > 0, back, forward), 1)
+        sign = np.where(back > 0, 1, -1)
+        closed += changes * (sign * np.abs(gap[:, axis]) / count)[:, None]
+        fits = ~changes | ((closed >= low) & (closed <= high))
+        can_close &= ((back + forward > 0) | (np.abs(gap[:, axis]) < 1e-9)) & fits.all(axis=1)
+    return np.where(can_close[:, None], closed, lengths)
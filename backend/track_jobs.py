@@ -0,0 +1,137 @@
+"""
+Track Generation Jobs
+Runs track generation (or a track library build) in a background thread so
+clients can follow the per-generation progress, take the best track so far or
+cancel the run
+"""
+import os
+import secrets
+import threading
+from typing import Callable, Dict, List, Optional, Tuple
+
+# Jobs kept for polling; past this many the oldest finished job is dropped, and
+# new jobs are refused while all of them are still running
+MAX_JOBS = 100
+
+# Generation is CPU-bound and shares the GIL with the request threads, so only
+# a few jobs per core may run at once; more are refused until one finishes
+MAX_RUNNING_JOBS = 2 * (os.cpu_count() or 1)
+
+# 'finish' stops after the current generation and returns its best track,
+# 'cancel' stops there and throws the run away
+STOP_ACTIONS = ['finish', 'cancel']
+
+RUNNING = 'running'
+COMPLETED = 'completed'
+CANCELLED = 'cancelled'
+FAILED = 'failed'
+
+
+class GenerationCancelled(Exception):
+    """Raised from the progress callback to abandon a cancelled run"""
+
+
+class JobLimitReached(Exception):
+    """Raised by start_job when MAX_RUNNING_JOBS jobs, or all MAX_JOBS, are still running"""
+
+
+class TrackJob:
+    """One background track generation and the progress it has reported"""
+
+    def __init__(self, run: Callable[[Callable[[Dict], bool]], Dict]):
+        """run(progress_callback) generates the track, e.g. a partial generate_ai_track"""
+        self.job_id = secrets.token_hex(8)
+        self.state = RUNNING
+        self.progress: List[Dict] = []
+        self.result: Optional[Dict] = None
+        self.error: Optional[str] = None
+        self.stop_action: Optional[str] = None
+        self.changed = threading.Condition()
+        self.thread = threading.Thread(target=self._run, args=(run,), daemon=True)
+
+    def start(self) -> 'TrackJob':
+        self.thread.start()
+        return self
+
+    def _run(self, run):
+        try:
+            result, state, error = run(self._report), COMPLETED, None
+        except GenerationCancelled:
+            result, state, error = None, CANCELLED, None
+        except Exception as e:
+            result, state, error = None, FAILED, str(e)
+        with self.changed:
+            self.result, self.state, self.error = result, state, error
+            self.changed.notify_all()
+
+    def _report(self, report: Dict) -> bool:
+        """Progress callback: record the report, then honour any stop request"""
+        with self.changed:
+            self.progress.append(report)
+            self.changed.notify_all()
+            if self.stop_action == 'cancel':
+                raise GenerationCancelled()
+            return self.stop_action == 'finish'
+
+    def stop(self, action: str = 'finish'):
+        """Ask the run to stop at its next generation"""
+        if action not in STOP_ACTIONS:
+            raise ValueError(f'Stop action must be one of: {STOP_ACTIONS}')
+        with self.changed:
+            if self.state == RUNNING:
+                self.stop_action = action
+
+    def wait(self, seen: int, timeout: Optional[float] = None) -> Tuple[List[Dict], bool]:
+        """Progress reports after the first `seen`, waiting up to timeout for one
+
+        Returns the new reports and whether the job has finished.
+        """
+        with self.changed:
+            self.changed.wait_for(lambda: len(self.progress) > seen or self.state != RUNNING, timeout)
+            return self.progress[seen:], self.state != RUNNING
+
+    def status(self) -> Dict:
+        with self.changed:
+            status = {
+                'job_id': self.job_id,
+                'state': self.state,
+                'progress': self.progress[-1] if self.progress else None,
+                'stop_requested': self.stop_action
+            }
+            if self.state == COMPLETED:
+                status['result'] = self.result
+            elif self.state == FAILED:
+                status['error'] = self.error
+            return status
+
+
+# In-memory job registry, oldest dropped first; request threads share it, so
+# every access goes through jobs_lock
+jobs: Dict[str, TrackJob] = {}
+jobs_lock = threading.Lock()
+
+
+def get_job(job_id: str) -> Optional[TrackJob]:
+    with jobs_lock:
+        return jobs.get(job_id)
+
+
+def start_job(run: Callable[[Callable[[Dict], bool]], Dict]) -> TrackJob:
+    """Start a background generation and register it under its job_id
+
+    Raises JobLimitReached when MAX_RUNNING_JOBS jobs are running. Otherwise
+    makes room by dropping the oldest finished job; running jobs are never
+    dropped, so with MAX_JOBS of them running this raises too.
+    """
+    with jobs_lock:
+        running = sum(job.state == RUNNING for job in jobs.values())
+        if running >= MAX_RUNNING_JOBS:
+            raise JobLimitReached(f'{running} track jobs are already running, try again later')
+        if len(jobs) >= MAX_JOBS:
+            finished = [job_id for job_id, job in jobs.items() if job.state != RUNNING]
+            if not finished:
+                raise JobLimitReached(f'All {MAX_JOBS} track jobs are running, try again later')
+            del jobs[finished[0]]
+        job = TrackJob(run)
+        jobs[job.job_id] = job
+    return job.start()
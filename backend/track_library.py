@@ -0,0 +1,165 @@
+"""
+Track Library
+Evolved tracks kept on disk with their metrics, so a generation request can be
+answered by a lookup (optionally refined by a few seeded generations) instead
+of a full evolution from random tracks
+"""
+import os
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+
+from seeding import SeedLike, as_seed_sequence
+from track_ai_designer import (GENOME_DTYPE, TARGET_METRICS, FitnessCache, ProgressCallback,
+                               TrackAIDesigner, TrackMetricsCalculator, _stack, generate_ai_track,
+                               population_fitness)
+
+TRACK_LIBRARY_PATH = os.getenv('TRACK_LIBRARY_PATH', 'track_library.npz')
+
+# Difficulty runs aim at each of these, so value lookups find tracks close by
+DIFFICULTY_VALUES = tuple(range(20, 101, 10))
+# The difficulty fitness aims here when no value is given
+DEFAULT_DIFFICULTY = 80
+
+# Best tracks a lookup returns; they seed the refinement population
+LOOKUP_CANDIDATES = 20
+# Tracks either side of the target difficulty that a value lookup ranks
+LOOKUP_WINDOW = 200
+
+
+class TrackLibrary:
+    """Distinct evolved tracks, indexed for nearest-target lookups
+
+    Only the difficulty fitness takes a target value, so one index sorted by
+    difficulty score answers value lookups: the tracks nearest the value are
+    ranked by fitness. Other targets keep their best tracks ranked in advance.
+    """
+
+    def __init__(self, genomes: Optional[np.ndarray] = None):
+        self.lock = threading.Lock()
+        self.genomes = np.zeros((0, 1), dtype=GENOME_DTYPE)
+        self.keys = set()
+        self.metrics: Dict[str, np.ndarray] = {}
+        self.by_difficulty = np.zeros(0, dtype=np.int64)
+        self.ranked: Dict[str, np.ndarray] = {}
+        if genomes is not None:
+            self.add(genomes)
+
+    def __len__(self) -> int:
+        return len(self.genomes)
+
+    def add(self, population: np.ndarray) -> int:
+        """Add the tracks of a population matrix not already in the library, return how many"""
+        with self.lock:
+            keys = FitnessCache.keys(population)
+            rows, new_keys = [], set()
+            for row, key in enumerate(keys):
+                if key and key not in self.keys and key not in new_keys:
+                    rows.append(row)
+                    new_keys.add(key)
+            if not rows:
+                return 0
+
+            genomes = _stack(self.genomes, population[rows]) if len(self.genomes) else population[rows]
+            metrics = TrackMetricsCalculator.calculate_batch(genomes)
+            ranked = {target: np.argsort(-population_fitness(genomes, target), kind='stable')[:LOOKUP_CANDIDATES]
+                      for target in TARGET_METRICS if target != 'difficulty'}
+            # Swap the index in at once so lookups never see half of it
+            self.genomes, self.metrics, self.ranked = genomes, metrics, ranked
+            self.by_difficulty = np.argsort(metrics['difficultyScore'], kind='stable')
+            self.keys.update(new_keys)
+            return len(rows)
+
+    def nearest(self, target_metric: str, target_value: Optional[float] = None,
+                count: int = LOOKUP_CANDIDATES) -> np.ndarray:
+        """Population matrix of the library's best `count` tracks for a target, best first"""
+        with self.lock:
+            genomes, metrics, ranked, by_difficulty = self.genomes, self.metrics, self.ranked, self.by_difficulty
+        if not len(genomes):
+            return genomes
+
+        if target_metric != 'difficulty':
+            return genomes[ranked[target_metric][:count]]
+
+        target = target_value if target_value else DEFAULT_DIFFICULTY
+        middle = np.searchsorted(metrics['difficultyScore'][by_difficulty], target)
+        window = by_difficulty[max(0, middle - LOOKUP_WINDOW):middle + LOOKUP_WINDOW]
+        fitness = population_fitness(genomes[window], target_metric, target)
+        return genomes[window[np.argsort(-fitness, kind='stable')[:count]]]
+
+    def build(self, runs_per_target: int = 4, population_size: int = 50, generations: int = 50,
+              seed: SeedLike = None, progress_callback: Optional[ProgressCallback] = None) -> Dict:
+        """Evolve tracks for every target and add each run's final population
+
+        Difficulty runs cycle through DIFFICULTY_VALUES. progress_callback sees
+        every generation's report with the run added; returning True stops the
+        build after the current run.
+        """
+        plan = [(target, DIFFICULTY_VALUES[run % len(DIFFICULTY_VALUES)] if target == 'difficulty' else None)
+                for target in TARGET_METRICS for run in range(runs_per_target)]
+        added = 0
+        for run, ((target, value), run_seed) in enumerate(zip(plan, as_seed_sequence(seed).spawn(len(plan)))):
+            stop = []
+
+            def report_progress(report):
+                stop.append(bool(progress_callback and progress_callback(
+                    {**report, 'target': target, 'target_value': value, 'run': run + 1, 'runs': len(plan)})))
+                return stop[-1]
+
+            designer = TrackAIDesigner(target, value, seed=run_seed, population_size=population_size,
+                                       generations=generations)
+            population, _ = designer.evolve_population(report_progress)
+            added += self.add(population)
+            if any(stop):
+                break
+        return {'added': added, **self.stats()}
+
+    def stats(self) -> Dict:
+        return {'size': len(self)}
+
+    def save(self, path: str = TRACK_LIBRARY_PATH):
+        """Write the library's genomes to an .npz file, replacing it atomically"""
+        with self.lock:
+            genomes = self.genomes
+        temporary = f'{path}.tmp.npz'
+        np.savez_compressed(temporary, genomes=genomes)
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str = TRACK_LIBRARY_PATH) -> 'TrackLibrary':
+        """Library saved at path, or an empty one if there is none"""
+        if not os.path.exists(path):
+            return cls()
+        with np.load(path) as data:
+            return cls(data['genomes'])
+
+
+_library: Optional[TrackLibrary] = None
+
+
+def get_library() -> TrackLibrary:
+    """The shared library, loaded from TRACK_LIBRARY_PATH on first use"""
+    global _library
+    if _library is None:
+        _library = TrackLibrary.load()
+    return _library
+
+
+def library_track(target_metric: str, target_value: Optional[float] = None, seed: SeedLike = None,
+                  refine_generations: int = 0, population_size: int = LOOKUP_CANDIDATES,
+                  library: Optional[TrackLibrary] = None) -> Optional[Dict]:
+    """Track for a target from the library, as generate_ai_track returns it; None if the library is empty
+
+    The nearest tracks seed a population that evolves refine_generations more
+    generations; with none, the library's best track comes back as it is.
+    """
+    library = library if library is not None else get_library()
+    seeds = library.nearest(target_metric, target_value, population_size)
+    if not len(seeds):
+        return None
+
+    track_data = generate_ai_track(target_metric, target_value, seed, population_size=max(2, population_size),
+                                   generations=1 + refine_generations, seed_tracks=seeds)
+    track_data['generation_stats']['library'] = {**library.stats(), 'refine_generations': refine_generations}
+    return track_data
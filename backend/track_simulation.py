@@ -0,0 +1,119 @@
+"""
+Track Simulation Fitness
+Scores candidate tracks by racing on them: a short batch of races per track on
+the vectorized engine. A ridge regression surrogate on the track metrics
+predicts those results, so the designer only races the candidates it expects
+to do best
+"""
+from typing import Callable, Dict, Tuple
+
+import numpy as np
+
+from race_simulator import RaceSimulator
+from vectorized_engine import VectorizedRaceEngine
+
+# Races and laps per simulated track: enough to separate tracks, few enough to stay interactive
+SIMULATION_RACES = 8
+SIMULATION_LAPS = 10
+
+# Every candidate is raced by the same field, skills and aggression spread like app.build_drivers
+SIMULATION_DRIVERS = [
+    {'name': f'Driver {i + 1}', 'skill': float(skill), 'aggression': float(aggression)}
+    for i, (skill, aggression) in enumerate(zip(np.linspace(0.6, 0.95, 10), np.linspace(0.3, 0.8, 10)))
+]
+
+# The metrics RaceSimulator reads from a track; tracks equal in these race the same
+SIMULATOR_METRICS = ['totalLength', 'estimatedLapTime', 'difficultyScore', 'possibleOvertakes']
+# Metrics the surrogate predicts from (TrackMetricsCalculator.calculate_batch columns)
+SURROGATE_METRICS = ['totalLength', 'estimatedLapTime', 'difficultyScore', 'possibleOvertakes',
+                     'safetyRating', 'elevationChange', 'cornerCount', 'straightCount']
+# Most recent simulated tracks the surrogate is fitted on
+SURROGATE_SAMPLES = 2000
+
+
+def _overtakes_per_race(outcomes: Dict[str, np.ndarray], laps: int) -> float:
+    return float(outcomes['overtakes'].sum(axis=1).mean())
+
+
+def _winning_lap_time(outcomes: Dict[str, np.ndarray], laps: int) -> float:
+    finished = np.where(outcomes['retired'], np.inf, outcomes['total_time'])
+    return float(finished.min(axis=1).mean() / laps)
+
+
+# Target -> (simulated measure of a batch of races, weight it is added to the fitness with).
+# The simulator only sees a track through SIMULATOR_METRICS, so only the targets
+# these drive have a simulated counterpart.
+SIMULATED_TARGETS: Dict[str, Tuple[Callable[[Dict[str, np.ndarray], int], float], float]] = {
+    # One overtake per race is worth one possibleOvertakes
+    'overtakes': (_overtakes_per_race, 20),
+    # Measured lap time counts like estimatedLapTime
+    'speed': (_winning_lap_time, -1),
+}
+
+
+def simulate_tracks(metrics: Dict[str, np.ndarray], target_metric: str, seed: int,
+                    races: int = SIMULATION_RACES, laps: int = SIMULATION_LAPS) -> np.ndarray:
+    """Simulated measure of every track, given the metric arrays of calculate_batch
+
+    Every track is raced with the same seed (common random numbers), so tracks
+    are compared on the same luck and a track always gets the same measure.
+    Tracks with equal SIMULATOR_METRICS are raced once.
+    """
+    measure = SIMULATED_TARGETS[target_metric][0]
+    inputs = np.stack([metrics[name].astype(float) for name in SIMULATOR_METRICS], axis=1)
+    distinct, inverse = np.unique(inputs, axis=0, return_inverse=True)
+    values = np.empty(len(distinct))
+    for i, row in enumerate(distinct):
+        track_data = {'metrics': dict(zip(SIMULATOR_METRICS, row.tolist()))}
+        simulator = RaceSimulator(track_data, SIMULATION_DRIVERS, laps, seed=np.random.SeedSequence(seed),
+                                  record_history=False, record_events=False)
+        outcomes = VectorizedRaceEngine(simulator, n_races=races, record_history=False).run().outcomes()
+        values[i] = measure(outcomes, laps)
+    return values[inverse.reshape(-1)]
+
+
+class SurrogateModel:
+    """Ridge regression from track metrics to a simulated measure
+
+    Features are SURROGATE_METRICS and their squares, standardised, so the
+    threshold-like response of the simulator (no overtakes until a track has
+    many opportunities) can bend the fit. The closed-form solve over at most
+    SURROGATE_SAMPLES tracks costs far less than racing one of them.
+    """
+
+    def __init__(self, ridge: float = 1.0, max_samples: int = SURROGATE_SAMPLES):
+        self.ridge = ridge
+        self.max_samples = max_samples
+        self.features = np.zeros((0, 2 * len(SURROGATE_METRICS)))
+        self.targets = np.zeros(0)
+        self.mean = self.scale = self.weights = None
+        self.intercept = 0.0
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    @staticmethod
+    def feature_matrix(metrics: Dict[str, np.ndarray]) -> np.ndarray:
+        columns = np.stack([metrics[name].astype(float) for name in SURROGATE_METRICS], axis=1)
+        return np.concatenate([columns, columns ** 2], axis=1)
+
+    def add(self, metrics: Dict[str, np.ndarray], measures: np.ndarray):
+        """Add simulated tracks, dropping the oldest past max_samples, and refit"""
+        self.features = np.concatenate([self.features, self.feature_matrix(metrics)])[-self.max_samples:]
+        self.targets = np.concatenate([self.targets, measures])[-self.max_samples:]
+        self.fit()
+
+    def fit(self):
+        self.mean = self.features.mean(axis=0)
+        self.scale = np.where(self.features.std(axis=0) > 0, self.features.std(axis=0), 1.0)
+        x = (self.features - self.mean) / self.scale
+        self.intercept = float(self.targets.mean())
+        self.weights = np.linalg.solve(x.T @ x + self.ridge * np.eye(x.shape[1]), x.T @ (self.targets - self.intercept))
+
+    def predict(self, metrics: Dict[str, np.ndarray]) -> np.ndarray:
+        """Predicted measure per track; all zero before any track has been simulated"""
+        features = self.feature_matrix(metrics)
+        if self.weights is None:
+            return np.zeros(len(features))
+        return self.intercept + ((features - self.mean) / self.scale) @ self.weights
+
@@ -1,7 +1,7 @@
 """
 Input Validation and Sanitization
 """
-from marshmallow import Schema, fields, validates, ValidationError, EXCLUDE
+from marshmallow import Schema, fields, validates, validates_schema, ValidationError, EXCLUDE
 import bleach
 import re
 
@@ -56,16 +56,37 @@ class TrackSchema(Schema):
             raise ValidationError('Name must not be empty after sanitization')
 
 
+class StintPlanSchema(Schema):
+    """Explicit tire strategy: one compound per stint and the laps to pit on"""
+    compounds = fields.List(
+        fields.Str(validate=lambda x: x in ['soft', 'medium', 'hard', 'intermediate', 'wet']),
+        required=True, validate=lambda x: 1 <= len(x) <= 6
+    )
+    pitLaps = fields.List(fields.Int(validate=lambda x: 1 <= x <= 200), required=True, validate=lambda x: len(x) <= 5)
+    
+    class Meta:
+        unknown = EXCLUDE
+    
+    @validates_schema
+    def validate_stints(self, data, **kwargs):
+        pit_laps = data['pitLaps']
+        if len(data['compounds']) != len(pit_laps) + 1:
+            raise ValidationError('A stint plan needs exactly one more compound than pit laps')
+        if any(b <= a for a, b in zip(pit_laps, pit_laps[1:])):
+            raise ValidationError('Pit laps must be strictly increasing', 'pitLaps')
+
+
 class DriverSchema(Schema):
     """Driver configuration validation"""
     name = fields.Str(required=True, validate=lambda x: 1 <= len(x) <= 100)
     skill = fields.Float(validate=lambda x: 0.0 <= x <= 1.0, missing=0.75)
     aggression = fields.Float(validate=lambda x: 0.0 <= x <= 1.0, missing=0.5)
     tireStrategy = fields.Str(validate=lambda x: x in ['conservative', 'balanced', 'aggressive'], missing='balanced')
-    pitStrategy = fields.Str(validate=lambda x: x in ['one-stop', 'two-stop', 'three-stop', 'adaptive'], missing='two-stop')
+    pitStrategy = fields.Str(validate=lambda x: x in ['one-stop', 'two-stop', 'three-stop', 'adaptive'], missing='adaptive')
     riskLevel = fields.Str(validate=lambda x: x in ['safe', 'normal', 'risky'], missing='normal')
     preferredTire = fields.Str(validate=lambda x: x in ['soft', 'medium', 'hard'], missing='medium')
     undercut = fields.Bool(missing=False)
+    stintPlan = fields.Nested(StintPlanSchema, missing=None, allow_none=True)
     
     class Meta:
         unknown = EXCLUDE
@@ -78,9 +99,36 @@ class RaceSimulationSchema(Schema):
     laps = fields.Int(validate=lambda x: 1 <= x <= 200, missing=None)
     weather = fields.Str(validate=lambda x: x in ['dry', 'rain', 'variable'], missing='dry')
     safetyCarProbability = fields.Float(validate=lambda x: 0.0 <= x <= 0.5, missing=0.05)
+    seed = fields.Int(validate=lambda x: x >= 0, missing=None, allow_none=True)
+    resultFormat = fields.Str(validate=lambda x: x in ['rows', 'columnar'], missing='rows')
+    encoding = fields.Str(validate=lambda x: x in ['base64', 'msgpack', 'binary'], missing='base64')
+    commentary = fields.Bool(missing=True)
     
     class Meta:
         unknown = EXCLUDE
+    
+    @validates_schema
+    def validate_pit_laps(self, data, **kwargs):
+        # Without laps the track decides the race length; the handlers check the plans then
+        laps = data.get('laps')
+        for driver in data['drivers']:
+            plan = driver.get('stintPlan')
+            if laps and plan and plan['pitLaps'] and plan['pitLaps'][-1] >= laps:
+                raise ValidationError(f"Pit laps must come before the last lap ({laps})", 'drivers')
+
+
+class MonteCarloSchema(RaceSimulationSchema):
+    """Monte Carlo batch simulation request validation"""
+    iterations = fields.Int(validate=lambda x: 1 <= x <= 10000, missing=1000)
+
+
+class StrategyOptimizationSchema(RaceSimulationSchema):
+    """Pit strategy search request validation"""
+    driver = fields.Str(missing=None, allow_none=True)
+    maxStops = fields.Int(validate=lambda x: 1 <= x <= 3, missing=2)
+    objective = fields.Str(validate=lambda x: x in ['position', 'time'], missing='position')
+    minRaces = fields.Int(validate=lambda x: 2 <= x <= 64, missing=8)
+    top = fields.Int(validate=lambda x: 1 <= x <= 20, missing=5)
 
 
 class UserSchema(Schema):
@@ -111,9 +159,9 @@ def validate_and_sanitize_track(data: dict) -> dict:
     return validated
 
 
-def validate_and_sanitize_race(data: dict) -> dict:
+def validate_and_sanitize_race(data: dict, schema: Schema = None) -> dict:
     """Validate and sanitize race simulation data"""
-    schema = RaceSimulationSchema()
+    schema = schema or RaceSimulationSchema()
     validated = schema.load(data)
     
     # Sanitize track name
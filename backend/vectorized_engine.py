@@ -0,0 +1,467 @@
+"""
+Vectorized Race Engine
+Advances whole fields one lap at a time with NumPy array operations instead of
+looping over Driver objects. State is shaped (races, drivers) so a batch of
+independent races sharing the same setup can be stepped together.
+"""
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from race_simulator import INCIDENT_TYPES, StintPlan
+from seeding import RandomStreams, SeedLike
+from tire_model import COMPOUND_INDEX, COMPOUND_NAMES, IS_WET_TIRE
+
+# Current weather is tracked as an index into this list
+WEATHER_STATES = ['dry', 'rain', 'variable']
+DRY, RAIN, VARIABLE = range(3)
+
+# Lap time factor per (current weather, compound), mirrors RaceSimulator.get_weather_factor
+WEATHER_FACTOR = np.array([
+    np.where(IS_WET_TIRE, 1.15, 1.0),
+    [1.05 if c == 'wet' else 1.08 if c == 'intermediate' else 1.25 for c in COMPOUND_NAMES],
+    np.ones(len(COMPOUND_NAMES)),
+])
+
+IS_RETIREMENT = np.array([t in ['crash', 'mechanical'] for t in INCIDENT_TYPES])
+
+# Sort key offset that places retired cars behind every running car, in the
+# order they retired (lap, then running position on that lap)
+RETIRED_KEY = 1e12
+
+
+class VectorizedRaceEngine:
+    """Array-backed lap engine for RaceSimulator
+
+    With n_races=1 the engine drives the simulator's own race, announcing events
+    through its commentary helpers and writing the history back onto its Driver
+    objects. With n_races > 1 it steps that many independent races of the same
+    setup in lockstep and only produces outcome arrays.
+
+    Random numbers come from the simulator's per-subsystem streams unless a
+    seed is given. Every lap draws one block per stream for the whole batch;
+    rolls for rarer events (pit compounds, incident types, overtakes) are drawn
+    only for the cars involved.
+    """
+
+    def __init__(self, simulator, n_races: int = 1, seed: SeedLike = None,
+                 record_history: bool = None):
+        self.sim = simulator
+        self.rng = simulator.rng if seed is None else RandomStreams(simulator.RANDOM_STREAMS, seed)
+        self.n_races = n_races
+        # A single race mirrors its state onto the simulator; events are only
+        # produced when the simulator records them
+        self.announce = n_races == 1
+        self.commentate = self.announce and simulator.events.enabled
+        self.record_history = n_races == 1 if record_history is None else record_history
+
+        drivers = simulator.drivers
+        self.drivers = list(drivers)
+        shape = (n_races, len(drivers))
+        self.n = len(drivers)
+
+        # Per-driver constants
+        self.skill = np.array([d.skill for d in drivers], dtype=float)
+        self.aggression = np.array([d.aggression for d in drivers], dtype=float)
+        skill_factor = 1.0 - (self.skill * 0.1 - 0.05)
+        difficulty_factor = 1.0 + (simulator.difficulty / 1000)
+        self.pace = simulator.base_lap_time * skill_factor * difficulty_factor
+        self.incident_base = 0.005 + self.aggression * 0.01
+
+        # Race-level weather setting drives pit calls and incident risk (wear is in the tire model)
+        weather = simulator.weather
+        if weather == 'rain':
+            self.incident_base = self.incident_base + 0.015
+            self.must_change = ~IS_WET_TIRE
+        else:
+            self.must_change = IS_WET_TIRE if weather == 'dry' else np.zeros_like(IS_WET_TIRE)
+        # Tire model rows follow car numbers, not the (possibly shuffled) grid order
+        self.tire_row = np.array([d.car_number - 1 for d in drivers])
+        self.tire_model = simulator.tire_model
+        self.condition_table = self.tire_model.condition.ravel()
+        self.lap_factor_table = self.tire_model.lap_factor.ravel()
+
+        # Per-race state
+        self.weather_state = np.full(n_races, WEATHER_STATES.index(weather)
+                                     if weather in WEATHER_STATES else VARIABLE)
+        self.safety_car = np.zeros(n_races, dtype=bool)
+        self.safety_car_laps = np.zeros(n_races, dtype=np.int64)
+
+        # Per-driver state
+        self.compound = np.tile([COMPOUND_INDEX[d.current_tire] for d in drivers], (n_races, 1))
+        # Offset of each car's current set in the flat tire tables; tire age is added per lap
+        self.tire_base = self.tire_model.flat_index(self.tire_row, self.compound, 0)
+        self.tire_age = np.tile([d.tire_age for d in drivers], (n_races, 1)).astype(np.int64)
+        self.tire_condition = np.tile([d.tire_condition for d in drivers], (n_races, 1)).astype(float)
+        self.total_time = np.tile([d.total_time for d in drivers], (n_races, 1)).astype(float)
+        self.pit_stops = np.zeros(shape, dtype=np.int64)
+        self.overtakes = np.zeros(shape, dtype=np.int64)
+        self.retired = np.zeros(shape, dtype=bool)
+        self.retirement_type = np.full(shape, -1, dtype=np.int64)
+        self.retirement_rank = np.zeros(shape)
+        self.laps_completed = np.zeros(shape, dtype=np.int64)
+        self.best_lap = np.full(shape, np.inf)
+        self.safety_car_periods = np.zeros(n_races, dtype=np.int64)
+
+        # Stint plans are held per race, so one batch can compare strategies for a car
+        self.plans = np.empty(shape, dtype=object)
+        self.plans[:] = [d.plan for d in drivers]
+        self.stint = np.tile([d.stint for d in drivers], (n_races, 1)).astype(np.int64)
+        self.build_plan_tables()
+
+        # Lap history (NaN marks laps not driven after retirement)
+        if self.record_history:
+            laps = simulator.total_laps
+            self.lap_times = np.full((laps,) + shape, np.nan)
+            self.positions = np.zeros((laps,) + shape, dtype=np.int64)
+            self.gaps = np.zeros((laps,) + shape)
+
+        self.driver_index = np.arange(self.n)
+        self.race_index = np.arange(n_races)[:, None]
+        self.order = np.tile(self.driver_index, (n_races, 1))
+
+        # Per-car effects of policy actions on the current lap, see choose_effects
+        self.effects: Optional[Dict[str, np.ndarray]] = None
+
+    def run(self):
+        """Simulate every lap; a single race is copied back onto the Driver objects"""
+        for lap in range(1, self.sim.total_laps + 1):
+            self.sim.current_lap = lap
+            self.simulate_lap(lap)
+        if self.announce:
+            self.write_back()
+        return self
+
+    def simulate_lap(self, lap: int):
+        """Advance every race in the batch by one lap"""
+        shape = self.total_time.shape
+        self.update_weather()
+        self.update_safety_car()
+        self.effects = effects = self.choose_effects(lap)
+        active = ~self.retired
+
+        # Pit stops; cars on a stint plan skip the strategic window and pit when it says
+        window = (self.tire_age > 20) & (self.rng.pits.random(shape) < 0.2) & ~self.has_plan
+        pitting = (self.tire_condition < 0.4) | window | (lap >= self.next_pit_lap)
+        pitting |= self.must_change[self.compound]
+        if lap > self.sim.total_laps * 0.7:
+            pitting |= (self.pit_stops == 0) & ~self.has_plan
+        if effects is not None:
+            pitting |= effects['pit']
+        pitting &= active
+        if pitting.any():
+            self.execute_pit_stops(lap, pitting)
+
+        # Lap times
+        weather_factor = WEATHER_FACTOR.take(self.weather_state[:, None] * len(COMPOUND_NAMES) + self.compound)
+        lap_time = self.pace * self.lap_factor_table.take(self.tire_base + self.tire_age)
+        lap_time *= weather_factor * (0.995 + 0.02 * self.rng.laps.random(shape))
+        lap_time *= np.where(self.safety_car, 1.3, 1.0)[:, None]
+        if effects is not None:
+            lap_time *= effects['pace']
+        lap_time *= active
+        self.total_time += lap_time
+        self.laps_completed += active
+        np.minimum(self.best_lap, np.where(active, lap_time, np.inf), out=self.best_lap)
+        self.lap_time = lap_time
+        if self.record_history:
+            self.lap_times[lap - 1] = np.where(active, lap_time, np.nan)
+
+        # Tire wear
+        self.update_tires(active)
+
+        # Incidents
+        incident_prob = self.incident_base + 0.02 * (self.tire_condition < 0.4)
+        if effects is not None:
+            incident_prob = incident_prob + effects['risk']
+        incidents = active & (self.rng.incidents.random(shape) < incident_prob)
+        if incidents.any():
+            self.resolve_incidents(incidents)
+
+        # Running order: active cars by time, retired cars behind them in retirement order
+        sort_key = np.where(self.retired, RETIRED_KEY + self.retirement_rank, self.total_time)
+        order = np.argsort(sort_key, axis=1, kind='stable')
+        self.order = order
+        if self.record_history:
+            self.record_order(lap, order)
+
+        # Overtakes
+        if self.n > 1:
+            self.simulate_overtakes(order, sort_key)
+
+        if self.commentate:
+            running = order[0][~self.retired[0][order[0]]]
+            if len(running):
+                self.sync_driver(running[0])
+                runner_up = None
+                if len(running) > 1:
+                    self.sync_driver(running[1])
+                    runner_up = self.sim.drivers[running[1]]
+                self.sim.add_lap_summary(self.sim.drivers[running[0]], runner_up)
+
+    def choose_effects(self, lap: int) -> Optional[Dict[str, np.ndarray]]:
+        """Effects of the actions policy-controlled cars take this lap, or None without policies
+
+        Called once the lap's weather and safety car are settled. Subclasses
+        driving cars by policy (rl_training.PolicyRaceEngine) return (races,
+        drivers) arrays like RLAction.EFFECTS: 'pit' (forced stops), 'pace',
+        'wear', 'attack', 'defend' and 'risk'.
+        """
+        return None
+
+    def update_weather(self):
+        """Vectorized RaceSimulator.update_weather"""
+        sim = self.sim
+        if sim.weather == 'variable':
+            change_roll, new_roll = self.rng.weather.random((2, self.n_races))
+            new = np.where(new_roll < 0.5, DRY, RAIN)
+            changed = (change_roll < 0.1) & (new != self.weather_state)
+            self.weather_state = np.where(changed, new, self.weather_state)
+            if self.commentate and changed[0]:
+                sim.announce_weather_change(WEATHER_STATES[self.weather_state[0]])
+        if self.announce:
+            sim.weather_conditions.append(WEATHER_STATES[self.weather_state[0]])
+
+    def update_safety_car(self):
+        """Vectorized RaceSimulator.update_safety_car"""
+        deploy_roll, clear_roll = self.rng.safety_car.random((2, self.n_races))
+        was_active = self.safety_car
+        self.safety_car_laps += was_active
+        cleared = was_active & (self.safety_car_laps >= 2 + (clear_roll * 3).astype(np.int64))
+        deployed = ~was_active & (deploy_roll < self.sim.safety_car_prob)
+        self.set_safety_car((was_active & ~cleared) | deployed, deployed)
+        if self.announce and cleared[0]:
+            self.sim.clear_safety_car()
+
+    def set_safety_car(self, active: np.ndarray, deployed: np.ndarray):
+        self.safety_car = active
+        self.safety_car_laps = np.where(deployed, 0, self.safety_car_laps)
+        self.safety_car_periods += deployed
+        if self.announce and deployed[0]:
+            self.sim.deploy_safety_car()
+
+    def execute_pit_stops(self, lap: int, pitting: np.ndarray):
+        """Vectorized RaceSimulator.execute_pit_stop"""
+        sim = self.sim
+        races, cars = np.nonzero(pitting)
+        roll = self.rng.pits.random((2, len(races)))
+        if sim.weather == 'rain':
+            new = np.where(roll[0] > 0.3, COMPOUND_INDEX['wet'], COMPOUND_INDEX['intermediate'])
+        else:
+            if sim.weather == 'variable':
+                options = ['soft', 'medium', 'intermediate']
+            elif lap < sim.total_laps * 0.3:
+                options = ['medium', 'hard']
+            elif lap < sim.total_laps * 0.7:
+                options = ['medium', 'soft', 'hard']
+            else:
+                options = ['soft', 'medium']
+            options = np.array([COMPOUND_INDEX[c] for c in options])
+            new = options[(roll[0] * len(options)).astype(np.intp)]
+
+        # Planned compounds win, except slicks planned for a wet race
+        stint = np.minimum(self.stint[races, cars] + 1, self.plan_compound.shape[2] - 1)
+        planned = self.plan_compound[races, cars, stint]
+        use_plan = self.has_plan[races, cars]
+        if sim.weather == 'rain':
+            use_plan &= IS_WET_TIRE[planned]
+        new = np.where(use_plan, planned, new)
+        pit_time = 20.0 + 5.0 * roll[1]
+        old = self.compound[races, cars]
+
+        self.compound[races, cars] = new
+        self.tire_age[races, cars] = 0
+        self.tire_condition[races, cars] = 1.0
+        self.pit_stops[races, cars] += 1
+        self.stint[races, cars] += 1
+        self.tire_base[races, cars] = self.tire_model.flat_index(self.tire_row[cars], new, 0)
+        last = self.plan_pit_lap.shape[2] - 1
+        self.next_pit_lap[races, cars] = self.plan_pit_lap[races, cars, np.minimum(self.stint[races, cars], last)]
+        self.total_time[races, cars] += pit_time
+
+        if self.commentate:
+            for i, old_c, new_c, t in zip(cars, old, new, pit_time):
+                sim.announce_pit_stop(sim.drivers[i], COMPOUND_NAMES[old_c], COMPOUND_NAMES[new_c], t)
+
+    def build_plan_tables(self):
+        """Pad the stint plans into (races, drivers, stints) arrays of pit laps and compounds"""
+        plans = self.plans
+        stints = 1 + max((len(p.pit_laps) for p in plans.flat if p is not None), default=0)
+        self.has_plan = np.not_equal(plans, None)
+        # Padding pit laps are never reached; padding compounds repeat the last stint
+        self.plan_pit_lap = np.full(plans.shape + (stints,), np.iinfo(np.int64).max)
+        self.plan_compound = np.zeros(plans.shape + (stints,), dtype=np.int64)
+        tables = {}
+        for (r, i), plan in np.ndenumerate(plans):
+            if plan is None:
+                continue
+            if id(plan) not in tables:
+                compounds = [COMPOUND_INDEX[c] for c in plan.compounds]
+                tables[id(plan)] = (
+                    plan.pit_laps + [np.iinfo(np.int64).max] * (stints - len(plan.pit_laps)),
+                    compounds + compounds[-1:] * (stints - len(compounds)),
+                )
+            self.plan_pit_lap[r, i], self.plan_compound[r, i] = tables[id(plan)]
+        stint = np.minimum(self.stint, stints - 1)
+        self.next_pit_lap = np.take_along_axis(self.plan_pit_lap, stint[:, :, None], axis=2)[:, :, 0]
+
+    def set_plans(self, car: int, plans: Sequence[Optional[StintPlan]]):
+        """Give car one stint plan per race of the batch, starting on each plan's first compound"""
+        if len(plans) != self.n_races:
+            raise ValueError(f'Expected {self.n_races} plans, got {len(plans)}')
+        for r, plan in enumerate(plans):
+            self.plans[r, car] = plan
+            if plan is not None:
+                self.compound[r, car] = COMPOUND_INDEX[plan.compounds[0]]
+        self.tire_base[:, car] = self.tire_model.flat_index(self.tire_row[car], self.compound[:, car], 0)
+        self.build_plan_tables()
+
+    def update_tires(self, active: np.ndarray):
+        """Vectorized RaceSimulator.update_tire_condition"""
+        self.tire_age += active
+        self.tire_condition = self.condition_table.take(self.tire_base + self.tire_age)
+
+        if self.commentate:
+            warnings = active[0] & (self.tire_condition[0] < 0.5) & (self.tire_age[0] % 5 == 0)
+            for i in np.flatnonzero(warnings):
+                self.sync_driver(i)
+                self.sim.announce_tire_warning(self.sim.drivers[i])
+
+    def resolve_incidents(self, incidents: np.ndarray):
+        """Vectorized RaceSimulator.check_for_incidents"""
+        races, cars = np.nonzero(incidents)
+        roll = self.rng.incidents.random((3, len(races)))
+        incident_type = (roll[0] * len(INCIDENT_TYPES)).astype(np.intp)
+        retiring = IS_RETIREMENT[incident_type]
+        time_loss = 5.0 + 10.0 * roll[1]
+
+        if retiring.any():
+            r, c = races[retiring], cars[retiring]
+            running_position = np.argmax(self.order[r] == c[:, None], axis=1)
+            self.retired[r, c] = True
+            self.retirement_type[r, c] = incident_type[retiring]
+            self.retirement_rank[r, c] = self.sim.current_lap * self.n + running_position
+        self.total_time[races[~retiring], cars[~retiring]] += time_loss[~retiring]
+
+        if self.commentate:
+            sim = self.sim
+            for i, kind, retire, loss in zip(cars, incident_type, retiring, time_loss):
+                if retire:
+                    sim.announce_retirement(sim.drivers[i], INCIDENT_TYPES[kind])
+                else:
+                    sim.announce_incident(sim.drivers[i], INCIDENT_TYPES[kind], loss)
+
+        # Chance of safety car after a retirement
+        triggered = np.zeros(self.n_races, dtype=bool)
+        triggered[races[retiring & (roll[2] < 0.6)]] = True
+        deployed = triggered & ~self.safety_car
+        if deployed.any():
+            self.set_safety_car(self.safety_car | deployed, deployed)
+
+    def record_order(self, lap: int, order: np.ndarray):
+        """Store positions and gaps to the leader, retired cars classified behind the field"""
+        self.positions[lap - 1][self.race_index, order] = self.driver_index + 1
+        leader_time = self.total_time[self.race_index, order[:, :1]]
+        self.gaps[lap - 1] = np.where(self.retired, 999.0, self.total_time - leader_time)
+
+    def simulate_overtakes(self, order: np.ndarray, sort_key: np.ndarray):
+        """Vectorized RaceSimulator.simulate_overtakes over every close adjacent pair at once"""
+        # Pairs within 2 seconds; retired cars sort far behind so never qualify
+        sorted_key = sort_key[self.race_index, order]
+        close = sorted_key[:, 1:] - sorted_key[:, :-1] <= 2.0
+        close &= ~self.safety_car[:, None]
+        races, slots = np.nonzero(close)
+        if not len(races):
+            return
+
+        ahead = order[races, slots]
+        behind = order[races, slots + 1]
+        roll = self.rng.overtakes.random((3, len(races)))
+        chance = (
+            (self.skill[behind] - self.skill[ahead]) * 0.3 +
+            (self.tire_condition[races, behind] - self.tire_condition[races, ahead]) * 0.3 +
+            self.aggression[behind] * 0.2 -
+            self.sim.overtake_difficulty / 200 +
+            (roll[0] * 0.2 - 0.1)
+        )
+        if self.effects is not None:
+            chance += self.effects['attack'][races, behind] - self.effects['defend'][races, ahead]
+        success = (chance > 0.3) & (roll[1] < chance)
+        if not success.any():
+            return
+
+        races, ahead, behind = races[success], ahead[success], behind[success]
+        self.total_time[races, behind] -= 0.3 + 0.5 * roll[2][success]
+        self.overtakes[races, behind] += 1
+
+        if self.commentate:
+            drivers = self.sim.drivers
+            for b, a in zip(behind, ahead):
+                self.sim.announce_overtake(drivers[b], drivers[a])
+
+    def outcomes(self) -> Dict[str, np.ndarray]:
+        """Final classification per race, indexed by the simulator's driver order
+
+        'finishing_order' lists driver indices from winner to last, retired cars
+        classified behind finishers by total time like generate_results.
+        """
+        key = self.total_time + self.retired * RETIRED_KEY
+        finishing_order = np.argsort(key, axis=1, kind='stable')
+        finishing_position = np.empty_like(finishing_order)
+        finishing_position[self.race_index, finishing_order] = self.driver_index + 1
+        return {
+            'finishing_order': finishing_order,
+            'finishing_position': finishing_position,
+            'total_time': self.total_time,
+            'retired': self.retired,
+            'retirement_type': self.retirement_type,
+            'laps_completed': self.laps_completed,
+            'pit_stops': self.pit_stops,
+            'overtakes': self.overtakes,
+            'safety_car_periods': self.safety_car_periods,
+        }
+
+    def sync_driver(self, i: int):
+        """Copy array state of the first race for one driver onto its Driver object"""
+        driver = self.sim.drivers[i]
+        driver.total_time = float(self.total_time[0, i])
+        driver.current_tire = COMPOUND_NAMES[self.compound[0, i]]
+        driver.tire_age = int(self.tire_age[0, i])
+        driver.tire_condition = float(self.tire_condition[0, i])
+        driver.pit_stops = int(self.pit_stops[0, i])
+        driver.stint = int(self.stint[0, i])
+        driver.best_lap_time = float(self.best_lap[0, i])
+        driver.is_retired = bool(self.retired[0, i])
+        reason = self.retirement_type[0, i]
+        driver.retirement_reason = INCIDENT_TYPES[reason] if reason >= 0 else None
+
+    def history_matrices(self, drivers: List) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Lap times, positions and gaps of the first race as drivers x laps matrices, rows in the given order"""
+        rows = [self.drivers.index(d) for d in drivers]
+        return self.lap_times[:, 0, rows].T, self.positions[:, 0, rows].T, self.gaps[:, 0, rows].T
+
+    def sync_standings(self):
+        """Copy the latest lap of the first race onto every Driver object, including position"""
+        if self.sim.current_lap == 0:
+            return
+        drivers = self.sim.drivers
+        for position, i in enumerate(self.order[0], 1):
+            self.sync_driver(i)
+            drivers[i].position = position
+            if self.lap_time[0, i]:  # zero once retired, keep the last lap driven
+                drivers[i].lap_time = float(self.lap_time[0, i])
+
+    def write_back(self):
+        """Copy the final state, and the full race history if recorded, onto the Driver objects"""
+        self.sync_standings()
+        if not self.record_history:
+            return
+
+        lap_times = self.lap_times[:, 0].T.tolist()
+        positions = self.positions[:, 0].T.tolist()
+        gaps = self.gaps[:, 0].T.tolist()
+
+        for i, driver in enumerate(self.sim.drivers):
+            driver.lap_times = lap_times[i][:self.laps_completed[0, i]]
+            driver.positions = positions[i]
+            driver.gaps = gaps[i]